@@ -0,0 +1,86 @@
+import sys
+import time
+import Levenshtein
+from SPARQLWrapper import SPARQLWrapper
+
+from NamespaceIndex import NamespaceIndex
+from Retrieve import url_server
+
+### Compare the scan over every preferred namespace of LOV with the NamespaceIndex on the properties and classes of LOV
+### usage : python BenchmarkNamespaceIndex.py [number_of_components]
+
+def retrieve_namespaces(sparql:SPARQLWrapper) -> dict:
+    query = """
+        PREFIX vann:<http://purl.org/vocab/vann/>
+        SELECT DISTINCT ?vocabURI ?namespace {
+            GRAPH <https://lov.linkeddata.es/dataset/lov>{
+                ?vocabURI vann:preferredNamespaceUri ?namespace.
+            }
+        }
+    """
+    sparql.setQuery(query)
+    response = sparql.queryAndConvert()
+    return {result["namespace"]["value"]:f"<{result['vocabURI']['value']}>" for result in response["results"]["bindings"]}
+
+def retrieve_components(sparql:SPARQLWrapper) -> list:
+    query = """
+        PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
+        PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+        PREFIX owl: <http://www.w3.org/2002/07/owl#>
+        SELECT DISTINCT ?uri {
+            VALUES ?type {
+                rdf:Property owl:DatatypeProperty owl:ObjectProperty rdfs:Class owl:Class
+            }
+            ?uri rdf:type ?type.
+            FILTER(isIRI(?uri))
+        }
+    """
+    sparql.setQuery(query)
+    response = sparql.queryAndConvert()
+    return sorted(result["uri"]["value"] for result in response["results"]["bindings"])
+
+def reduce_uri(uri:str) -> str:
+    if "#" in uri:
+        return "#".join(uri.split("#")[:-1])+"#"
+    return "/".join(uri.split("/")[:-1])+"/"
+
+def scan_best_match(uri:str, namespaces:list):
+    best_match = (1_000_000_000, "")
+    returnable = False
+    for namespace in namespaces:
+        distance = Levenshtein.distance(uri, namespace)
+        if distance < best_match[0]:
+            best_match = (distance, namespace)
+            returnable = True
+        elif distance == best_match[0]:
+            returnable = False
+    if returnable and best_match[0] < 10:
+        return best_match
+    return None
+
+if __name__ == "__main__":
+
+    sparql = SPARQLWrapper(url_server)
+    sparql.setReturnFormat('json')
+    sparql.method = 'GET'
+
+    namespaces = retrieve_namespaces(sparql)
+    components = retrieve_components(sparql)
+    if len(sys.argv) > 1:
+        components = components[:int(sys.argv[1])]
+    uris = [reduce_uri(uri) for uri in components]
+
+    start = time.perf_counter()
+    scan = [scan_best_match(uri, list(namespaces)) for uri in uris]
+    scan_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    namespace_index = NamespaceIndex(namespaces)
+    indexed = [namespace_index.best_match(uri) for uri in uris]
+    index_time = time.perf_counter() - start
+
+    print(f"Namespaces : {len(namespaces)}, components : {len(uris)}")
+    print(f"Scan : {scan_time:.2f}s ({1000*scan_time/max(len(uris), 1):.3f}ms per component)")
+    print(f"Index : {index_time:.2f}s ({1000*index_time/max(len(uris), 1):.3f}ms per component)")
+    print(f"Matched : {sum(match is not None for match in indexed)}")
+    print(f"Same best namespaces : {scan == indexed}")
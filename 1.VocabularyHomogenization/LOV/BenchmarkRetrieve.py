@@ -0,0 +1,70 @@
+import sys
+import time
+from SPARQLWrapper import SPARQLWrapper
+
+from Retrieve import url_server, retrieve_vocabularies, retrieve_properties, retrieve_classes, \
+                     retrieve_vocabularies_bulk, retrieve_properties_bulk, retrieve_classes_bulk
+
+### Compare the per vocabulary extraction loop with the bulk GRAPH ?g extraction
+### usage : python BenchmarkRetrieve.py [number_of_vocabularies]
+
+class CountingSPARQLWrapper(SPARQLWrapper):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.nb_queries = 0
+
+    def queryAndConvert(self):
+        self.nb_queries += 1
+        return super().queryAndConvert()
+
+def init_sparql() -> CountingSPARQLWrapper:
+    sparql = CountingSPARQLWrapper(url_server)
+    sparql.setReturnFormat('json')
+    sparql.method = 'GET'
+    return sparql
+
+def run(retrieve_vocabularies_function, retrieve_properties_function, retrieve_classes_function, selected_vocabularies):
+    sparql = init_sparql()
+    start = time.perf_counter()
+
+    vocabularies = retrieve_vocabularies_function(sparql)
+    if selected_vocabularies is not None:
+        vocabularies = {vocabulary:vocabularies[vocabulary] for vocabulary in selected_vocabularies if vocabulary in vocabularies}
+    retrieve_properties_function(sparql, vocabularies)
+    retrieve_classes_function(sparql, vocabularies)
+
+    return vocabularies, sparql.nb_queries, time.perf_counter() - start
+
+def same_meta_data(vocabularies_1:dict, vocabularies_2:dict) -> bool:
+    for vocabulary in vocabularies_1:
+        meta_data_1 = {k:v for k, v in vocabularies_1[vocabulary].items() if k not in ["Property", "Class"]}
+        meta_data_2 = {k:v for k, v in vocabularies_2.get(vocabulary, dict()).items() if k not in ["Property", "Class"]}
+        if meta_data_1 != meta_data_2:
+            print(f"Difference on meta data of {vocabulary}")
+            return False
+    return True
+
+def same_components(vocabularies_1:dict, vocabularies_2:dict) -> bool:
+    for vocabulary in vocabularies_1:
+        for component in ["Property", "Class"]:
+            if vocabularies_1[vocabulary][component] != vocabularies_2.get(vocabulary, dict()).get(component):
+                print(f"Difference on {component} of {vocabulary}")
+                return False
+    return True
+
+if __name__ == "__main__":
+
+    nb_vocabularies = int(sys.argv[1]) if len(sys.argv) > 1 else None
+
+    selected_vocabularies = None
+    if nb_vocabularies:
+        selected_vocabularies = list(retrieve_vocabularies_bulk(init_sparql()))[:nb_vocabularies]
+
+    loop, loop_queries, loop_time = run(retrieve_vocabularies, retrieve_properties, retrieve_classes, selected_vocabularies)
+    bulk, bulk_queries, bulk_time = run(retrieve_vocabularies_bulk, retrieve_properties_bulk, retrieve_classes_bulk, selected_vocabularies)
+
+    print(f"Vocabularies : {len(loop)}")
+    print(f"Loop : {loop_queries} queries in {loop_time:.2f}s")
+    print(f"Bulk : {bulk_queries} queries in {bulk_time:.2f}s")
+    print(f"Same vocabulary meta data : {same_meta_data(loop, bulk)}")
+    print(f"Same properties and classes : {same_components(loop, bulk)}")
@@ -0,0 +1,80 @@
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError, URLError
+from SPARQLWrapper import SPARQLWrapper
+from SPARQLWrapper.SPARQLExceptions import EndPointInternalError
+
+def is_transient(error:Exception) -> bool:
+    if isinstance(error, HTTPError):
+        return error.code >= 500
+    return isinstance(error, (EndPointInternalError, URLError, ConnectionError, socket.timeout, TimeoutError))
+
+class RetryingSPARQLWrapper(SPARQLWrapper):
+    ### SPARQLWrapper retrying a query with an exponential backoff when the endpoint times out or fails
+    def __init__(self, endpoint:str, timeout:int=None, max_retries:int=3, backoff:float=2.0, **kwargs):
+        super().__init__(endpoint, **kwargs)
+        if timeout:
+            self.setTimeout(timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+    def queryAndConvert(self):
+        attempt = 0
+        while True:
+            try:
+                return super().queryAndConvert()
+            except Exception as error:
+                if attempt >= self.max_retries or not is_transient(error):
+                    raise
+                time.sleep(self.backoff * 2**attempt)
+                attempt += 1
+
+class FetchPool:
+    ### Bounded pool of threads, each one owning its own SPARQLWrapper (a wrapper is not thread safe)
+    def __init__(self, url_server:str, parallelism:int=4, timeout:int=None, max_retries:int=3, backoff:float=2.0, sparql_class:type=RetryingSPARQLWrapper, **sparql_kwargs):
+        ### sparql_class must accept the RetryingSPARQLWrapper arguments, sparql_kwargs are forwarded to it
+        self.url_server = url_server
+        self.parallelism = parallelism
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.sparql_class = sparql_class
+        self.sparql_kwargs = sparql_kwargs
+        self.local = threading.local()
+
+    def sparql(self) -> SPARQLWrapper:
+        if not hasattr(self.local, "sparql"):
+            sparql = self.sparql_class(self.url_server, timeout=self.timeout, max_retries=self.max_retries, backoff=self.backoff, **self.sparql_kwargs)
+            sparql.setReturnFormat('json')
+            sparql.method = 'GET'
+            self.local.sparql = sparql
+        return self.local.sparql
+
+    def for_each_vocabulary(self, function, vocabularies:dict):
+        ### function(sparql, vocabularies) is called with a single vocabulary view {vocabulary: vocabularies[vocabulary]},
+        ### so every thread fills its own entry of vocabularies in place and the result does not depend on scheduling.
+        def run(vocabulary):
+            function(self.sparql(), {vocabulary: vocabularies[vocabulary]})
+
+        with ThreadPoolExecutor(max_workers=self.parallelism) as executor:
+            for _ in executor.map(run, list(vocabularies)):
+                pass
+
+    def imap_vocabularies(self, function, vocabularies:dict):
+        ### Same as for_each_vocabulary, but yields every vocabulary, in order, as soon as it is fetched.
+        ### At most 2 * parallelism vocabularies are in flight, so the caller can release them once consumed.
+        def run(vocabulary):
+            function(self.sparql(), {vocabulary: vocabularies[vocabulary]})
+            return vocabulary
+
+        with ThreadPoolExecutor(max_workers=self.parallelism) as executor:
+            pending = deque()
+            for vocabulary in list(vocabularies):
+                pending.append(executor.submit(run, vocabulary))
+                if len(pending) >= 2*self.parallelism:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
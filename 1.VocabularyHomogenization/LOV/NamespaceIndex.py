@@ -0,0 +1,52 @@
+import Levenshtein
+
+class NamespaceIndex:
+    ### Index of namespaces (namespace -> vocabulary) answering the closest namespace of an IRI without a full scan :
+    ### exact lookup, then the longest namespace prefixing the IRI bounds the distance, and only the namespaces whose
+    ### length is within that bound are compared (the edit distance is at least the difference of the lengths)
+    def __init__(self, namespaces:dict, max_distance:int=9):
+        self.namespaces = namespaces
+        self.max_distance = max_distance
+        self.by_length = dict()
+        for namespace in namespaces:
+            self.by_length.setdefault(len(namespace), []).append(namespace)
+
+    def longest_prefix(self, uri:str):
+        for end in range(len(uri)-1, 0, -1):
+            if uri[:end] in self.namespaces:
+                return uri[:end]
+        return None
+
+    def search(self, uri:str):
+        ### (distance, namespace, tie) of the closest namespace within max_distance, None if there is none.
+        ### tie is True when another namespace is at the same distance, as in a scan over every namespace.
+        if uri in self.namespaces:
+            return (0, uri, False)
+
+        cutoff = self.max_distance
+        prefix = self.longest_prefix(uri)
+        if prefix is not None:
+            cutoff = min(cutoff, len(uri)-len(prefix))
+
+        best = None
+        for delta in range(cutoff+1):
+            if delta > cutoff:
+                break
+            for length in {len(uri)-delta, len(uri)+delta}:
+                for namespace in self.by_length.get(length, []):
+                    distance = Levenshtein.distance(uri, namespace, score_cutoff=cutoff)
+                    if distance > cutoff:
+                        continue
+                    if best is None or distance < best[0]:
+                        best = (distance, namespace, False)
+                        cutoff = distance
+                    elif distance == best[0]:
+                        best = (best[0], best[1], True)
+        return best
+
+    def best_match(self, uri:str):
+        ### (distance, namespace) of the closest namespace, None when there is none within max_distance or on a tie
+        best = self.search(uri)
+        if best is None or best[2]:
+            return None
+        return best[:2]
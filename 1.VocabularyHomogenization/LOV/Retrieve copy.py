@@ -1,8 +1,14 @@
 import pandas as pd
 from SPARQLWrapper import SPARQLWrapper, BASIC
 import re
+from FetchPool import FetchPool, RetryingSPARQLWrapper
 
 url_server = "http://localhost:7200/repositories/LOV"
+# Number of vocabularies fetched concurrently
+parallelism = 8
+request_timeout = 600
+max_retries = 3
+retry_backoff = 2.0
 
 def curate_literal(string_to_curate:str) -> str:
     return re.sub("\s", " ", string_to_curate).replace('"',' ').replace('\\',' ')
@@ -403,8 +409,8 @@ def write_data(f, vocabularies:dict):
     for vocabulary in vocabularies:
 
         ### Vocabulary meta data
-        for property_vocabulary in set(vocabularies[vocabulary].keys()).difference(["Property", "Class"]):
-            for value in vocabularies[vocabulary][property_vocabulary]:
+        for property_vocabulary in sorted(set(vocabularies[vocabulary].keys()).difference(["Property", "Class"])):
+            for value in sorted(vocabularies[vocabulary][property_vocabulary]):
                 f.write(f"<{vocabulary}> <{property_vocabulary}> {value}.\n")
         
         for property in vocabularies[vocabulary]["Property"]:
@@ -412,7 +418,7 @@ def write_data(f, vocabularies:dict):
             f.write(f"<{property}> <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> <http://www.w3.org/1999/02/22-rdf-syntax-ns#Property>.\n")
 
             for property_property in vocabularies[vocabulary]["Property"][property]:
-                for value in vocabularies[vocabulary]['Property'][property][property_property]:
+                for value in sorted(vocabularies[vocabulary]['Property'][property][property_property]):
                     f.write(f"<{property}> <{property_property}> {value}.\n")
 
         for class_voc in vocabularies[vocabulary]["Class"]:
@@ -420,19 +426,20 @@ def write_data(f, vocabularies:dict):
             f.write(f"<{class_voc}> <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> <http://www.w3.org/2000/01/rdf-schema#Class>.\n")
 
             for property_class in vocabularies[vocabulary]["Class"][class_voc]:
-                for value in vocabularies[vocabulary]['Class'][class_voc][property_class]:
+                for value in sorted(vocabularies[vocabulary]['Class'][class_voc][property_class]):
                     f.write(f"<{class_voc}> <{property_class}> {value}.\n")
 
 if __name__ == "__main__":
 
-    sparql = SPARQLWrapper(url_server)
+    sparql = RetryingSPARQLWrapper(url_server, request_timeout, max_retries, retry_backoff)
     sparql.setReturnFormat('json')
     sparql.method = 'GET'
 
     vocabularies = retrieve_vocabularies(sparql)
 
-    retrieve_properties(sparql, vocabularies)
-    retrieve_classes(sparql, vocabularies)
+    pool = FetchPool(url_server, parallelism, request_timeout, max_retries, retry_backoff)
+    pool.for_each_vocabulary(retrieve_properties, vocabularies)
+    pool.for_each_vocabulary(retrieve_classes, vocabularies)
 
     with open("./HomogenizedData.nt", "w", encoding="UTF-8") as f:
         write_data(f, vocabularies)
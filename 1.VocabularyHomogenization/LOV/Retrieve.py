@@ -1,8 +1,192 @@
+import gzip
+import io
+import os
 import pandas as pd
 from SPARQLWrapper import SPARQLWrapper, BASIC
 import re
+import sys
+from FetchPool import FetchPool, RetryingSPARQLWrapper
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Common"))
+from SparqlCache import CachedSPARQLWrapper, SparqlCache
+from Checkpoint import CheckpointJournal
 
 url_server = "http://localhost:7200/repositories/LOV"
+# Fetch every vocabulary at once with GRAPH ?g queries instead of querying each named graph : far fewer queries, but
+# the whole of LOV (responses and vocabularies) is held in memory before the first one is written
+bulk_extraction = False
+# Per vocabulary extraction (bulk_extraction = False) : number of vocabularies fetched concurrently, each one is written
+# and released as soon as it is fetched
+parallelism = 8
+request_timeout = 600
+max_retries = 3
+retry_backoff = 2.0
+# Write ./HomogenizedData.nt.gz instead of ./HomogenizedData.nt
+compress_output = False
+# On-disk cache of the SPARQL responses (None to disable), invalidated when the size of the repository changes
+cache_config = {
+    "Cache_Path" : "./sparql_cache.sqlite",
+    "Cache_TTL" : None,
+    "Cache_Max_Size" : 2_000_000_000,
+    "Cache_Version" : "auto"
+}
+
+class CachedRetryingSPARQLWrapper(CachedSPARQLWrapper, RetryingSPARQLWrapper):
+    ### Responses are looked up in the cache first, only the misses are sent (and retried) to the endpoint
+    pass
+
+interesting_relations_vocabularies = [
+    "http://www.w3.org/1999/02/22-rdf-syntax-ns#type",
+    "http://purl.org/dc/terms/modified",
+    "http://purl.org/vocab/vann/preferredNamespacePrefix",
+    "http://purl.org/vocab/vann/preferredNamespaceUri",
+    "http://xmlns.com/foaf/0.1/homepage",
+    # "http://purl.org/dc/terms/contributor",
+    "http://purl.org/dc/terms/issued",
+    "http://purl.org/dc/terms/publisher",
+    "http://purl.org/dc/terms/title",
+    "http://purl.org/dc/terms/description",
+    # "http://purl.org/stuff/rev#hasReview",
+    # "http://www.w3.org/ns/dcat#distribution",
+    # "http://www.w3.org/ns/dcat#keyword",
+    "http://purl.org/dc/terms/creator",
+    # "http://purl.org/dc/terms/language",
+    # "http://purl.org/vocommons/voaf#occurrencesInDatasets",
+    # "http://purl.org/vocommons/voaf#reusedByDatasets",
+    # "http://purl.org/vocommons/voaf#usageInDataset",
+    "http://purl.org/vocommons/voaf#reusedByVocabularies",
+    "http://www.w3.org/2000/01/rdf-schema#isDefinedBy",
+    "http://www.w3.org/ns/dcat#keyword"
+]
+
+interesting_relations_properties = {
+    "http://www.w3.org/1999/02/22-rdf-syntax-ns#type" : set([
+                "http://www.w3.org/1999/02/22-rdf-syntax-ns#type",
+                "http://purl.org/dc/elements/1.1/type"
+            ]),
+    "http://www.w3.org/2000/01/rdf-schema#label" : set([
+                "http://www.w3.org/2000/01/rdf-schema#label",
+                "http://xmlns.com/foaf/spec/name",
+                "http://xmlns.com/foaf/0.1/name",
+                "http://purl.org/dc/elements/1.1/title",
+                "http://comicmeta.org/cbo/qlabel",
+            ]),
+    "http://www.w3.org/2000/01/rdf-schema#comment" : set([
+                "http://www.w3.org/2000/01/rdf-schema#comment",
+                "http://www.w3.org/2000/01/rdf-schema#commenet",
+                "http://purl.org/dc/elements/1.1/description",
+                "http://purl.org/dc/terms/description",
+                "http://www.w3.org/2004/02/skos/core#definition",
+                "http://vocab.gtfs.org/terms#comment",
+                "http://schema.org/comment",
+                "http://www.linkedmodel.org/schema/vaem#comment",
+                "http://www.w3.org/2000/01/rdf-schema#description",
+                "http://purl.org/imbi/ru-meta.owl#definition",
+                "http://www.w3.org/ns/prov#editorsDefinition",
+                "http://guava.iis.sinica.edu.tw/r4r/Definition",
+            ]),
+    "http://www.w3.org/2000/01/rdf-schema#domain" : set([
+                "http://www.w3.org/2000/01/rdf-schema#domain",
+                "http://www.w3.org/1999/02/22-rdf-syntax-ns#domain",
+            ]),
+    "http://www.w3.org/2000/01/rdf-schema#range" : set([
+                "http://www.w3.org/2000/01/rdf-schema#range",
+                "http://www.w3.org/1999/02/22-rdf-syntax-ns#range",
+                "http://www.w3.org/2000/01/rdf-schema#ramge",
+            ]),
+    "https://schema.org/domainIncludes":set([
+                "http://schema.org/domainIncludes",
+                "http://schema.org/#domainIncludes",
+                "https://www.schema.org/domainIncludes",
+                "https://schema.org/domainIncludes",
+                "https://ontologies.semanticarts.com/gist/domainIncludes",
+                "https://w3id.org/vocab/olca#domainIncludes",
+                "http://www.lingvoj.org/olca#domainIncludes",
+                "http://sparql.cwrc.ca/ontologies/cwrc#domainIncludes",
+            
+            ]),
+    "https://schema.org/rangeIncludes":set([
+                "http://schema.org/rangeIncludes",
+                "https://schema.org/rangeIncludes",
+                "https://www.schema.org/rangeIncludes",
+                "http://sparql.cwrc.ca/ontologies/cwrc#rangeIncludes",
+                "https://w3id.org/vocab/olca#rangeIncludes",
+                "https://ontologies.semanticarts.com/gist/rangeIncludes",
+                "http://www.lingvoj.org/olca#rangeIncludes",
+            ]),
+    "http://www.w3.org/2000/01/rdf-schema#subPropertyOf":set([
+                "http://www.w3.org/2000/01/rdf-schema#subPropertyOf",
+                "http://www.w3.org/2002/07/owl#subPropertyOf",
+                "http://purl.oclc.org/NET/ssnx/ssn#subPropertyOf",
+                "http://www.w3.org/2000/01/rdf-schema#subPropertyof",
+                "http://www.w3.org/2002/07/owl#SubObjectPropertyOf",
+            ]),
+    "http://www.w3.org/2002/07/owl#equivalentProperty":set([
+                "http://www.w3.org/2002/07/owl#equivalentProperty",
+                "http://www.w3.org/2002/07/owl#sameAs",
+                "http://www.w3.org/2004/02/skos/core#equivalentProperty",
+                "http://semanticscience.org/resource/equivalentTo",
+            ]),
+    "http://www.w3.org/2002/07/owl#differentFrom":set([
+                "http://www.w3.org/2002/07/owl#differentFrom",
+            ]),
+    "http://www.w3.org/2002/07/owl#inverseOf":set([
+                "http://www.w3.org/2002/07/owl#inverseOf",
+                "http://www.w3.org/2002/07/owl#inverse",
+                "https://d-nb.info/standards/elementset/agrelon#correspondsToInverse",
+                "http://schema.org/inverseOf",
+                "http://www.w3.org/ns/prov#inverse",
+            ]),
+    "http://www.w3.org/2000/01/rdf-schema#isDefinedBy":set([
+                "http://www.w3.org/2000/01/rdf-schema#isDefinedBy",
+                "http://www.w3.org/2000/01/rdf-schema#isdefinedby"
+                # "http://www.w3.org/2007/05/powder-s#describedby"
+    ])
+}
+
+interesting_relations_classes = {
+    "http://www.w3.org/1999/02/22-rdf-syntax-ns#type" : set([
+                "http://www.w3.org/1999/02/22-rdf-syntax-ns#type",
+                "http://purl.org/dc/elements/1.1/type",
+            ]),
+    "http://www.w3.org/2000/01/rdf-schema#label" : set([
+                "http://www.w3.org/2000/01/rdf-schema#label",
+                "http://xmlns.com/foaf/spec/name",
+                "http://xmlns.com/foaf/0.1/name",
+                "http://purl.org/dc/elements/1.1/title",
+                "http://comicmeta.org/cbo/qlabel",
+            ]),
+    "http://www.w3.org/2000/01/rdf-schema#comment" : set([
+                "http://www.w3.org/2000/01/rdf-schema#comment",
+                "http://www.w3.org/2000/01/rdf-schema#commenet",
+                "http://purl.org/dc/elements/1.1/description",
+                "http://purl.org/dc/terms/description",
+                "http://www.w3.org/2004/02/skos/core#definition",
+                "http://vocab.gtfs.org/terms#comment",
+                "http://schema.org/comment",
+                "http://www.linkedmodel.org/schema/vaem#comment",
+                "http://www.w3.org/2000/01/rdf-schema#description",
+                "http://purl.org/imbi/ru-meta.owl#definition",
+                "http://www.w3.org/ns/prov#editorsDefinition",
+                "http://guava.iis.sinica.edu.tw/r4r/Definition",
+                "http://www.linkedmodel.org/schema/vaem#description"
+            ]),
+    "http://www.w3.org/2000/01/rdf-schema#subClassOf":set([
+                "http://www.w3.org/2000/01/rdf-schema#subClassOf",
+                "http://www.w3.org/2000/01/rdf-schema#subClasssOf",
+                "http://www.w3.org/2000/01/rdf-schema#subclassOf"
+            ]),
+    "http://www.w3.org/2002/07/owl#equivalentClass":set([
+                "http://www.w3.org/2002/07/owl#equivalentClass",
+            ]),
+    "http://www.w3.org/2002/07/owl#differentFrom":set([
+                "http://www.w3.org/2002/07/owl#differentFrom",
+            ]),
+    "http://www.w3.org/2000/01/rdf-schema#isDefinedBy":set([
+                "http://www.w3.org/2000/01/rdf-schema#isDefinedBy",
+                "http://www.w3.org/2000/01/rdf-schema#isdefinedby"
+                # "http://www.w3.org/2007/05/powder-s#describedby"
+    ])
+}     
 
 def curate_literal(string_to_curate:str) -> str:
     return re.sub("\s", " ", string_to_curate).replace('"',' ').replace('\\',' ')
@@ -36,30 +220,7 @@ def retrieve_vocabularies(sparql:SPARQLWrapper):
     for result in response["results"]["bindings"]:
         vocabularies[result["vocabURI"]["value"]] = dict()
 
-    interesting_relations_to_retrieve = [
-        "http://www.w3.org/1999/02/22-rdf-syntax-ns#type",
-        "http://purl.org/dc/terms/modified",
-        "http://purl.org/vocab/vann/preferredNamespacePrefix",
-        "http://purl.org/vocab/vann/preferredNamespaceUri",
-        "http://xmlns.com/foaf/0.1/homepage",
-        # "http://purl.org/dc/terms/contributor",
-        "http://purl.org/dc/terms/issued",
-        "http://purl.org/dc/terms/publisher",
-        "http://purl.org/dc/terms/title",
-        "http://purl.org/dc/terms/description",
-        # "http://purl.org/stuff/rev#hasReview",
-        # "http://www.w3.org/ns/dcat#distribution",
-        # "http://www.w3.org/ns/dcat#keyword",
-        "http://purl.org/dc/terms/creator",
-        # "http://purl.org/dc/terms/language",
-        # "http://purl.org/vocommons/voaf#occurrencesInDatasets",
-        # "http://purl.org/vocommons/voaf#reusedByDatasets",
-        # "http://purl.org/vocommons/voaf#usageInDataset",
-        "http://purl.org/vocommons/voaf#reusedByVocabularies",
-        "http://www.w3.org/2000/01/rdf-schema#isDefinedBy",
-        "http://www.w3.org/ns/dcat#keyword"
-    ]
-    for relation_to_retrieve in interesting_relations_to_retrieve:
+    for relation_to_retrieve in interesting_relations_vocabularies:
         query = """
             PREFIX vann:<http://purl.org/vocab/vann/>
             PREFIX voaf:<http://purl.org/vocommons/voaf#>
@@ -125,92 +286,7 @@ def retrieve_properties(sparql:SPARQLWrapper, vocabularies:dict):
         for result in response["results"]["bindings"]:
             vocabularies[vocabulary]["Property"][result["propURI"]["value"]] = dict()
 
-        interesting_relations_to_retrieve = {
-            "http://www.w3.org/1999/02/22-rdf-syntax-ns#type" : set([
-                        "http://www.w3.org/1999/02/22-rdf-syntax-ns#type",
-                        "http://purl.org/dc/elements/1.1/type"
-                    ]),
-            "http://www.w3.org/2000/01/rdf-schema#label" : set([
-                        "http://www.w3.org/2000/01/rdf-schema#label",
-                        "http://xmlns.com/foaf/spec/name",
-                        "http://xmlns.com/foaf/0.1/name",
-                        "http://purl.org/dc/elements/1.1/title",
-                        "http://comicmeta.org/cbo/qlabel",
-                    ]),
-            "http://www.w3.org/2000/01/rdf-schema#comment" : set([
-                        "http://www.w3.org/2000/01/rdf-schema#comment",
-                        "http://www.w3.org/2000/01/rdf-schema#commenet",
-                        "http://purl.org/dc/elements/1.1/description",
-                        "http://purl.org/dc/terms/description",
-                        "http://www.w3.org/2004/02/skos/core#definition",
-                        "http://vocab.gtfs.org/terms#comment",
-                        "http://schema.org/comment",
-                        "http://www.linkedmodel.org/schema/vaem#comment",
-                        "http://www.w3.org/2000/01/rdf-schema#description",
-                        "http://purl.org/imbi/ru-meta.owl#definition",
-                        "http://www.w3.org/ns/prov#editorsDefinition",
-                        "http://guava.iis.sinica.edu.tw/r4r/Definition",
-                    ]),
-            "http://www.w3.org/2000/01/rdf-schema#domain" : set([
-                        "http://www.w3.org/2000/01/rdf-schema#domain",
-                        "http://www.w3.org/1999/02/22-rdf-syntax-ns#domain",
-                    ]),
-            "http://www.w3.org/2000/01/rdf-schema#range" : set([
-                        "http://www.w3.org/2000/01/rdf-schema#range",
-                        "http://www.w3.org/1999/02/22-rdf-syntax-ns#range",
-                        "http://www.w3.org/2000/01/rdf-schema#ramge",
-                    ]),
-            "https://schema.org/domainIncludes":set([
-                        "http://schema.org/domainIncludes",
-                        "http://schema.org/#domainIncludes",
-                        "https://www.schema.org/domainIncludes",
-                        "https://schema.org/domainIncludes",
-                        "https://ontologies.semanticarts.com/gist/domainIncludes",
-                        "https://w3id.org/vocab/olca#domainIncludes",
-                        "http://www.lingvoj.org/olca#domainIncludes",
-                        "http://sparql.cwrc.ca/ontologies/cwrc#domainIncludes",
-                    
-                    ]),
-            "https://schema.org/rangeIncludes":set([
-                        "http://schema.org/rangeIncludes",
-                        "https://schema.org/rangeIncludes",
-                        "https://www.schema.org/rangeIncludes",
-                        "http://sparql.cwrc.ca/ontologies/cwrc#rangeIncludes",
-                        "https://w3id.org/vocab/olca#rangeIncludes",
-                        "https://ontologies.semanticarts.com/gist/rangeIncludes",
-                        "http://www.lingvoj.org/olca#rangeIncludes",
-                    ]),
-            "http://www.w3.org/2000/01/rdf-schema#subPropertyOf":set([
-                        "http://www.w3.org/2000/01/rdf-schema#subPropertyOf",
-                        "http://www.w3.org/2002/07/owl#subPropertyOf",
-                        "http://purl.oclc.org/NET/ssnx/ssn#subPropertyOf",
-                        "http://www.w3.org/2000/01/rdf-schema#subPropertyof",
-                        "http://www.w3.org/2002/07/owl#SubObjectPropertyOf",
-                    ]),
-            "http://www.w3.org/2002/07/owl#equivalentProperty":set([
-                        "http://www.w3.org/2002/07/owl#equivalentProperty",
-                        "http://www.w3.org/2002/07/owl#sameAs",
-                        "http://www.w3.org/2004/02/skos/core#equivalentProperty",
-                        "http://semanticscience.org/resource/equivalentTo",
-                    ]),
-            "http://www.w3.org/2002/07/owl#differentFrom":set([
-                        "http://www.w3.org/2002/07/owl#differentFrom",
-                    ]),
-            "http://www.w3.org/2002/07/owl#inverseOf":set([
-                        "http://www.w3.org/2002/07/owl#inverseOf",
-                        "http://www.w3.org/2002/07/owl#inverse",
-                        "https://d-nb.info/standards/elementset/agrelon#correspondsToInverse",
-                        "http://schema.org/inverseOf",
-                        "http://www.w3.org/ns/prov#inverse",
-                    ]),
-            "http://www.w3.org/2000/01/rdf-schema#isDefinedBy":set([
-                        "http://www.w3.org/2000/01/rdf-schema#isDefinedBy",
-                        "http://www.w3.org/2000/01/rdf-schema#isdefinedby"
-                        # "http://www.w3.org/2007/05/powder-s#describedby"
-            ])
-        }
-        
-        for relation_to_retrieve in interesting_relations_to_retrieve:
+        for relation_to_retrieve in interesting_relations_properties:
             query = """
                 PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
                 PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
@@ -224,7 +300,7 @@ def retrieve_properties(sparql:SPARQLWrapper, vocabularies:dict):
                             rdf:Property
                         }
                     VALUES ?relationToRetrieve{
-                        <"""+"> <".join(interesting_relations_to_retrieve[relation_to_retrieve])+""">
+                        <"""+"> <".join(interesting_relations_properties[relation_to_retrieve])+""">
                     }
                     ?propURI rdf:type ?classProperty.
                     ?propURI ?relationToRetrieve ?valueRelation.
@@ -277,52 +353,8 @@ def retrieve_classes(sparql:SPARQLWrapper, vocabularies:dict):
         for result in response["results"]["bindings"]:
             vocabularies[vocabulary]["Class"][result["classURI"]["value"]] = dict()
 
-        interesting_relations_to_retrieve = {
-            "http://www.w3.org/1999/02/22-rdf-syntax-ns#type" : set([
-                        "http://www.w3.org/1999/02/22-rdf-syntax-ns#type",
-                        "http://purl.org/dc/elements/1.1/type",
-                    ]),
-            "http://www.w3.org/2000/01/rdf-schema#label" : set([
-                        "http://www.w3.org/2000/01/rdf-schema#label",
-                        "http://xmlns.com/foaf/spec/name",
-                        "http://xmlns.com/foaf/0.1/name",
-                        "http://purl.org/dc/elements/1.1/title",
-                        "http://comicmeta.org/cbo/qlabel",
-                    ]),
-            "http://www.w3.org/2000/01/rdf-schema#comment" : set([
-                        "http://www.w3.org/2000/01/rdf-schema#comment",
-                        "http://www.w3.org/2000/01/rdf-schema#commenet",
-                        "http://purl.org/dc/elements/1.1/description",
-                        "http://purl.org/dc/terms/description",
-                        "http://www.w3.org/2004/02/skos/core#definition",
-                        "http://vocab.gtfs.org/terms#comment",
-                        "http://schema.org/comment",
-                        "http://www.linkedmodel.org/schema/vaem#comment",
-                        "http://www.w3.org/2000/01/rdf-schema#description",
-                        "http://purl.org/imbi/ru-meta.owl#definition",
-                        "http://www.w3.org/ns/prov#editorsDefinition",
-                        "http://guava.iis.sinica.edu.tw/r4r/Definition",
-                        "http://www.linkedmodel.org/schema/vaem#description"
-                    ]),
-            "http://www.w3.org/2000/01/rdf-schema#subClassOf":set([
-                        "http://www.w3.org/2000/01/rdf-schema#subClassOf",
-                        "http://www.w3.org/2000/01/rdf-schema#subClasssOf",
-                        "http://www.w3.org/2000/01/rdf-schema#subclassOf"
-                    ]),
-            "http://www.w3.org/2002/07/owl#equivalentClass":set([
-                        "http://www.w3.org/2002/07/owl#equivalentClass",
-                    ]),
-            "http://www.w3.org/2002/07/owl#differentFrom":set([
-                        "http://www.w3.org/2002/07/owl#differentFrom",
-                    ]),
-            "http://www.w3.org/2000/01/rdf-schema#isDefinedBy":set([
-                        "http://www.w3.org/2000/01/rdf-schema#isDefinedBy",
-                        "http://www.w3.org/2000/01/rdf-schema#isdefinedby"
-                        # "http://www.w3.org/2007/05/powder-s#describedby"
-            ])
-        }     
-
-        for relation_to_retrieve in interesting_relations_to_retrieve:
+
+        for relation_to_retrieve in interesting_relations_classes:
             query = """
                 PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
                 PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
@@ -335,7 +367,7 @@ def retrieve_classes(sparql:SPARQLWrapper, vocabularies:dict):
                             owl:Class
                         }
                     VALUES ?relationToRetrieve{
-                        <"""+"> <".join(interesting_relations_to_retrieve[relation_to_retrieve])+""">
+                        <"""+"> <".join(interesting_relations_classes[relation_to_retrieve])+""">
                     }
                     ?classURI rdf:type ?classClasses.
                     ?classURI ?relationToRetrieve ?valueRelation.
@@ -361,42 +393,215 @@ def retrieve_classes(sparql:SPARQLWrapper, vocabularies:dict):
 
                 vocabularies[vocabulary]["Class"][result["classURI"]["value"]][relation_to_retrieve].add(valueRelation)
 
-def write_data(f, vocabularies:dict):
-    
+def from_synonym_to_relations(interesting_relations:dict) -> dict:
+    synonyms = dict()
+    for relation in interesting_relations:
+        for synonym in interesting_relations[relation]:
+            if not synonym in synonyms:
+                synonyms[synonym] = list()
+            synonyms[synonym].append(relation)
+    return synonyms
+
+def retrieve_vocabularies_bulk(sparql:SPARQLWrapper):
+    query = """
+        PREFIX vann:<http://purl.org/vocab/vann/>
+        PREFIX voaf:<http://purl.org/vocommons/voaf#>
+        
+        ### Vocabularies contained in LOV and their meta data in a single query
+        SELECT DISTINCT ?vocabURI ?relationToRetrieve ?valueRelation {
+            GRAPH <https://lov.linkeddata.es/dataset/lov>{
+                ?vocabURI a voaf:Vocabulary.
+                OPTIONAL {
+                    VALUES ?relationToRetrieve {
+                        <"""+"> <".join(interesting_relations_vocabularies)+""">
+                    }
+                    ?vocabURI ?relationToRetrieve ?valueRelation.
+                    FILTER(! isBlank(?valueRelation))
+                }
+                FILTER(! isBlank(?vocabURI))
+        }}
+    """
+
+    vocabularies = dict()
+
+    sparql.setQuery(query)
+    response = sparql.queryAndConvert()
+    for result in response["results"]["bindings"]:
+        vocabulary = result["vocabURI"]["value"]
+        if not vocabulary in vocabularies:
+            vocabularies[vocabulary] = dict()
+
+        if not "relationToRetrieve" in result:
+            continue
+
+        relation_to_retrieve = result["relationToRetrieve"]["value"]
+        if relation_to_retrieve == "http://purl.org/dc/terms/description":
+            relation_to_retrieve = "http://www.w3.org/2000/01/rdf-schema#comment"
+
+        if not relation_to_retrieve in vocabularies[vocabulary]:
+            vocabularies[vocabulary][relation_to_retrieve] = set()
+
+        vocabularies[vocabulary][relation_to_retrieve].add(curate_value(result["valueRelation"]))
+
+    return vocabularies
+
+def retrieve_components_bulk(sparql:SPARQLWrapper, vocabularies:dict, component:str, types:list, interesting_relations:dict):
+    ### One query listing the components of every named graph, one query for all their relations.
+    ### Rows are demultiplexed on ?g and on the synonym matched by ?relationToRetrieve.
     for vocabulary in vocabularies:
+        vocabularies[vocabulary][component] = dict()
 
-        ### Vocabulary meta data
-        for property_vocabulary in set(vocabularies[vocabulary].keys()).difference(["Property", "Class"]):
-            for value in vocabularies[vocabulary][property_vocabulary]:
-                f.write(f"<{vocabulary}> <{property_vocabulary}> {value}.\n")
+    query = """
+        PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
+        PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+        PREFIX owl: <http://www.w3.org/2002/07/owl#>
         
-        for property in vocabularies[vocabulary]["Property"]:
-            # f.write(f"<{property}> <http://www.w3.org/2000/01/rdf-schema#isDefinedBy> <{vocabulary}>.\n")
-            f.write(f"<{property}> <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> <http://www.w3.org/1999/02/22-rdf-syntax-ns#Property>.\n")
+        SELECT DISTINCT ?g ?componentURI {
+            GRAPH ?g {
+            VALUES ?componentType {
+                    """+" ".join(types)+"""
+                }
+            ?componentURI rdf:type ?componentType.
+            FILTER(! isBlank(?componentURI))
+        }}
+    """
 
-            for property_property in vocabularies[vocabulary]["Property"][property]:
-                for value in vocabularies[vocabulary]['Property'][property][property_property]:
-                    f.write(f"<{property}> <{property_property}> {value}.\n")
+    sparql.setQuery(query)
+    response = sparql.queryAndConvert()
+    for result in response["results"]["bindings"]:
+        vocabulary = result["g"]["value"]
+        if vocabulary in vocabularies:
+            vocabularies[vocabulary][component][result["componentURI"]["value"]] = dict()
 
-        for class_voc in vocabularies[vocabulary]["Class"]:
-            # f.write(f"<{class_voc}> <http://www.w3.org/2000/01/rdf-schema#isDefinedBy> <{vocabulary}>.\n")
-            f.write(f"<{class_voc}> <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> <http://www.w3.org/2000/01/rdf-schema#Class>.\n")
+    synonyms = from_synonym_to_relations(interesting_relations)
 
-            for property_class in vocabularies[vocabulary]["Class"][class_voc]:
-                for value in vocabularies[vocabulary]['Class'][class_voc][property_class]:
-                    f.write(f"<{class_voc}> <{property_class}> {value}.\n")
+    query = """
+        PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
+        PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+        PREFIX owl: <http://www.w3.org/2002/07/owl#>
+        
+        SELECT DISTINCT ?g ?componentURI ?relationToRetrieve ?valueRelation {
+            GRAPH ?g {
+            VALUES ?componentType {
+                    """+" ".join(types)+"""
+                }
+            VALUES ?relationToRetrieve{
+                <"""+"> <".join(synonyms)+""">
+            }
+            ?componentURI rdf:type ?componentType.
+            ?componentURI ?relationToRetrieve ?valueRelation.
+            FILTER(! isBlank(?valueRelation))
+            FILTER(! isBlank(?componentURI))
+        }}
+    """
 
-if __name__ == "__main__":
+    sparql.setQuery(query)
+    response = sparql.queryAndConvert()
+    for result in response["results"]["bindings"]:
+        vocabulary = result["g"]["value"]
+        if not vocabulary in vocabularies:
+            continue
+
+        components = vocabularies[vocabulary][component][result["componentURI"]["value"]]
+        valueRelation = curate_value(result["valueRelation"])
+        for relation_to_retrieve in synonyms[result["relationToRetrieve"]["value"]]:
+            if not relation_to_retrieve in components:
+                components[relation_to_retrieve] = set()
+            components[relation_to_retrieve].add(valueRelation)
+
+def retrieve_properties_bulk(sparql:SPARQLWrapper, vocabularies:dict):
+    retrieve_components_bulk(sparql, vocabularies, "Property",
+                             ["owl:DatatypeProperty", "owl:ObjectProperty", "rdf:Property"],
+                             interesting_relations_properties)
+
+def retrieve_classes_bulk(sparql:SPARQLWrapper, vocabularies:dict):
+    retrieve_components_bulk(sparql, vocabularies, "Class",
+                             ["rdfs:Class", "owl:Class"],
+                             interesting_relations_classes)
+
+def write_vocabulary(f, vocabulary:str, data:dict):
+
+    ### Vocabulary meta data
+    for property_vocabulary in sorted(set(data.keys()).difference(["Property", "Class"])):
+        for value in sorted(data[property_vocabulary]):
+            f.write(f"<{vocabulary}> <{property_vocabulary}> {value}.\n")
+    
+    for property in data["Property"]:
+        # f.write(f"<{property}> <http://www.w3.org/2000/01/rdf-schema#isDefinedBy> <{vocabulary}>.\n")
+        f.write(f"<{property}> <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> <http://www.w3.org/1999/02/22-rdf-syntax-ns#Property>.\n")
 
-    sparql = SPARQLWrapper(url_server)
-    sparql.setReturnFormat('json')
-    sparql.method = 'GET'
+        for property_property in data["Property"][property]:
+            for value in sorted(data['Property'][property][property_property]):
+                f.write(f"<{property}> <{property_property}> {value}.\n")
+
+    for class_voc in data["Class"]:
+        # f.write(f"<{class_voc}> <http://www.w3.org/2000/01/rdf-schema#isDefinedBy> <{vocabulary}>.\n")
+        f.write(f"<{class_voc}> <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> <http://www.w3.org/2000/01/rdf-schema#Class>.\n")
+
+        for property_class in data["Class"][class_voc]:
+            for value in sorted(data['Class'][class_voc][property_class]):
+                f.write(f"<{class_voc}> <{property_class}> {value}.\n")
+
+def write_data(f, vocabularies:dict):
+    for vocabulary in vocabularies:
+        write_vocabulary(f, vocabulary, vocabularies[vocabulary])
 
-    vocabularies = retrieve_vocabularies(sparql)
+def write_vocabulary_block(f_out, vocabulary:str, data:dict, compress:bool=False):
+    ### The triples of a vocabulary are rendered at once and appended to the binary output,
+    ### as an independent gzip member when compressed (a concatenation of members is a valid gzip file)
+    block = io.StringIO()
+    write_vocabulary(block, vocabulary, data)
+    block = block.getvalue().encode("UTF-8")
+    f_out.write(gzip.compress(block) if compress else block)
 
+def retrieve_components(sparql:SPARQLWrapper, vocabularies:dict):
     retrieve_properties(sparql, vocabularies)
     retrieve_classes(sparql, vocabularies)
 
-    with open("./HomogenizedData.nt", "w", encoding="UTF-8") as f:
-        write_data(f, vocabularies)
-        
\ No newline at end of file
+def fetch_vocabularies(sparql:SPARQLWrapper, vocabularies:dict):
+    for vocabulary in vocabularies:
+        retrieve_components(sparql, {vocabulary: vocabularies[vocabulary]})
+        yield vocabulary
+
+def stream_data(f_out, vocabularies:dict, fetched_vocabularies, compress:bool=False, journal:CheckpointJournal=None):
+    ### Each vocabulary is written as soon as it is fetched and its properties and classes are released,
+    ### only the meta data of the vocabularies stays in memory
+    for vocabulary in fetched_vocabularies:
+        write_vocabulary_block(f_out, vocabulary, vocabularies[vocabulary], compress)
+        if journal is not None:
+            journal.commit(vocabulary, f_out)
+        del vocabularies[vocabulary]["Property"]
+        del vocabularies[vocabulary]["Class"]
+
+def remaining_vocabularies(vocabularies:dict, journal:CheckpointJournal) -> dict:
+    return {vocabulary:vocabularies[vocabulary] for vocabulary in vocabularies if not journal.is_done(vocabulary)}
+
+if __name__ == "__main__":
+
+    cache = SparqlCache.from_config(cache_config, url_server) if cache_config else None
+    sparql = CachedRetryingSPARQLWrapper(url_server, cache=cache, timeout=request_timeout, max_retries=max_retries, backoff=retry_backoff)
+    sparql.setReturnFormat('json')
+    sparql.method = 'GET'
+
+    output_path = "./HomogenizedData.nt.gz" if compress_output else "./HomogenizedData.nt"
+
+    # A run stopped midway is resumed after its last written vocabulary (the journal is removed once the run is over)
+    journal = CheckpointJournal(output_path+".journal")
+
+    with journal.open_output(output_path, binary=True) as f_out:
+        if bulk_extraction:
+            vocabularies = retrieve_vocabularies_bulk(sparql)
+            retrieve_properties_bulk(sparql, vocabularies)
+            retrieve_classes_bulk(sparql, vocabularies)
+            for vocabulary in remaining_vocabularies(vocabularies, journal):
+                write_vocabulary_block(f_out, vocabulary, vocabularies[vocabulary], compress_output)
+                journal.commit(vocabulary, f_out)
+        elif parallelism > 1:
+            vocabularies = remaining_vocabularies(retrieve_vocabularies(sparql), journal)
+            pool = FetchPool(url_server, parallelism, request_timeout, max_retries, retry_backoff, CachedRetryingSPARQLWrapper, cache=cache)
+            stream_data(f_out, vocabularies, pool.imap_vocabularies(retrieve_components, vocabularies), compress_output, journal)
+        else:
+            vocabularies = remaining_vocabularies(retrieve_vocabularies(sparql), journal)
+            stream_data(f_out, vocabularies, fetch_vocabularies(sparql, vocabularies), compress_output, journal)
+
+    journal.complete()
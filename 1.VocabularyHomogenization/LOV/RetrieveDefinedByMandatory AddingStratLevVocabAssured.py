@@ -1,7 +1,7 @@
 import pandas as pd
 from SPARQLWrapper import SPARQLWrapper, BASIC
 import re
-import Levenshtein
+from NamespaceIndex import NamespaceIndex
 
 url_server = "http://localhost:7200/repositories/LOV"
 
@@ -384,6 +384,7 @@ def adding_isDefinedBy(vocabularies, components):
                             (len(components[k]["http://www.w3.org/2000/01/rdf-schema#isDefinedBy"])!=1)]
     # print(componentwc s_to_reduce)
     prefered_uris = {prefUris[1:-1]:f"<{vocab}>" for vocab in vocabularies for prefUris in vocabularies[vocab]["http://purl.org/vocab/vann/preferredNamespaceUri"] }
+    namespace_index = NamespaceIndex(prefered_uris)
     
     for uri in components_to_check:
         uri_reduced = ""
@@ -395,7 +396,7 @@ def adding_isDefinedBy(vocabularies, components):
         if uri_reduced in prefered_uris:
             components[uri]["http://www.w3.org/2000/01/rdf-schema#isDefinedBy"] = [prefered_uris[uri_reduced]]
         else:
-            best_vocab = find_best_lev_match(uri_reduced, list(prefered_uris.keys()))
+            best_vocab = namespace_index.best_match(uri_reduced)
             if best_vocab:
                 components[uri]["http://www.w3.org/2000/01/rdf-schema#isDefinedBy"] = [prefered_uris[best_vocab[1]]]
             # else:
@@ -413,27 +414,11 @@ def adding_isDefinedBy(vocabularies, components):
             # print("simple pref", uri, prefered_uris[uri_reduced], components[uri]["http://www.w3.org/2000/01/rdf-schema#isDefinedBy"])
             components[uri]["http://www.w3.org/2000/01/rdf-schema#isDefinedBy"] = [prefered_uris[uri_reduced]]
         else:
-            best_vocab = find_best_lev_match(uri_reduced, {prefUris:v for v in components[uri]["http://www.w3.org/2000/01/rdf-schema#isDefinedBy"] for prefUris in vocabularies[v]["http://purl.org/vocab/vann/preferredNamespaceUri"]})
+            candidates = {prefUris[1:-1]:v for v in components[uri]["http://www.w3.org/2000/01/rdf-schema#isDefinedBy"] for prefUris in vocabularies[v[1:-1]]["http://purl.org/vocab/vann/preferredNamespaceUri"]}
+            best_vocab = NamespaceIndex(candidates).best_match(uri_reduced)
             if best_vocab:
                 # print(uri, uri_reduced, best_vocab)
-                components[uri]["http://www.w3.org/2000/01/rdf-schema#isDefinedBy"] = [prefered_uris[best_vocab[1]]]
-
-def find_best_lev_match(uri, vocabularies):
-
-    best_match = (1_000_000_000, "")
-    returnable = False #Can the tuple be returned as good value 
-    for vocabulary in vocabularies:
-        distance = Levenshtein.distance(uri, str.encode(vocabulary[1:-1]))
-        if distance < best_match[0]:
-            best_match = (distance, vocabulary)
-            returnable = True
-        elif distance == best_match[0]: # Two vocabularies have the same likelihood
-            returnable = False
-
-    if returnable and best_match[0] < 10:
-        return best_match
-    return None
-    
+                components[uri]["http://www.w3.org/2000/01/rdf-schema#isDefinedBy"] = [candidates[best_vocab[1]]]
 
 def remove_not_isDefinedBy(components):
     for k in list(components.keys()):
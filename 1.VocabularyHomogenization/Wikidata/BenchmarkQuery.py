@@ -0,0 +1,73 @@
+import sys
+import time
+from QueryBackend import open_backend
+
+from Retrieve import SPARQL_PATH, WIKIDATA_PATH
+
+### Per query latency of the Sparql.jar backend (one JVM per query) and of the rdflib-hdt backend (HDT mapped once)
+### usage : python BenchmarkQuery.py [number_of_repetitions]
+
+queries = {
+    "property types":"""
+    SELECT DISTINCT ?property ?type
+    WHERE {
+        ?property <http://wikiba.se/ontology#propertyType> ?type.
+        FILTER(! isBlank(?property))
+    }""",
+    "sub properties":"""
+    SELECT DISTINCT ?property ?sup_prop
+    WHERE {
+        ?property <http://wikiba.se/ontology#propertyType> ?type.
+        ?property <http://www.wikidata.org/prop/direct/P1647> ?sup_prop.
+        FILTER(! isBlank(?property))
+        FILTER(! isBlank(?sup_prop))
+    }""",
+    "equivalent properties":"""
+    SELECT DISTINCT ?property ?ext_prop
+    WHERE {
+        ?property <http://wikiba.se/ontology#propertyType> ?type.
+        ?property <http://www.wikidata.org/prop/direct/P1628> ?ext_prop.
+        FILTER(! isBlank(?property))
+        FILTER(! isBlank(?ext_prop))
+    }""",
+    "class batch":"""
+    SELECT DISTINCT ?class ?c_sub
+    WHERE {
+        VALUES ?class { <http://www.wikidata.org/entity/Q5> <http://www.wikidata.org/entity/Q515> <http://www.wikidata.org/entity/Q6256> }
+        ?class <http://www.wikidata.org/prop/direct/P279> ?c_sub.
+        FILTER(! isBlank(?c_sub))
+    }"""
+}
+
+def as_set(records) -> set:
+    return {tuple(sorted((variable, binding["value"]) for variable, binding in record.items())) for record in records}
+
+def run(backend_name:str, nb_repetitions:int):
+    start = time.perf_counter()
+    backend = open_backend(backend_name, SPARQL_PATH, WIKIDATA_PATH)
+    open_time = time.perf_counter() - start
+
+    results = dict()
+    latencies = dict()
+    for name, query in queries.items():
+        latencies[name] = []
+        for _ in range(nb_repetitions):
+            start = time.perf_counter()
+            results[name] = as_set(backend.query(query))
+            latencies[name].append(time.perf_counter() - start)
+    backend.close()
+    return open_time, latencies, results
+
+if __name__ == "__main__":
+
+    nb_repetitions = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+
+    runs = {backend_name:run(backend_name, nb_repetitions) for backend_name in ["java", "hdt"]}
+
+    for backend_name, (open_time, latencies, _) in runs.items():
+        print(f"{backend_name} : opened in {open_time:.2f}s")
+        for name in queries:
+            print(f"    {name} : {sum(latencies[name])/nb_repetitions:.3f}s per query (min {min(latencies[name]):.3f}s)")
+
+    for name in queries:
+        print(f"Same results for {name} : {runs['java'][2][name] == runs['hdt'][2][name]}")
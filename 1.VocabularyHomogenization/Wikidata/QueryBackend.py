@@ -0,0 +1,110 @@
+import ijson
+import os
+import tempfile
+import threading
+import time
+from subprocess import DEVNULL, STDOUT, CalledProcessError, Popen
+
+### Both backends answer a SELECT query with an iterator over SPARQL JSON bindings
+### ({"var": {"type": ..., "value": ..., "xml:lang": ...}}), the format written by Sparql.jar
+
+class JavaBackend:
+    ### One Sparql.jar process per query : the JVM is started and the HDT index is loaded every time.
+    ### The results are written by the JVM into a named pipe and parsed while the query runs,
+    ### the query and the pipe live in a private temporary directory so several runs can share a folder.
+    def __init__(self, sparql_path:str, hdt_path:str):
+        self.sparql_path = sparql_path
+        self.hdt_path = hdt_path
+
+    def query(self, query:str):
+        with tempfile.TemporaryDirectory(prefix="wikidata_query_") as directory:
+            query_path = os.path.join(directory, "query.txt")
+            result_path = os.path.join(directory, "Result_query.json")
+            with open(query_path, "w", encoding="UTF-8") as f_w:
+                f_w.write(query)
+
+            streamed = hasattr(os, "mkfifo")
+            if streamed:
+                os.mkfifo(result_path)
+
+            process = Popen(["java", "-jar", self.sparql_path, self.hdt_path, query_path, result_path], stdout=DEVNULL, stderr=STDOUT)
+            try:
+                if streamed:
+                    opened = threading.Event()
+                    threading.Thread(target=unblock_reader, args=(process, result_path, opened), daemon=True).start()
+                    with open(result_path, "rb") as f_read:
+                        opened.set()
+                        for record in ijson.items(f_read, "results.bindings.item"):
+                            yield record
+                    check_process(process)
+                else:
+                    # No named pipes on this platform : the results are parsed once the JVM is done
+                    check_process(process)
+                    with open(result_path, "rb") as f_read:
+                        for record in ijson.items(f_read, "results.bindings.item"):
+                            yield record
+            except ijson.JSONError:
+                check_process(process)
+                raise
+            finally:
+                if process.poll() is None:
+                    process.kill()
+                    process.wait()
+
+    def close(self):
+        pass
+
+def unblock_reader(process:Popen, fifo_path:str, opened:threading.Event):
+    ### If the JVM exits without opening the pipe (wrong query, missing file) the reader would wait forever
+    ### in open(), opening the write end once releases it with an empty stream
+    process.wait()
+    while not opened.is_set():
+        try:
+            os.close(os.open(fifo_path, os.O_WRONLY | os.O_NONBLOCK))
+            return
+        except OSError:
+            time.sleep(0.05)
+
+def check_process(process:Popen):
+    returncode = process.wait()
+    if returncode:
+        raise CalledProcessError(returncode, process.args)
+
+class HDTBackend:
+    ### The HDT file is memory mapped once by rdflib-hdt and every query is evaluated in process
+    def __init__(self, hdt_path:str):
+        from rdflib import Graph
+        from rdflib_hdt import HDTStore, optimize_sparql
+
+        # Evaluate the basic graph patterns with HDT joins instead of the rdflib triple by triple evaluation
+        optimize_sparql()
+        self.store = HDTStore(hdt_path)
+        self.graph = Graph(store=self.store)
+
+    def query(self, query:str):
+        for row in self.graph.query(query):
+            yield {variable:to_binding(term) for variable, term in row.asdict().items()}
+
+    def close(self):
+        self.store.close()
+
+def to_binding(term) -> dict:
+    from rdflib import BNode, Literal
+
+    if isinstance(term, Literal):
+        binding = {"type":"literal", "value":str(term)}
+        if term.language:
+            binding["xml:lang"] = term.language
+        elif term.datatype:
+            binding["datatype"] = str(term.datatype)
+        return binding
+    if isinstance(term, BNode):
+        return {"type":"bnode", "value":str(term)}
+    return {"type":"uri", "value":str(term)}
+
+def open_backend(name:str, sparql_path:str, hdt_path:str):
+    if name == "hdt":
+        return HDTBackend(hdt_path)
+    if name == "java":
+        return JavaBackend(sparql_path, hdt_path)
+    raise ValueError(f"Unknown query backend {name}")
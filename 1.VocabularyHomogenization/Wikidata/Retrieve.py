@@ -1,20 +1,29 @@
+import os
 import re
-import ijson 
-from subprocess import DEVNULL, STDOUT, check_call
+import sys
+from QueryBackend import open_backend
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Common"))
+from Checkpoint import CheckpointJournal
 
 SPARQL_PATH = "./Sparql.jar"
 WIKIDATA_PATH = "./../Graphs_HDT/Wikidata/Wikidata_final.hdt"
+# "hdt" : the HDT file is mapped once by rdflib-hdt, "java" : one Sparql.jar process per query
+QUERY_BACKEND = "hdt"
 
-def query_wikidata(query):
-    with open("./query.txt", "w", encoding="UTF-8") as f_w:
-        f_w.write(query)
+backend = None
 
-    cmd = f"java -jar {SPARQL_PATH} {WIKIDATA_PATH} query.txt ./Result_query.json"
-    check_call(cmd, shell=True, stdout=DEVNULL, stderr=STDOUT) 
+def query_wikidata(query):
+    global backend
+    if backend is None:
+        backend = open_backend(QUERY_BACKEND, SPARQL_PATH, WIKIDATA_PATH)
+    return backend.query(query)
 
 def clean():
-    cmd = f"rm ./query.txt ./Result_query.json"
-    check_call(cmd, shell=True, stdout=DEVNULL, stderr=STDOUT)
+    ### Closes the backend, a later query opens it again
+    global backend
+    if backend is not None:
+        backend.close()
+        backend = None
 
 def curate_literal(string_to_curate:str) -> str:
     return re.sub("\s", " ", string_to_curate).replace('"',' ').replace('\\',' ')
@@ -36,23 +45,20 @@ def retrieve_properties(f_out, data):
     WHERE {
         ?property <http://wikiba.se/ontology#propertyType> ?type.
     }"""
-    query_wikidata(query)
+    for record in query_wikidata(query):
+        property = record["property"]["value"]
 
-    with open(f"Result_query.json", 'r', encoding="UTF-8") as f_read:
-        for record in ijson.items(f_read, "results.bindings.item"):
-            property = record["property"]["value"]
+        id_prop = property.split("/")[-1]
 
-            id_prop = property.split("/")[-1]
+        prefixes = ["http://www.wikidata.org/prop/direct/", "http://www.wikidata.org/prop/direct-normalized/", "http://www.wikidata.org/prop/statement/", "http://www.wikidata.org/prop/statement/value/", "http://www.wikidata.org/prop/statement/value-normalized/"]
+        for prefixe in prefixes:
+            f_out.write(f'<{property}> <http://www.graph/alternativeProp> <{prefixe}{id_prop}>.\n')
 
-            prefixes = ["http://www.wikidata.org/prop/direct/", "http://www.wikidata.org/prop/direct-normalized/", "http://www.wikidata.org/prop/statement/", "http://www.wikidata.org/prop/statement/value/", "http://www.wikidata.org/prop/statement/value-normalized/"]
-            for prefixe in prefixes:
-                f_out.write(f'<{property}> <http://www.graph/alternativeProp> <{prefixe}{id_prop}>.\n')
+        type = record["type"]["value"]
 
-            type = record["type"]["value"]
-
-            f_out.write(f'<{property}> <http://www.w3.org/2000/01/rdf-schema#isDefinedBy> <{data["VocabularyIRI"]}>.\n')
-            f_out.write(f'<{property}> <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> <{type}>.\n')
-            f_out.write(f'<{property}> <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> <http://www.w3.org/1999/02/22-rdf-syntax-ns#Property>.\n')
+        f_out.write(f'<{property}> <http://www.w3.org/2000/01/rdf-schema#isDefinedBy> <{data["VocabularyIRI"]}>.\n')
+        f_out.write(f'<{property}> <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> <{type}>.\n')
+        f_out.write(f'<{property}> <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> <http://www.w3.org/1999/02/22-rdf-syntax-ns#Property>.\n')
 
 
     #######
@@ -67,20 +73,18 @@ def retrieve_properties(f_out, data):
             FILTER (lang(?label) = lang(?description))
         }
     }"""
-    query_wikidata(query)
-    with open(f"Result_query.json", 'r', encoding="UTF-8") as f_read:
-        for record in ijson.items(f_read, "results.bindings.item"):
-            property_iri = record["property"]["value"]
+    for record in query_wikidata(query):
+        property_iri = record["property"]["value"]
 
-            label = curate_literal(str(record["label"]["value"]))
-            label_lang = record["label"]["xml:lang"]
-            f_out.write(f'<{property_iri}> <http://www.w3.org/2000/01/rdf-schema#label> "{label}"@{label_lang}.\n')
+        label = curate_literal(str(record["label"]["value"]))
+        label_lang = record["label"]["xml:lang"]
+        f_out.write(f'<{property_iri}> <http://www.w3.org/2000/01/rdf-schema#label> "{label}"@{label_lang}.\n')
 
 
-            if "description" in record:
-                descript = curate_literal(str(record["description"]["value"]))
-                descript_lang = record["description"]["xml:lang"]
-                f_out.write(f'<{property_iri}> <http://www.w3.org/2000/01/rdf-schema#comment> "{descript}"@{descript_lang}.\n')
+        if "description" in record:
+            descript = curate_literal(str(record["description"]["value"]))
+            descript_lang = record["description"]["xml:lang"]
+            f_out.write(f'<{property_iri}> <http://www.w3.org/2000/01/rdf-schema#comment> "{descript}"@{descript_lang}.\n')
         
 
     #######
@@ -93,14 +97,12 @@ def retrieve_properties(f_out, data):
         ?v <http://www.wikidata.org/prop/statement/P2302> <http://www.wikidata.org/entity/Q21503250>.
         ?v <http://www.wikidata.org/prop/qualifier/P2308> ?domain.
     }"""
-    query_wikidata(query)
-    with open(f"Result_query.json", 'r', encoding="UTF-8") as f_read:
-        for record in ijson.items(f_read, "results.bindings.item"):
-            property_iri = record["property"]["value"]
+    for record in query_wikidata(query):
+        property_iri = record["property"]["value"]
 
-            domain = record["domain"]["value"]
+        domain = record["domain"]["value"]
 
-            f_out.write(f'<{property_iri}> <https://schema.org/domainIncludes> <{domain}>.\n')
+        f_out.write(f'<{property_iri}> <https://schema.org/domainIncludes> <{domain}>.\n')
 
     #######
 
@@ -112,14 +114,12 @@ def retrieve_properties(f_out, data):
         ?statement <http://www.wikidata.org/prop/statement/P2302> <http://www.wikidata.org/entity/Q21510865>.
         ?statement <http://www.wikidata.org/prop/qualifier/P2308> ?range
     }"""
-    query_wikidata(query)
-    with open(f"Result_query.json", 'r', encoding="UTF-8") as f_read:
-        for record in ijson.items(f_read, "results.bindings.item"):
-            property_iri = record["property"]["value"]
+    for record in query_wikidata(query):
+        property_iri = record["property"]["value"]
 
-            range = record["range"]["value"]
+        range = record["range"]["value"]
 
-            f_out.write(f'<{property_iri}> <https://schema.org/rangeIncludes> <{range}>.\n')
+        f_out.write(f'<{property_iri}> <https://schema.org/rangeIncludes> <{range}>.\n')
 
 
     #######
@@ -130,14 +130,12 @@ def retrieve_properties(f_out, data):
         ?property <http://wikiba.se/ontology#propertyType> ?type.
         ?property <http://www.wikidata.org/prop/direct/P1647> ?sup_prop.
     }"""
-    query_wikidata(query)
-    with open(f"Result_query.json", 'r', encoding="UTF-8") as f_read:
-        for record in ijson.items(f_read, "results.bindings.item"):
+    for record in query_wikidata(query):
         
-            prop_iri = record["property"]["value"]
-            sup_prop = record["sup_prop"]["value"]
+        prop_iri = record["property"]["value"]
+        sup_prop = record["sup_prop"]["value"]
 
-            f_out.write(f"<{prop_iri}> <http://www.w3.org/2000/01/rdf-schema#subPropertyOf> <{sup_prop}>.\n")
+        f_out.write(f"<{prop_iri}> <http://www.w3.org/2000/01/rdf-schema#subPropertyOf> <{sup_prop}>.\n")
 
     ########
 
@@ -147,14 +145,12 @@ def retrieve_properties(f_out, data):
         ?property <http://wikiba.se/ontology#propertyType> ?type.
         ?property <http://www.wikidata.org/prop/direct/P1628> ?ext_prop.
     }"""
-    query_wikidata(query)
-    with open(f"Result_query.json", 'r', encoding="UTF-8") as f_read:
-        for record in ijson.items(f_read, "results.bindings.item"):
+    for record in query_wikidata(query):
         
-            prop_iri = record["property"]["value"]
-            ext_prop = record["ext_prop"]["value"]
+        prop_iri = record["property"]["value"]
+        ext_prop = record["ext_prop"]["value"]
 
-            f_out.write(f"<{prop_iri}> <http://www.w3.org/2002/07/owl#equivalentProperty> <{ext_prop}>.\n")
+        f_out.write(f"<{prop_iri}> <http://www.w3.org/2002/07/owl#equivalentProperty> <{ext_prop}>.\n")
 
 def retrieve_classes(f_out, data):
     query = """
@@ -162,15 +158,13 @@ def retrieve_classes(f_out, data):
         WHERE {
         ?class <http://www.wikidata.org/prop/direct/P279> ?c_sub.
         } """
-    query_wikidata(query)
-    with open(f"Result_query.json", 'r', encoding="UTF-8") as f_read:
-        for record in ijson.items(f_read, "results.bindings.item"):
-            class_sub = record["class"]["value"]
-            class_sup = record["c_sub"]["value"]
-            f_out.write(f"<{class_sub}> <http://www.w3.org/2000/01/rdf-schema#subClassOf> <{class_sup}>.\n")
+    for record in query_wikidata(query):
+        class_sub = record["class"]["value"]
+        class_sup = record["c_sub"]["value"]
+        f_out.write(f"<{class_sub}> <http://www.w3.org/2000/01/rdf-schema#subClassOf> <{class_sup}>.\n")
             
-            f_out.write(f'<{class_sub}> <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> <http://www.w3.org/1999/02/22-rdf-syntax-ns#Class>.\n')
-            f_out.write(f'<{class_sub}> <http://www.w3.org/2000/01/rdf-schema#isDefinedBy> <{data["VocabularyIRI"]}>.\n')
+        f_out.write(f'<{class_sub}> <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> <http://www.w3.org/1999/02/22-rdf-syntax-ns#Class>.\n')
+        f_out.write(f'<{class_sub}> <http://www.w3.org/2000/01/rdf-schema#isDefinedBy> <{data["VocabularyIRI"]}>.\n')
 
     query = """
         SELECT DISTINCT ?class ?label ?description
@@ -182,21 +176,19 @@ def retrieve_classes(f_out, data):
             FILTER (lang(?label) = lang(?description))
         }
         } """
-    query_wikidata(query)
-    with open(f"Result_query.json", 'r', encoding="UTF-8") as f_read:
-        for record in ijson.items(f_read, "results.bindings.item"):
-            class_iri = record["class"]["value"]
+    for record in query_wikidata(query):
+        class_iri = record["class"]["value"]
 
-            label = curate_literal(str(record["label"]["value"]))
-            label_lang = record["label"]["xml:lang"]
-            f_out.write(f'<{class_iri}> <http://www.w3.org/2000/01/rdf-schema#label> "{label}"@{label_lang}.\n')
+        label = curate_literal(str(record["label"]["value"]))
+        label_lang = record["label"]["xml:lang"]
+        f_out.write(f'<{class_iri}> <http://www.w3.org/2000/01/rdf-schema#label> "{label}"@{label_lang}.\n')
 
 
-            if "description" in record:
+        if "description" in record:
 
-                descript = curate_literal(str(record["description"]["value"]))
-                descript_lang = record["description"]["xml:lang"]
-                f_out.write(f'<{class_iri}> <http://www.w3.org/2000/01/rdf-schema#comment> "{descript}"@{descript_lang}.\n')
+            descript = curate_literal(str(record["description"]["value"]))
+            descript_lang = record["description"]["xml:lang"]
+            f_out.write(f'<{class_iri}> <http://www.w3.org/2000/01/rdf-schema#comment> "{descript}"@{descript_lang}.\n')
 
 
     query = """
@@ -207,22 +199,35 @@ def retrieve_classes(f_out, data):
         
         }
     """
-    query_wikidata(query)
-    with open(f"Result_query.json", 'r', encoding="UTF-8") as f_read:
-        for record in ijson.items(f_read, "results.bindings.item"):
-            class_iri = record["class"]["value"]
-            equivalence = record["equivalence"]["value"]
+    for record in query_wikidata(query):
+        class_iri = record["class"]["value"]
+        equivalence = record["equivalence"]["value"]
 
-            f_out.write(f"<{class_iri}> <http://www.w3.org/2002/07/owl#equivalentClass> <{equivalence}>.\n")
+        f_out.write(f"<{class_iri}> <http://www.w3.org/2002/07/owl#equivalentClass> <{equivalence}>.\n")
 
 
 if __name__ == "__main__":
     
+    # usage : python Retrieve.py [output_path], so several extractions can run in the same folder
+    output_path = sys.argv[1] if len(sys.argv) > 1 else "./HomogenizedData_Wikidata.nt"
     data = {}
 
-    with open(f"./HomogenizedData_Wikidata.nt", "w", encoding="UTF-8") as f:
-        retrieve_vocabularies(f, data)
-        retrieve_properties(f, data)
-        retrieve_classes(f, data)
+    # A run stopped midway is resumed after its last completed section (the journal is removed once the run is over)
+    journal = CheckpointJournal(output_path+".journal")
+
+    with journal.open_output(output_path) as f:
+        if journal.is_done("vocabulary"):
+            data["VocabularyIRI"] = journal.entries["vocabulary"]["VocabularyIRI"]
+        else:
+            retrieve_vocabularies(f, data)
+            journal.commit("vocabulary", f, VocabularyIRI=data["VocabularyIRI"])
+        if not journal.is_done("properties"):
+            retrieve_properties(f, data)
+            journal.commit("properties", f)
+        if not journal.is_done("classes"):
+            retrieve_classes(f, data)
+            journal.commit("classes", f)
         clean()
+
+    journal.complete()
         
\ No newline at end of file
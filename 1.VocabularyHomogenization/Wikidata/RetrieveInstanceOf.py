@@ -1,20 +1,39 @@
+import os
 import re
-import ijson 
-from subprocess import DEVNULL, STDOUT, check_call
+import shutil
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from QueryBackend import open_backend
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Common"))
+from Checkpoint import CheckpointJournal
 
 SPARQL_PATH = "./Sparql.jar"
 WIKIDATA_PATH = "./../Graphs_HDT/Wikidata/Wikidata_final.hdt"
+# "hdt" : the HDT file is mapped once by rdflib-hdt, "java" : one Sparql.jar process per query
+QUERY_BACKEND = "hdt"
+# The subclass, label and equivalence queries of the classes are run by batches in NB_WORKERS processes
+NB_WORKERS = 4
+BATCH_SIZE = 1000
+# The batch size is adapted so that the three queries of a batch take about BATCH_TARGET_TIME seconds
+BATCH_TARGET_TIME = 30
+BATCH_SIZE_MIN = 100
+BATCH_SIZE_MAX = 20000
+
+backend = None
 
 def query_wikidata(query):
-    with open("./query.txt", "w", encoding="UTF-8") as f_w:
-        f_w.write(query)
-
-    cmd = f"java -jar {SPARQL_PATH} {WIKIDATA_PATH} query.txt ./Result_query.json"
-    check_call(cmd, shell=True, stdout=DEVNULL, stderr=STDOUT) 
+    global backend
+    if backend is None:
+        backend = open_backend(QUERY_BACKEND, SPARQL_PATH, WIKIDATA_PATH)
+    return backend.query(query)
 
 def clean():
-    cmd = f"rm ./query.txt ./Result_query.json"
-    check_call(cmd, shell=True, stdout=DEVNULL, stderr=STDOUT)
+    ### Closes the backend, a later query opens it again
+    global backend
+    if backend is not None:
+        backend.close()
+        backend = None
 
 def curate_literal(string_to_curate:str) -> str:
     return re.sub("\s", " ", string_to_curate).replace('"',' ').replace('\\',' ')
@@ -38,23 +57,20 @@ def retrieve_properties(f_out, data):
         ?property <http://wikiba.se/ontology#propertyType> ?type.
         FILTER(! isBlank(?property))
     }"""
-    query_wikidata(query)
-
-    with open(f"Result_query.json", 'r', encoding="UTF-8") as f_read:
-        for record in ijson.items(f_read, "results.bindings.item"):
-            property = record["property"]["value"]
+    for record in query_wikidata(query):
+        property = record["property"]["value"]
 
-            id_prop = property.split("/")[-1]
+        id_prop = property.split("/")[-1]
 
-            prefixes = ["http://www.wikidata.org/prop/direct/", "http://www.wikidata.org/prop/direct-normalized/", "http://www.wikidata.org/prop/statement/", "http://www.wikidata.org/prop/statement/value/", "http://www.wikidata.org/prop/statement/value-normalized/"]
-            for prefixe in prefixes:
-                f_out.write(f'<{property}> <http://www.graph/alternativeProp> <{prefixe}{id_prop}>.\n')
+        prefixes = ["http://www.wikidata.org/prop/direct/", "http://www.wikidata.org/prop/direct-normalized/", "http://www.wikidata.org/prop/statement/", "http://www.wikidata.org/prop/statement/value/", "http://www.wikidata.org/prop/statement/value-normalized/"]
+        for prefixe in prefixes:
+            f_out.write(f'<{property}> <http://www.graph/alternativeProp> <{prefixe}{id_prop}>.\n')
 
-            type = record["type"]["value"]
+        type = record["type"]["value"]
 
-            f_out.write(f'<{property}> <http://www.w3.org/2000/01/rdf-schema#isDefinedBy> <{data["VocabularyIRI"]}>.\n')
-            f_out.write(f'<{property}> <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> <{type}>.\n')
-            f_out.write(f'<{property}> <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> <http://www.w3.org/1999/02/22-rdf-syntax-ns#Property>.\n')
+        f_out.write(f'<{property}> <http://www.w3.org/2000/01/rdf-schema#isDefinedBy> <{data["VocabularyIRI"]}>.\n')
+        f_out.write(f'<{property}> <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> <{type}>.\n')
+        f_out.write(f'<{property}> <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> <http://www.w3.org/1999/02/22-rdf-syntax-ns#Property>.\n')
             
 
 
@@ -72,20 +88,18 @@ def retrieve_properties(f_out, data):
             FILTER(! isBlank(?description))
         }
     }"""
-    query_wikidata(query)
-    with open(f"Result_query.json", 'r', encoding="UTF-8") as f_read:
-        for record in ijson.items(f_read, "results.bindings.item"):
-            property_iri = record["property"]["value"]
+    for record in query_wikidata(query):
+        property_iri = record["property"]["value"]
 
-            label = curate_literal(str(record["label"]["value"]))
-            label_lang = record["label"]["xml:lang"]
-            f_out.write(f'<{property_iri}> <http://www.w3.org/2000/01/rdf-schema#label> "{label}"@{label_lang}.\n')
+        label = curate_literal(str(record["label"]["value"]))
+        label_lang = record["label"]["xml:lang"]
+        f_out.write(f'<{property_iri}> <http://www.w3.org/2000/01/rdf-schema#label> "{label}"@{label_lang}.\n')
 
 
-            if "description" in record:
-                descript = curate_literal(str(record["description"]["value"]))
-                descript_lang = record["description"]["xml:lang"]
-                f_out.write(f'<{property_iri}> <http://www.w3.org/2000/01/rdf-schema#comment> "{descript}"@{descript_lang}.\n')
+        if "description" in record:
+            descript = curate_literal(str(record["description"]["value"]))
+            descript_lang = record["description"]["xml:lang"]
+            f_out.write(f'<{property_iri}> <http://www.w3.org/2000/01/rdf-schema#comment> "{descript}"@{descript_lang}.\n')
         
 
     #######
@@ -101,14 +115,12 @@ def retrieve_properties(f_out, data):
         FILTER(! isBlank(?property))
         FILTER(! isBlank(?domain))
     }"""
-    query_wikidata(query)
-    with open(f"Result_query.json", 'r', encoding="UTF-8") as f_read:
-        for record in ijson.items(f_read, "results.bindings.item"):
-            property_iri = record["property"]["value"]
+    for record in query_wikidata(query):
+        property_iri = record["property"]["value"]
 
-            domain = record["domain"]["value"]
+        domain = record["domain"]["value"]
 
-            f_out.write(f'<{property_iri}> <https://schema.org/domainIncludes> <{domain}>.\n')
+        f_out.write(f'<{property_iri}> <https://schema.org/domainIncludes> <{domain}>.\n')
 
     #######
 
@@ -122,14 +134,12 @@ def retrieve_properties(f_out, data):
             FILTER(! isBlank(?property))
             FILTER(! isBlank(?range))
     }"""
-    query_wikidata(query)
-    with open(f"Result_query.json", 'r', encoding="UTF-8") as f_read:
-        for record in ijson.items(f_read, "results.bindings.item"):
-            property_iri = record["property"]["value"]
+    for record in query_wikidata(query):
+        property_iri = record["property"]["value"]
 
-            range = record["range"]["value"]
+        range = record["range"]["value"]
 
-            f_out.write(f'<{property_iri}> <https://schema.org/rangeIncludes> <{range}>.\n')
+        f_out.write(f'<{property_iri}> <https://schema.org/rangeIncludes> <{range}>.\n')
 
 
     #######
@@ -142,14 +152,12 @@ def retrieve_properties(f_out, data):
         FILTER(! isBlank(?property))
         FILTER(! isBlank(?sup_prop))
     }"""
-    query_wikidata(query)
-    with open(f"Result_query.json", 'r', encoding="UTF-8") as f_read:
-        for record in ijson.items(f_read, "results.bindings.item"):
+    for record in query_wikidata(query):
         
-            prop_iri = record["property"]["value"]
-            sup_prop = record["sup_prop"]["value"]
+        prop_iri = record["property"]["value"]
+        sup_prop = record["sup_prop"]["value"]
 
-            f_out.write(f"<{prop_iri}> <http://www.w3.org/2000/01/rdf-schema#subPropertyOf> <{sup_prop}>.\n")
+        f_out.write(f"<{prop_iri}> <http://www.w3.org/2000/01/rdf-schema#subPropertyOf> <{sup_prop}>.\n")
 
     ########
 
@@ -161,16 +169,84 @@ def retrieve_properties(f_out, data):
         FILTER(! isBlank(?property))
         FILTER(! isBlank(?ext_prop))
     }"""
-    query_wikidata(query)
-    with open(f"Result_query.json", 'r', encoding="UTF-8") as f_read:
-        for record in ijson.items(f_read, "results.bindings.item"):
+    for record in query_wikidata(query):
         
-            prop_iri = record["property"]["value"]
-            ext_prop = record["ext_prop"]["value"]
-
-            f_out.write(f"<{prop_iri}> <http://www.w3.org/2002/07/owl#equivalentProperty> <{ext_prop}>.\n")
-
-def retrieve_classes(f_out, data):
+        prop_iri = record["property"]["value"]
+        ext_prop = record["ext_prop"]["value"]
+
+        f_out.write(f"<{prop_iri}> <http://www.w3.org/2002/07/owl#equivalentProperty> <{ext_prop}>.\n")
+
+def sync_file(f):
+    ### The file and its directory entry are on disk before a journal entry points at it
+    f.flush()
+    os.fsync(f.fileno())
+    directory = os.open(os.path.dirname(os.path.abspath(f.name)), os.O_RDONLY)
+    try:
+        os.fsync(directory)
+    finally:
+        os.close(directory)
+
+def retrieve_classes(f_out, data, journal:CheckpointJournal=None):
+    # The list of classes and the shards of the batches are kept next to the output until the end of the run,
+    # so a resumed run only queries the batches missing from the journal
+    if journal is not None and journal.is_done("class_batches"):
+        return
+    shard_folder = f"{f_out.name}.shards"
+    os.makedirs(shard_folder, exist_ok=True)
+    class_list_path = os.path.join(shard_folder, "classes.txt")
+
+    if journal is not None and journal.is_done("class_list"):
+        with open(class_list_path, "r", encoding="UTF-8") as f_classes:
+            data["Class"] = f_classes.read().split("\n")[:-1]
+    else:
+        retrieve_class_list(f_out, data)
+        with open(class_list_path, "w", encoding="UTF-8") as f_classes:
+            f_classes.write("".join(f"{class_wikidata}\n" for class_wikidata in data["Class"]))
+            sync_file(f_classes)
+        if journal is not None:
+            journal.commit("class_list", f_out)
+
+    shards = dict()
+    done_batches = dict()
+    if journal is not None:
+        for entry in journal.entries.values():
+            if entry["unit"].startswith("batch_"):
+                done_batches[entry["start"]] = entry["end"]
+                shards[entry["start"]] = os.path.join(shard_folder, entry["shard"])
+
+    with ProcessPoolExecutor(max_workers=NB_WORKERS, initializer=init_worker) as executor:
+        pending = dict()
+        batch_size = BATCH_SIZE
+        i = 0
+        while i < len(data["Class"]) or pending:
+            # At most 2 batches per worker are queued, so the later batches use the updated batch size
+            while i < len(data["Class"]) and len(pending) < 2*NB_WORKERS:
+                if i in done_batches:
+                    i = done_batches[i]
+                    continue
+                end = min([i+batch_size]+[start for start in done_batches if start > i]+[len(data["Class"])])
+                shard = f"shard_{i:09d}.nt"
+                pending[executor.submit(retrieve_class_batch, os.path.join(shard_folder, shard), data["Class"][i:end])] = (i, end, shard)
+                i = end
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                start, end, shard = pending.pop(future)
+                nb_classes, duration = future.result()
+                batch_size = next_batch_size(batch_size, nb_classes, duration)
+                shards[start] = os.path.join(shard_folder, shard)
+                if journal is not None:
+                    journal.commit(f"batch_{start}", start=start, end=end, shard=shard)
+
+    # The shards are concatenated in the order of the classes, whatever the order in which they were computed
+    for start in sorted(shards):
+        with open(shards[start], "r", encoding="UTF-8") as f_shard:
+            shutil.copyfileobj(f_shard, f_out)
+    if journal is not None:
+        journal.commit("class_batches", f_out)
+    shutil.rmtree(shard_folder)
+
+def retrieve_class_list(f_out, data):
     data["Class"] = list()
     query = """
         PREFIX wdt: <http://www.wikidata.org/prop/direct/>
@@ -180,38 +256,47 @@ def retrieve_classes(f_out, data):
             FILTER(! isBlank(?class))
         }
         """
-    query_wikidata(query)
-    with open(f"Result_query.json", 'r', encoding="UTF-8") as f_read:
-        for record in ijson.items(f_read, "results.bindings.item"):
-            class_wikidata = record["class"]["value"]
-
-            f_out.write(f'<{class_wikidata}> <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> <http://www.w3.org/2000/01/rdf-schema#Class>.\n')
-            f_out.write(f'<{class_wikidata}> <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> <http://www.w3.org/2002/07/owl#Class>.\n')
-            f_out.write(f'<{class_wikidata}> <http://www.w3.org/2000/01/rdf-schema#isDefinedBy> <{data["VocabularyIRI"]}>.\n')
-            data["Class"].append(class_wikidata)
-    
-    step = 1000
-    for i in range(0, len(data["Class"]), step):
-
+    for record in query_wikidata(query):
+        class_wikidata = record["class"]["value"]
+
+        f_out.write(f'<{class_wikidata}> <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> <http://www.w3.org/2000/01/rdf-schema#Class>.\n')
+        f_out.write(f'<{class_wikidata}> <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> <http://www.w3.org/2002/07/owl#Class>.\n')
+        f_out.write(f'<{class_wikidata}> <http://www.w3.org/2000/01/rdf-schema#isDefinedBy> <{data["VocabularyIRI"]}>.\n')
+        data["Class"].append(class_wikidata)
+    f_out.flush()
+
+def init_worker():
+    # A forked worker must not reuse the backend of the parent, each worker opens its own HDT handle or JVMs
+    global backend
+    backend = None
+
+def next_batch_size(batch_size:int, nb_classes:int, duration:float) -> int:
+    if duration <= 0:
+        return min(2*batch_size, BATCH_SIZE_MAX)
+    target_size = nb_classes * BATCH_TARGET_TIME / duration
+    # Move halfway towards the size matching the target time, a single slow or fast batch does not dictate the size
+    return int(min(max((batch_size + target_size) / 2, BATCH_SIZE_MIN), BATCH_SIZE_MAX))
+
+def retrieve_class_batch(shard_path:str, classes:list):
+    start = time.perf_counter()
+    with open(shard_path, "w", encoding="UTF-8") as f_out:
         query = """
                 SELECT DISTINCT ?class ?c_sub
                 WHERE {
-                VALUES ?class { <"""+"> <".join(data["Class"][i:i+step])+"""> }
+                VALUES ?class { <"""+"> <".join(classes)+"""> }
                 ?class <http://www.wikidata.org/prop/direct/P279> ?c_sub.
                 FILTER(! isBlank(?c_sub))
             } """
-        query_wikidata(query)
-        with open(f"Result_query.json", 'r', encoding="UTF-8") as f_read:
-            for record in ijson.items(f_read, "results.bindings.item"):
-                class_sub = record["class"]["value"]
-                class_sup = record["c_sub"]["value"]
-                f_out.write(f"<{class_sub}> <http://www.w3.org/2000/01/rdf-schema#subClassOf> <{class_sup}>.\n")
+        for record in query_wikidata(query):
+            class_sub = record["class"]["value"]
+            class_sup = record["c_sub"]["value"]
+            f_out.write(f"<{class_sub}> <http://www.w3.org/2000/01/rdf-schema#subClassOf> <{class_sup}>.\n")
 
 
         query = """
             SELECT DISTINCT ?class ?label ?description
             WHERE {
-            VALUES ?class { <"""+"> <".join(data["Class"][i:i+step])+"""> }
+            VALUES ?class { <"""+"> <".join(classes)+"""> }
             ?class <http://www.w3.org/2000/01/rdf-schema#label> ?label.
                 FILTER(! isBlank(?label))
             OPTIONAL{
@@ -219,48 +304,61 @@ def retrieve_classes(f_out, data):
                 FILTER (lang(?label) = lang(?description))
             }
             } """
-        query_wikidata(query)
-        with open(f"Result_query.json", 'r', encoding="UTF-8") as f_read:
-            for record in ijson.items(f_read, "results.bindings.item"):
-                class_iri = record["class"]["value"]
+        for record in query_wikidata(query):
+            class_iri = record["class"]["value"]
 
-                label = curate_literal(str(record["label"]["value"]))
-                label_lang = record["label"]["xml:lang"]
-                f_out.write(f'<{class_iri}> <http://www.w3.org/2000/01/rdf-schema#label> "{label}"@{label_lang}.\n')
+            label = curate_literal(str(record["label"]["value"]))
+            label_lang = record["label"]["xml:lang"]
+            f_out.write(f'<{class_iri}> <http://www.w3.org/2000/01/rdf-schema#label> "{label}"@{label_lang}.\n')
 
 
-                if "description" in record:
+            if "description" in record:
 
-                    descript = curate_literal(str(record["description"]["value"]))
-                    descript_lang = record["description"]["xml:lang"]
-                    f_out.write(f'<{class_iri}> <http://www.w3.org/2000/01/rdf-schema#comment> "{descript}"@{descript_lang}.\n')
+                descript = curate_literal(str(record["description"]["value"]))
+                descript_lang = record["description"]["xml:lang"]
+                f_out.write(f'<{class_iri}> <http://www.w3.org/2000/01/rdf-schema#comment> "{descript}"@{descript_lang}.\n')
 
 
         query = """
             SELECT DISTINCT ?class ?equivalence
             WHERE { 
-            VALUES ?class { <"""+"> <".join(data["Class"][i:i+step])+"""> }
+            VALUES ?class { <"""+"> <".join(classes)+"""> }
             ?class <http://www.wikidata.org/prop/direct/P1709> ?equivalence.
                 FILTER(! isBlank(?equivalence))
             
             }
         """
-        query_wikidata(query)
-        with open(f"Result_query.json", 'r', encoding="UTF-8") as f_read:
-            for record in ijson.items(f_read, "results.bindings.item"):
-                class_iri = record["class"]["value"]
-                equivalence = record["equivalence"]["value"]
+        for record in query_wikidata(query):
+            class_iri = record["class"]["value"]
+            equivalence = record["equivalence"]["value"]
 
-                f_out.write(f"<{class_iri}> <http://www.w3.org/2002/07/owl#equivalentClass> <{equivalence}>.\n")
+            f_out.write(f"<{class_iri}> <http://www.w3.org/2002/07/owl#equivalentClass> <{equivalence}>.\n")
+        # The batch is committed to the journal by the parent once the future returns
+        sync_file(f_out)
+
+    return len(classes), time.perf_counter() - start
 
 
 if __name__ == "__main__":
     
+    # usage : python RetrieveInstanceOf.py [output_path], so several extractions can run in the same folder
+    output_path = sys.argv[1] if len(sys.argv) > 1 else "./HomogenizedData_Wikidata.nt"
     data = {}
 
-    with open(f"./HomogenizedData_Wikidata.nt", "w", encoding="UTF-8") as f:
-        retrieve_vocabularies(f, data)
-        retrieve_properties(f, data)
-        retrieve_classes(f, data)
+    # A run stopped midway is resumed after its last completed section or class batch (the journal is removed once the run is over)
+    journal = CheckpointJournal(output_path+".journal")
+
+    with journal.open_output(output_path) as f:
+        if journal.is_done("vocabulary"):
+            data["VocabularyIRI"] = journal.entries["vocabulary"]["VocabularyIRI"]
+        else:
+            retrieve_vocabularies(f, data)
+            journal.commit("vocabulary", f, VocabularyIRI=data["VocabularyIRI"])
+        if not journal.is_done("properties"):
+            retrieve_properties(f, data)
+            journal.commit("properties", f)
+        retrieve_classes(f, data, journal)
         clean()
+
+    journal.complete()
         
\ No newline at end of file
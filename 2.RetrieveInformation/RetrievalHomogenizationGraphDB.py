@@ -3,6 +3,10 @@ from SPARQLWrapper import SPARQLWrapper, BASIC
 import re
 import json
 from subprocess import DEVNULL, STDOUT, check_call
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Common"))
+from SparqlCache import CachedSPARQLWrapper, SparqlCache
 
 def curate_literal(string_to_curate:str)->str:
     return re.sub("\s", " ", string_to_curate).replace('"',' ').replace('\\',' ')
@@ -289,7 +293,7 @@ if __name__ == "__main__":
     onto_1 = config["Ontology_1"]
     onto_2 = config["Ontology_2"]
 
-    sparql = SPARQLWrapper(url_server)
+    sparql = CachedSPARQLWrapper(url_server, cache=SparqlCache.from_config(config, url_server))
     sparql.setReturnFormat('json')
     sparql.method = 'GET'
 
@@ -0,0 +1,102 @@
+import numpy as np
+
+from SimilarityKernel import normalize, pool_languages, rescore_pairs
+
+### Approximate candidate generation for the all-vocabulary runs. An average above the threshold needs the label cosine
+### or the comment cosine (both components having a comment) above it, so the candidates are the neighbours above the
+### threshold in the label space and in the comment space, and every candidate is then rescored exactly.
+
+class IVFIndex:
+    ### Inverted file index : the vectors are clustered by spherical k-means and a query only scans the members of its
+    ### nprobe closest clusters, the recall grows with nprobe
+    def __init__(self, vectors, nlist:int=None, nprobe:int=16, iterations:int=10, seed:int=0):
+        self.vectors = normalize(vectors)
+        self.nlist = min(nlist or max(1, int(np.sqrt(len(self.vectors)))), len(self.vectors))
+        self.nprobe = min(nprobe, self.nlist)
+
+        rng = np.random.default_rng(seed)
+        self.centroids = self.vectors[rng.choice(len(self.vectors), self.nlist, replace=False)]
+        for _ in range(iterations):
+            assignment = np.argmax(self.vectors @ self.centroids.T, axis=1)
+            sums = np.zeros_like(self.centroids)
+            np.add.at(sums, assignment, self.vectors)
+            # An empty cluster keeps its centroid
+            filled = np.bincount(assignment, minlength=self.nlist) > 0
+            self.centroids[filled] = normalize(sums[filled])
+        assignment = np.argmax(self.vectors @ self.centroids.T, axis=1)
+        order = np.argsort(assignment, kind="stable")
+        self.lists = np.split(order, np.searchsorted(assignment[order], np.arange(1, self.nlist)))
+
+    def range_search(self, queries, threshold:float):
+        ### Sparse (rows, columns) of the indexed vectors whose cosine with a query is above threshold
+        queries = normalize(queries)
+        probes = np.argpartition(-(queries @ self.centroids.T), self.nprobe-1, axis=1)[:, :self.nprobe].ravel()
+        order = np.argsort(probes, kind="stable")
+        bounds = np.searchsorted(probes[order], np.arange(self.nlist+1))
+        rows, columns = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)]
+        for cluster, members in enumerate(self.lists):
+            probing = order[bounds[cluster]:bounds[cluster+1]] // self.nprobe
+            if len(probing) == 0 or len(members) == 0:
+                continue
+            cluster_rows, cluster_columns = np.nonzero(queries[probing] @ self.vectors[members].T > threshold)
+            rows.append(probing[cluster_rows])
+            columns.append(members[cluster_columns])
+        return np.concatenate(rows), np.concatenate(columns)
+
+class HNSWIndex:
+    ### hnswlib graph over the inner product of the normalized vectors, a query only sees its k nearest neighbours
+    def __init__(self, vectors, k:int=100, M:int=16, ef_construction:int=200, ef:int=200):
+        import hnswlib
+
+        vectors = normalize(vectors)
+        self.k = min(k, len(vectors))
+        self.index = hnswlib.Index(space="ip", dim=vectors.shape[1])
+        self.index.init_index(max_elements=len(vectors), ef_construction=ef_construction, M=M)
+        self.index.add_items(vectors)
+        self.index.set_ef(max(ef, self.k))
+
+    def range_search(self, queries, threshold:float):
+        neighbours, distances = self.index.knn_query(normalize(queries), k=self.k)
+        # The ip distance of hnswlib is 1 - inner product
+        rows, ranks = np.nonzero(1 - distances > threshold)
+        return rows, neighbours[rows, ranks].astype(np.int64)
+
+def open_index(backend:str, vectors, **parameters):
+    if backend == "ivf":
+        return IVFIndex(vectors, **parameters)
+    if backend == "hnsw":
+        return HNSWIndex(vectors, **parameters)
+    raise ValueError(f"Unknown similarity backend {backend}")
+
+def candidate_pairs(labels, comments, has_comment, threshold:float, backend:str="ivf", **parameters):
+    ### Unique (rows, columns) pairs, sorted, whose label or comment cosine is above threshold according to the index.
+    ### Embeddings of several languages are indexed by their mean (SimilarityKernel.pool_languages)
+    size = len(labels)
+    labels, comments = pool_languages(labels), pool_languages(comments)
+    rows, columns = open_index(backend, labels, **parameters).range_search(labels, threshold)
+    commented = np.nonzero(has_comment)[0]
+    if len(commented) > 0:
+        comment_rows, comment_columns = open_index(backend, comments[commented], **parameters).range_search(comments[commented], threshold)
+        rows = np.concatenate((rows, commented[comment_rows]))
+        columns = np.concatenate((columns, commented[comment_columns]))
+    pairs = np.unique(rows*size + columns)
+    return pairs // size, pairs % size
+
+def ann_pairs(labels, comments, has_comment, threshold:float, top_k:int=None, groups=None, backend:str="ivf",
+              aggregation:str="mean", **parameters):
+    ### Same output as SimilarityKernel.threshold_pairs of a set of components against itself, in one block,
+    ### restricted to the pairs found by the index
+    labels, comments = normalize(labels), normalize(comments)
+    rows, columns = candidate_pairs(labels, comments, has_comment, threshold, backend, **parameters)
+    if groups is not None:
+        different = groups[rows] != groups[columns]
+        rows, columns = rows[different], columns[different]
+    return rescore_pairs(labels, comments, has_comment, rows, columns, threshold, top_k, aggregation)
+
+def recall(approximate, exact) -> float:
+    ### Share of the exact (rows, columns) pairs found by the approximate search
+    if len(exact[0]) == 0:
+        return 1.0
+    size = 1 + max(int(part.max()) for part in (*exact, *approximate) if len(part) > 0)
+    found = np.isin(exact[0]*size + exact[1], approximate[0]*size + approximate[1])
+    return float(found.mean())
@@ -0,0 +1,75 @@
+import json
+import numpy as np
+import os
+import random
+import sys
+import time
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Common"))
+from SparqlCache import CachedSPARQLWrapper, SparqlCache
+
+import ComputeSimilarityBASICForAllOPTI2 as opti2
+from Embedding import BATCH_SIZE, BatchedModel, configure_threads, open_model
+from SimilarityKernel import compute_scores
+
+### Compare the embedding backends on a fixed sample of LOV classes : throughput, and agreement of the average scores
+### with the first backend (correlation, pairs above the threshold found by both)
+### usage : python BenchmarkEmbedding.py [sample_size] [backend[:quantization][=model_path] ...]
+### e.g. python BenchmarkEmbedding.py 2000 use sentence-transformers sentence-transformers:int8 onnx:int8=./minilm-onnx hashing
+
+BACKENDS = ["use", "sentence-transformers", "sentence-transformers:int8", "sentence-transformers:float16", "hashing"]
+
+def parse_backend(argument:str):
+    argument, _, model_path = argument.partition("=")
+    backend, _, quantization = argument.partition(":")
+    return backend, None, model_path or None, quantization or None
+
+def retrieve_sample(size:int, language:str="en"):
+    ### Same classes on every run : vocabularies and classes are sorted before a seeded sample
+    classes = dict()
+    for vocabulary in sorted(opti2.retrieve_vocabularies()):
+        classes.update(opti2.retrieve_classes_from_vocab(vocabulary, [language]))
+    keys = random.Random(0).sample(sorted(classes), min(size, len(classes)))
+    labels = [classes[key]["label"].get(language, "") for key in keys]
+    comments = [classes[key]["comment"].get(language, "") for key in keys]
+    has_comment = np.array([language in classes[key]["comment"] for key in keys])
+    return labels, comments, has_comment
+
+def agreement(average:np.ndarray, reference:np.ndarray, threshold:float):
+    upper = np.triu_indices(len(average), k=1)
+    correlation = np.corrcoef(average[upper], reference[upper])[0, 1]
+    above, reference_above = average[upper] > threshold, reference[upper] > threshold
+    both = np.sum(above & reference_above) / max(np.sum(above | reference_above), 1)
+    return correlation, both
+
+if __name__ == "__main__":
+    config = json.load(open("config.json", "r"))
+    url_server = config["URL_endpoint"]
+    opti2.sparql = CachedSPARQLWrapper(url_server, cache=SparqlCache.from_config(config, url_server))
+    opti2.sparql.setReturnFormat('json')
+    opti2.sparql.method = 'GET'
+    configure_threads(config.get("Intra_Op_Threads"), config.get("Inter_Op_Threads"))
+    threshold = 0.5
+
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    backends = sys.argv[2:] or BACKENDS
+    labels, comments, has_comment = retrieve_sample(size)
+    print(f"Sample : {len(labels)} classes, {int(has_comment.sum())} with a comment")
+
+    reference = None
+    for backend in backends:
+        try:
+            model = BatchedModel(open_model(*parse_backend(backend)), config.get("Embedding_Batch_Size") or BATCH_SIZE)
+        except (ImportError, OSError, ValueError) as e:
+            print(f"{backend} : skipped ({e})")
+            continue
+        start = time.perf_counter()
+        labels_embedding, comments_embedding = model(labels), model(comments)
+        duration = time.perf_counter() - start
+        _, _, average, _ = compute_scores(labels_embedding, comments_embedding, has_comment, labels_embedding, comments_embedding, has_comment)
+
+        print(f"{backend} : {model.embedded/duration:.0f} sentences/s ({model.embedded} sentences in {duration:.1f}s, dimension {labels_embedding.shape[1]})")
+        if reference is None:
+            reference = (backend, average)
+        else:
+            correlation, both = agreement(average, reference[1], threshold)
+            print(f"    against {reference[0]} : correlation {correlation:.4f}, pairs above {threshold} in common {100*both:.1f}%")
@@ -0,0 +1,71 @@
+import json
+import numpy as np
+import os
+import sys
+import time
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Common"))
+from SparqlCache import CachedSPARQLWrapper, SparqlCache
+
+import ComputeSimilarity as cs
+from Embedding import BatchedModel, LazyModel, model_id, model_settings
+from EmbeddingStore import EmbeddingStore
+from SimilarityKernel import max_pooling
+
+### Compare the domain/range similarity of the properties computed pair by pair on the string indexed DataFrame
+### with the max-pooling over the class similarity matrix, on schema.org and DBpedia
+### usage : python BenchmarkPropertySimilarity.py [number_of_properties] [ontology_1] [ontology_2]
+
+def find_best_classes_sim(similarity_classes, classes_1, classes_2):
+    ### Former implementation, for reference
+    best_value = -10
+    for class_1 in classes_1:
+        for class_2 in classes_2:
+            if str((class_1, class_2)) in similarity_classes.index:
+                best_value = max(best_value, similarity_classes.loc[str((class_1, class_2))]["Average"])
+    return best_value
+
+def domains_and_ranges(properties:dict, keys:list, classes:dict):
+    domains = [[classes[c] for c in properties[key]["domain"].union(properties[key]["domainIncludes"]) if c in classes] for key in keys]
+    ranges = [[classes[c] for c in properties[key]["range"].union(properties[key]["rangeIncludes"]) if c in classes] for key in keys]
+    return domains, ranges
+
+if __name__ == "__main__":
+    config = json.load(open("config.json", "r"))
+    url_server = config["URL_endpoint"]
+    cs.config = config
+    cs.sparql = CachedSPARQLWrapper(url_server, cache=SparqlCache.from_config(config, url_server))
+    cs.sparql.setReturnFormat('json')
+    cs.sparql.method = 'GET'
+    cs.model = BatchedModel.from_config(config, LazyModel(cs.init_model))
+    cs.embedding_store = EmbeddingStore.from_config(config, model_id(*model_settings(config)))
+    cs.language_aggregation = config.get("Language_Aggregation") or "mean"
+
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    onto_1 = sys.argv[2] if len(sys.argv) > 2 else "http://schema.org/"
+    onto_2 = sys.argv[3] if len(sys.argv) > 3 else "http://dbpedia.org/ontology/"
+    languages = config["Lang_Allowed"]
+
+    classes_1, classes_2 = cs.retrieve_classes_from_vocab(onto_1, languages), cs.retrieve_classes_from_vocab(onto_2, languages)
+    properties_1, properties_2 = cs.retrieve_properties_from_vocab(onto_1, languages), cs.retrieve_properties_from_vocab(onto_2, languages)
+    df_classes, (rows, columns, average) = cs.compute_similarity_classes(classes_1, classes_2, languages)
+    keys_1, keys_2 = list(properties_1), list(properties_2)
+    print(f"Classes : {len(classes_1)} x {len(classes_2)}, properties : {len(keys_1)} x {len(keys_2)}")
+
+    start = time.perf_counter()
+    domains_1, ranges_1 = domains_and_ranges(properties_1, keys_1, rows)
+    domains_2, ranges_2 = domains_and_ranges(properties_2, keys_2, columns)
+    domain, range_ = max_pooling(average, domains_1, domains_2), max_pooling(average, ranges_1, ranges_2)
+    pooled_time = time.perf_counter() - start
+    print(f"Max pooling : {pooled_time:.3f}s for {len(keys_1)*len(keys_2)} property pairs")
+
+    sample_1, sample_2 = keys_1[:size], keys_2[:size]
+    start = time.perf_counter()
+    reference_domain = [[find_best_classes_sim(df_classes, properties_1[k1]["domain"] | properties_1[k1]["domainIncludes"], properties_2[k2]["domain"] | properties_2[k2]["domainIncludes"]) for k2 in sample_2] for k1 in sample_1]
+    reference_range = [[find_best_classes_sim(df_classes, properties_1[k1]["range"] | properties_1[k1]["rangeIncludes"], properties_2[k2]["range"] | properties_2[k2]["rangeIncludes"]) for k2 in sample_2] for k1 in sample_1]
+    reference_time = time.perf_counter() - start
+    pairs = len(sample_1) * len(sample_2)
+    print(f"Pair by pair : {reference_time:.3f}s for {pairs} property pairs ({1000*reference_time/max(pairs, 1):.3f}ms per pair)")
+
+    same = np.allclose(domain[:len(sample_1), :len(sample_2)], np.array(reference_domain).reshape(len(sample_1), len(sample_2))) and \
+           np.allclose(range_[:len(sample_1), :len(sample_2)], np.array(reference_range).reshape(len(sample_1), len(sample_2)))
+    print(f"Same domain and range similarities : {same}")
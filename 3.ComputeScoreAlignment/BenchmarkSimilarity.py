@@ -0,0 +1,118 @@
+import json
+import numpy as np
+import os
+import sys
+import time
+import tracemalloc
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Common"))
+from SparqlCache import CachedSPARQLWrapper, SparqlCache
+
+import ComputeSimilarityBASICForAllOPTI2 as opti2
+from Embedding import BatchedModel, LazyModel, model_id, model_settings
+from EmbeddingStore import EmbeddingStore
+from SimilarityKernel import compute_scores, has_comment_mask, normalize, rescore_pairs, threshold_pairs
+from AnnIndex import ann_pairs, recall
+from LexicalBlocking import blocking_pairs, lexical_candidates
+
+### Compare the dense all-pairs scores with the thresholded and top-k sparse pairs, with the approximate
+### nearest-neighbour backends and with the lexical blocking (recall against the exact thresholded pairs, pairs
+### pruned by the blocking) on the classes of every LOV vocabulary
+### usage : python BenchmarkSimilarity.py [number_of_classes] [top_k]
+
+# Above this number of classes the dense matrices do not fit in memory and the dense path is skipped
+DENSE_LIMIT = 10000
+
+def measure(function):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function()
+    duration = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, duration, peak
+
+def dense_pairs(labels, comments, has_comment, vocabularies, threshold):
+    _, _, average, _ = compute_scores(labels, comments, has_comment, labels, comments, has_comment, aggregation=opti2.language_aggregation)
+    rows, columns = np.nonzero((average > threshold) & (vocabularies[:, None] != vocabularies[None, :]))
+    return rows, columns, average[rows, columns]
+
+def sparse_pairs(labels, comments, has_comment, vocabularies, threshold, top_k=None):
+    blocks = list(threshold_pairs(labels, comments, has_comment, labels, comments, has_comment, threshold, top_k, vocabularies, vocabularies, aggregation=opti2.language_aggregation))
+    return tuple(np.concatenate(parts) for parts in zip(*blocks))
+
+def check_comment_languages(aggregation):
+    ### Two classes with the same label and comments in different languages : the comments share no language, so the
+    ### average is the label cosine (1) and the pair is kept, by the dense, sparse and rescored paths
+    labels = np.zeros((2, 2, 2), dtype=np.float32)
+    labels[:, 0, 0] = 1
+    comments = np.zeros((2, 2, 2), dtype=np.float32)
+    comments[0, 0, 1] = comments[1, 1, 0] = 1
+    has_comment = np.ones(2, dtype=bool)
+    vocabularies = np.array([0, 1])
+    _, _, average, comment_used = compute_scores(labels, comments, has_comment, labels, comments, has_comment, aggregation=aggregation)
+    sparse = sparse_pairs(labels, comments, has_comment, vocabularies, 0.5)
+    rescored = rescore_pairs(normalize(labels), normalize(comments), has_comment, np.array([0]), np.array([1]), 0.5, aggregation=aggregation)
+    return average[0, 1] == 1 and not comment_used[0, 1] and list(sparse[2]) == [1, 1] and list(rescored[2]) == [1]
+
+def report(name, result, duration, peak):
+    print(f"{name} : {duration:.2f}s, peak memory {peak/1_000_000:.1f} MB, {len(result[0])} pairs")
+
+if __name__ == "__main__":
+    config = json.load(open("config.json", "r"))
+    url_server = config["URL_endpoint"]
+    opti2.sparql = CachedSPARQLWrapper(url_server, cache=SparqlCache.from_config(config, url_server))
+    opti2.sparql.setReturnFormat('json')
+    opti2.sparql.method = 'GET'
+    opti2.config = config
+    opti2.model = BatchedModel.from_config(config, LazyModel(opti2.init_model))
+    opti2.embedding_store = EmbeddingStore.from_config(config, model_id(*model_settings(config)))
+    opti2.language_aggregation = config.get("Language_Aggregation") or "mean"
+    threshold = 0.5
+    top_k = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    if opti2.language_aggregation != "pooled":
+        print(f"Comments without a common language ignored : {check_comment_languages(opti2.language_aggregation)}")
+
+    keys, labels, no_comments, comments, texts = opti2.retrieve_classes_from_n_vocab(list(opti2.retrieve_vocabularies()), config["Lang_Allowed"])
+    labels, comments = np.asarray(labels), np.asarray(comments)
+    has_comment = has_comment_mask(no_comments, len(keys))
+    if len(sys.argv) > 1:
+        size = int(sys.argv[1])
+        keys, labels, comments, has_comment, texts = keys[:size], labels[:size], comments[:size], has_comment[:size], texts[:size]
+    vocabularies = np.unique([key[0] for key in keys], return_inverse=True)[1]
+    print(f"Classes : {len(keys)}, vocabularies : {vocabularies.max()+1 if len(keys) else 0}")
+
+    sparse, duration, peak = measure(lambda: sparse_pairs(labels, comments, has_comment, vocabularies, threshold))
+    report("Threshold", sparse, duration, peak)
+    report(f"Top {top_k}", *measure(lambda: sparse_pairs(labels, comments, has_comment, vocabularies, threshold, top_k)))
+
+    for backend, parameters in [("ivf", {"nprobe":4}), ("ivf", {"nprobe":16}), ("ivf", {"nprobe":64}), ("hnsw", {"k":100})]:
+        try:
+            approximate, duration, peak = measure(lambda: ann_pairs(labels, comments, has_comment, threshold, None, vocabularies, backend, opti2.language_aggregation, **parameters))
+        except ImportError as e:
+            print(f"{backend} : skipped ({e})")
+            continue
+        report(f"{backend} {parameters}", approximate, duration, peak)
+        print(f"    recall : {recall(approximate, sparse):.4f}")
+
+    # Ordered pairs of classes of different vocabularies, the pairs scored by the exhaustive run
+    pairs = len(keys)**2 - int(np.sum(np.bincount(vocabularies)**2))
+    for parameters in [{"jaccard":0.5, "recall":0.9}, {"jaccard":0.3, "recall":0.95}, {"jaccard":0.2, "recall":0.99},
+                       {"jaccard":0.3, "recall":0.95, "min_ratio":0.5}]:
+        try:
+            blocked, duration, peak = measure(lambda: blocking_pairs(labels, comments, has_comment, texts, threshold, None, vocabularies, opti2.language_aggregation, **parameters))
+        except ImportError as e:
+            print(f"lexical {parameters} : skipped ({e})")
+            continue
+        report(f"lexical {parameters}", blocked, duration, peak)
+        rows, columns = lexical_candidates(texts, **parameters)
+        candidates = int(np.sum(vocabularies[rows] != vocabularies[columns]))
+        lost = len(sparse[0]) - round(recall(blocked, sparse) * len(sparse[0]))
+        print(f"    pairs pruned : {pairs-candidates} of {pairs} ({100*(pairs-candidates)/max(pairs, 1):.2f}%), "
+              f"similarity pairs lost : {lost} of {len(sparse[0])} (recall {recall(blocked, sparse):.4f})")
+
+    if len(keys) <= DENSE_LIMIT:
+        dense, duration, peak = measure(lambda: dense_pairs(labels, comments, has_comment, vocabularies, threshold))
+        report("Dense", dense, duration, peak)
+        print(f"Same pairs : {all(np.array_equal(a, b) for a, b in zip(dense, sparse))}")
+    else:
+        print(f"Dense : skipped above {DENSE_LIMIT} classes")
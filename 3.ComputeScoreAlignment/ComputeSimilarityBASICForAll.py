@@ -1,16 +1,17 @@
 from SPARQLWrapper import SPARQLWrapper, BASIC
 import json
-from absl import logging
-import tensorflow as tf
-import tensorflow_hub as hub
-import matplotlib.pyplot as plt
 import numpy as np
 import os
 import pandas as pd
-import re
-import seaborn as sns
-from sklearn.metrics.pairwise import cosine_similarity
 from tqdm import tqdm
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Common"))
+from SparqlCache import CachedSPARQLWrapper, SparqlCache
+from Embedding import BatchedModel, LazyModel, configure_threads, model_id, model_settings, open_model
+from EmbeddingStore import EmbeddingStore
+from LanguageEmbedding import embed_languages, in_languages
+from SimilarityKernel import compute_scores, has_comment_mask
+from SimilarityOutput import QuadWriter
 
 def retrieve_vocabularies():
     query = """
@@ -123,25 +124,26 @@ def retrieve_properties_from_vocab(uri_vocab, languages):
     
     return properties
 
-def compute_similarity(data_1, data_2, language="en"):
+def compute_similarity(data_1, data_2, languages=("en",)):
     if len(data_1.keys())>0 and len(data_2.keys())>0:
         keys_1 = list(data_1.keys())
-        data_1_labels_embedding = embed([data_1[key]["label"][language] if 'en' in data_1[key]["label"] else "" for key in keys_1])
-        classes_1_with_no_comments = set([-1 if 'en' in data_1[key]["comment"] else i for i, key in enumerate(keys_1)])
-        data_1_comments_embedding = embed([data_1[key]["comment"][language] if 'en' in data_1[key]["comment"] else "" for key in keys_1])
+        data_1_labels_embedding = embed_languages(embed, [data_1[key]["label"] for key in keys_1], languages, language_aggregation)
+        classes_1_with_no_comments = set([-1 if in_languages(data_1[key]["comment"], languages) else i for i, key in enumerate(keys_1)])
+        data_1_comments_embedding = embed_languages(embed, [data_1[key]["comment"] for key in keys_1], languages, language_aggregation)
 
         keys_2 = list(data_2.keys())
-        data_2_labels_embedding = embed([data_2[key]["label"][language] if 'en' in data_2[key]["label"] else "" for key in keys_2])
-        classes_2_with_no_comments = set([-1 if 'en' in data_2[key]["comment"] else i for i, key in enumerate(keys_2)])
-        data_2_comments_embedding = embed([data_2[key]["comment"][language] if 'en' in data_2[key]["comment"] else "" for key in keys_2  ])
+        data_2_labels_embedding = embed_languages(embed, [data_2[key]["label"] for key in keys_2], languages, language_aggregation)
+        classes_2_with_no_comments = set([-1 if in_languages(data_2[key]["comment"], languages) else i for i, key in enumerate(keys_2)])
+        data_2_comments_embedding = embed_languages(embed, [data_2[key]["comment"] for key in keys_2], languages, language_aggregation)
 
-        cosine_similarity_labels = cosine_similarity(data_1_labels_embedding, data_2_labels_embedding)
-        cosine_similarity_comments = cosine_similarity(data_1_comments_embedding, data_2_comments_embedding)
+        cosine_similarity_labels, cosine_similarity_comments, cosine_similarity_average, comment_used = compute_scores(
+            data_1_labels_embedding, data_1_comments_embedding, has_comment_mask(classes_1_with_no_comments, len(keys_1)),
+            data_2_labels_embedding, data_2_comments_embedding, has_comment_mask(classes_2_with_no_comments, len(keys_2)), aggregation=language_aggregation)
         
         flatten_cosine_similarity_labels = cosine_similarity_labels.flatten()
         flatten_cosine_similarity_comments = cosine_similarity_comments.flatten() 
-        flatten_cosine_similarity_average = np.array([np.average([cosine_similarity_labels[i][j], cosine_similarity_comments[i][j]]) if i not in classes_1_with_no_comments and j not in classes_2_with_no_comments else cosine_similarity_labels[i][j]  for i in range(len(keys_1)) for j in range(len(keys_2))]).flatten()
-        comment_used = [i not in classes_1_with_no_comments and j not in classes_2_with_no_comments  for i in range(len(keys_1)) for j in range(len(keys_2))]
+        flatten_cosine_similarity_average = cosine_similarity_average.flatten()
+        comment_used = comment_used.flatten()
         
         df = pd.DataFrame(data={
                                     "Components" : [(i,j) for i in keys_1 for j in keys_2],
@@ -156,27 +158,27 @@ def compute_similarity(data_1, data_2, language="en"):
 
     return df
 
+embedding_store = None
+language_aggregation = "mean"
+
 def init_model():
-    module_url = "https://tfhub.dev/google/universal-sentence-encoder/4"
-    model = hub.load(module_url)
-    return model
+    configure_threads(config.get("Intra_Op_Threads"), config.get("Inter_Op_Threads"))
+    return open_model(*model_settings(config))
 
 def embed(input):
+  if embedding_store is not None:
+    return embedding_store.embed(input, model)
   return model(input)
 
-def from_value_to_interval(value):
-    for i in np.arange(global_threshold, 1.5, intervals):
-        if value < i:
-            return f"{np.around(i-intervals, precision)}_{np.around(i, precision)}" 
-    return None
-
 if __name__ == "__main__":
     print('Start')
     config = json.load(open("config.json", "r"))
 
     url_server = config["URL_endpoint"]
     languages = config["Lang_Allowed"]
-    sparql = SPARQLWrapper(url_server)
+    # Languages of a pair combined by the mean or the best of their per-language scores, or pooled embeddings, see LanguageEmbedding.py
+    language_aggregation = config.get("Language_Aggregation") or "mean"
+    sparql = CachedSPARQLWrapper(url_server, cache=SparqlCache.from_config(config, url_server))
     sparql.setReturnFormat('json')
     sparql.method = 'GET'
     print('2')
@@ -184,28 +186,25 @@ if __name__ == "__main__":
     intervals = 0.01
     precision = 2
 
-    model = init_model()
+    model = BatchedModel.from_config(config, LazyModel(init_model))
+    embedding_store = EmbeddingStore.from_config(config, model_id(*model_settings(config)))
     print('Load Data')    
     
     vocabularies = list(retrieve_vocabularies())
     classes_per_onto = retrieve_classes_from_n_vocab(vocabularies, languages)
     properties_per_onto = retrieve_properties_from_n_vocab(vocabularies, languages)
     print('Compute Similarity')
-    with open("./Similarity.nq", "w", encoding="UTF-8") as f_out:
+    with QuadWriter("./Similarity.nq", "<http://KG_nexux.com/equivalenceScore>", global_threshold, intervals, precision, config.get("Similarity_Compression")) as writer:
         f = open("./follow", "w")
         for i in tqdm((range(10)), file=f): #tqdm(range(len(vocabularies)), file=f):
             for j in range(i+1, 10):
-                # sim_class = pd.concat([sim_class, compute_similarity(classes_per_onto[vocabularies[i]], classes_per_onto[vocabularies[j]], "en")])
-                # sim_props = pd.concat([sim_props, compute_similarity(properties_per_onto[vocabularies[i]], classes_per_onto[vocabularies[j]], "en")])
-                df_c = (compute_similarity(classes_per_onto[vocabularies[i]], classes_per_onto[vocabularies[j]], "en"))
-                for (c1, c2), average in df_c[["Components", "Average"]].values:
-                    if average > global_threshold:
-                        f_out.write(f"<{c1}> <http://KG_nexux.com/equivalenceScore> <{c2}> <http://value/{from_value_to_interval(average)}>.\n")
+                # sim_class = pd.concat([sim_class, compute_similarity(classes_per_onto[vocabularies[i]], classes_per_onto[vocabularies[j]], languages)])
+                # sim_props = pd.concat([sim_props, compute_similarity(properties_per_onto[vocabularies[i]], classes_per_onto[vocabularies[j]], languages)])
+                df_c = (compute_similarity(classes_per_onto[vocabularies[i]], classes_per_onto[vocabularies[j]], languages))
+                writer.write_frame(df_c)
                 
-                df_p = (compute_similarity(properties_per_onto[vocabularies[i]], properties_per_onto[vocabularies[j]], "en"))
-                for (c1, c2), average in df_p[["Components", "Average"]].values:
-                    if average > global_threshold:
-                        f_out.write(f"<{c1}> <http://KG_nexux.com/equivalenceScore> <{c2}> <http://value/{from_value_to_interval(average)}>.\n")
+                df_p = (compute_similarity(properties_per_onto[vocabularies[i]], properties_per_onto[vocabularies[j]], languages))
+                writer.write_frame(df_p)
         
         f.close()
 
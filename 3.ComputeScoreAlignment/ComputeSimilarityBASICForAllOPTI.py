@@ -1,16 +1,17 @@
 from SPARQLWrapper import SPARQLWrapper, BASIC
 import json
-from absl import logging
-import tensorflow as tf
-import tensorflow_hub as hub
-import matplotlib.pyplot as plt
 import numpy as np
 import os
 import pandas as pd
-import re
-import seaborn as sns
-from sklearn.metrics.pairwise import cosine_similarity
-from tqdm import tqdm
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Common"))
+from SparqlCache import CachedSPARQLWrapper, SparqlCache
+from Embedding import BatchedModel, LazyModel, configure_threads, model_id, model_settings, open_model
+from EmbeddingStore import EmbeddingStore
+from IncrementalScoring import content_hash, run_incremental_scoring
+from LanguageEmbedding import embed_languages, in_languages
+from ShardedScoring import run_sharded_scoring
+from SimilarityKernel import compute_scores, has_comment_mask
 
 def retrieve_vocabularies():
     query = """
@@ -30,7 +31,7 @@ def retrieve_vocabularies():
 def retrieve_classes_from_n_vocab(vocabularies, languages):
     classes_per_vocab = dict()
     for vocabulary in vocabularies:
-        data = retrieve_classes_from_vocab(vocabulary, [languages])
+        data = retrieve_classes_from_vocab(vocabulary, languages)
         classes_per_vocab[vocabulary] = (data, compute_embedding(data, languages))
     return classes_per_vocab
 
@@ -79,7 +80,7 @@ def retrieve_classes_from_vocab(uri_vocab, languages):
 def retrieve_properties_from_n_vocab(vocabularies, languages):
     properties_per_vocab = dict()
     for vocabulary in vocabularies:
-        data = retrieve_properties_from_vocab(vocabulary, [languages])
+        data = retrieve_properties_from_vocab(vocabulary, languages)
         properties_per_vocab[vocabulary] = (data, compute_embedding(data, languages))
     return properties_per_vocab
 
@@ -125,18 +126,18 @@ def retrieve_properties_from_vocab(uri_vocab, languages):
     
     return properties
 
-def compute_embedding(data, language):
+def compute_embedding(data, languages):
     if len(data.keys())>0 :
         keys = list(data.keys())
-        data_labels_embedding = embed([data[key]["label"][language] if 'en' in data[key]["label"] else "" for key in keys])
-        data_with_no_comments = set([-1 if 'en' in data[key]["comment"] else i for i, key in enumerate(keys)])
-        data_comments_embedding = embed([data[key]["comment"][language] if 'en' in data[key]["comment"] else "" for key in keys])
+        data_labels_embedding = embed_languages(embed, [data[key]["label"] for key in keys], languages, language_aggregation)
+        data_with_no_comments = set([-1 if in_languages(data[key]["comment"], languages) else i for i, key in enumerate(keys)])
+        data_comments_embedding = embed_languages(embed, [data[key]["comment"] for key in keys], languages, language_aggregation)
 
         return (keys, data_labels_embedding, data_with_no_comments, data_comments_embedding)
     else:
         return ([],[],[],[])
 
-def compute_similarity(data_1, data_2, language="en"):
+def compute_similarity(data_1, data_2):
     if len(data_1[0])>0 and len(data_2[0])>0:
         keys_1 = data_1[0]
         data_1_labels_embedding =  data_1[1]
@@ -148,13 +149,14 @@ def compute_similarity(data_1, data_2, language="en"):
         classes_2_with_no_comments = data_2[2]
         data_2_comments_embedding = data_2[3]
 
-        cosine_similarity_labels = cosine_similarity(data_1_labels_embedding, data_2_labels_embedding)
-        cosine_similarity_comments = cosine_similarity(data_1_comments_embedding, data_2_comments_embedding)
+        cosine_similarity_labels, cosine_similarity_comments, cosine_similarity_average, comment_used = compute_scores(
+            data_1_labels_embedding, data_1_comments_embedding, has_comment_mask(classes_1_with_no_comments, len(keys_1)),
+            data_2_labels_embedding, data_2_comments_embedding, has_comment_mask(classes_2_with_no_comments, len(keys_2)), aggregation=language_aggregation)
         
         flatten_cosine_similarity_labels = cosine_similarity_labels.flatten()
         flatten_cosine_similarity_comments = cosine_similarity_comments.flatten() 
-        flatten_cosine_similarity_average = np.array([np.average([cosine_similarity_labels[i][j], cosine_similarity_comments[i][j]]) if i not in classes_1_with_no_comments and j not in classes_2_with_no_comments else cosine_similarity_labels[i][j]  for i in range(len(keys_1)) for j in range(len(keys_2))]).flatten()
-        comment_used = [i not in classes_1_with_no_comments and j not in classes_2_with_no_comments  for i in range(len(keys_1)) for j in range(len(keys_2))]
+        flatten_cosine_similarity_average = cosine_similarity_average.flatten()
+        comment_used = comment_used.flatten()
         
         df = pd.DataFrame(data={
                                     "Components" : [(i,j) for i in keys_1 for j in keys_2],
@@ -169,58 +171,57 @@ def compute_similarity(data_1, data_2, language="en"):
 
     return df
 
+embedding_store = None
+language_aggregation = "mean"
+
 def init_model():
-    module_url = "https://tfhub.dev/google/universal-sentence-encoder/4"
-    model = hub.load(module_url)
-    return model
+    configure_threads(config.get("Intra_Op_Threads"), config.get("Inter_Op_Threads"))
+    return open_model(*model_settings(config))
 
 def embed(input):
+  if embedding_store is not None:
+    return embedding_store.embed(input, model)
   return model(input)
 
-def from_value_to_interval(value):
-    for i in np.arange(global_threshold, 1.5, intervals):
-        if value < i:
-            return f"{np.around(i-intervals, precision)}_{np.around(i, precision)}" 
-    return None
-
 if __name__ == "__main__":
     print('Start')
     config = json.load(open("config.json", "r"))
 
     url_server = config["URL_endpoint"]
-    languages = 'en'
-    sparql = SPARQLWrapper(url_server)
+    languages = config["Lang_Allowed"]
+    # Languages of a pair combined by the mean or the best of their per-language scores, or pooled embeddings, see LanguageEmbedding.py
+    language_aggregation = config.get("Language_Aggregation") or "mean"
+    sparql = CachedSPARQLWrapper(url_server, cache=SparqlCache.from_config(config, url_server))
     sparql.setReturnFormat('json')
     sparql.method = 'GET'
     global_threshold = 0.5
     intervals = 0.01
     precision = 2
 
-    model = init_model()
+    model = BatchedModel.from_config(config, LazyModel(init_model))
+    embedding_store = EmbeddingStore.from_config(config, model_id(*model_settings(config)))
     print('Load Data')    
     
     vocabularies = list(retrieve_vocabularies())
     classes_per_onto = retrieve_classes_from_n_vocab(vocabularies, languages)
     properties_per_onto = retrieve_properties_from_n_vocab(vocabularies, languages)
     print('Compute Similarity')
-    with open("./Similarity.nq", "w", encoding="UTF-8") as f_out:
-        f = open("./follow", "w")
-        for i in tqdm(range(len(vocabularies)), file=f):
-            for j in range(i+1, len(vocabularies)):
-                # sim_class = pd.concat([sim_class, compute_similarity(classes_per_onto[vocabularies[i]], classes_per_onto[vocabularies[j]], "en")])
-                # sim_props = pd.concat([sim_props, compute_similarity(properties_per_onto[vocabularies[i]], classes_per_onto[vocabularies[j]], "en")])
-                df_c = (compute_similarity(classes_per_onto[vocabularies[i]][1], classes_per_onto[vocabularies[j]][1], "en"))
-                for (c1, c2), average in df_c[["Components", "Average"]].values:
-                    if average > global_threshold:
-                        f_out.write(f"<{c1}> <http://KG_Nexus.com/similarityScore> <{c2}> <http://value/{from_value_to_interval(average)}>.\n")
-                
-                df_p = (compute_similarity(properties_per_onto[vocabularies[i]][1], properties_per_onto[vocabularies[j]][1], "en"))
-                for (c1, c2), average in df_p[["Components", "Average"]].values:
-                    if average > global_threshold:
-                        f_out.write(f"<{c1}> <http://KG_Nexus.com/similarityScore> <{c2}> <http://value/{from_value_to_interval(average)}>.\n")
-        
-        f.close()
-
-
-
-
+    # Vocabulary pairs are scored by a process pool, config.json "Workers" (null : one per CPU)
+    # "Incremental" : only the pairs with a vocabulary added or changed since the previous run
+    # Similarity.pairs/.components/.json are read by 4.ComputeAlignment, "Similarity_NQuads" : export Similarity.nq
+    # ("Similarity_Compression" : null, "gzip" or "zstd")
+    embeddings_per_name = {"classes":{vocabulary:classes_per_onto[vocabulary][1] for vocabulary in vocabularies},
+                           "properties":{vocabulary:properties_per_onto[vocabulary][1] for vocabulary in vocabularies}}
+    with open("./follow", "w") as f:
+        if config.get("Incremental"):
+            hashes = {vocabulary:content_hash(classes_per_onto[vocabulary][0], properties_per_onto[vocabulary][0]) for vocabulary in vocabularies}
+            run_incremental_scoring("./Similarity.nq", embeddings_per_name, hashes,
+                                    {"model":model_id(*model_settings(config)), "languages":languages, "language_aggregation":language_aggregation},
+                                    "<http://KG_Nexus.com/similarityScore>", global_threshold, intervals, precision,
+                                    workers=config.get("Workers"), progress_file=f, nquads=config.get("Similarity_NQuads", True),
+                                    compression=config.get("Similarity_Compression"), aggregation=language_aggregation)
+        else:
+            run_sharded_scoring("./Similarity.nq", embeddings_per_name, "<http://KG_Nexus.com/similarityScore>",
+                                global_threshold, intervals, precision, workers=config.get("Workers"), progress_file=f,
+                                nquads=config.get("Similarity_NQuads", True), compression=config.get("Similarity_Compression"),
+                                aggregation=language_aggregation)
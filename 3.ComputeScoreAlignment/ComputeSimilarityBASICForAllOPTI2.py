@@ -1,16 +1,18 @@
 from SPARQLWrapper import SPARQLWrapper, BASIC
 import json
-from absl import logging
-import tensorflow as tf
-import tensorflow_hub as hub
-import matplotlib.pyplot as plt
 import numpy as np
 import os
-import pandas as pd
-import re
-import seaborn as sns
-from sklearn.metrics.pairwise import cosine_similarity
 from tqdm import tqdm
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Common"))
+from SparqlCache import CachedSPARQLWrapper, SparqlCache
+from Embedding import BatchedModel, LazyModel, configure_threads, model_id, model_settings, open_model
+from EmbeddingStore import EmbeddingStore
+from LanguageEmbedding import embed_languages, in_languages, joined_labels
+from SimilarityKernel import has_comment_mask, threshold_pairs
+from SimilarityOutput import QuadWriter, render_terms
+from AnnIndex import ann_pairs
+from LexicalBlocking import blocking_pairs
 
 def retrieve_vocabularies():
     query = """
@@ -30,7 +32,7 @@ def retrieve_vocabularies():
 def retrieve_classes_from_n_vocab(vocabularies, languages):
     data = dict()
     for vocabulary in vocabularies:
-        data.update(retrieve_classes_from_vocab(vocabulary, [languages]))
+        data.update(retrieve_classes_from_vocab(vocabulary, languages))
     res = compute_embedding(data, languages)
     del data
     return res
@@ -80,7 +82,7 @@ def retrieve_classes_from_vocab(uri_vocab, languages):
 def retrieve_properties_from_n_vocab(vocabularies, languages):
     data = dict()
     for vocabulary in vocabularies:
-        data.update(retrieve_properties_from_vocab(vocabulary, [languages]))
+        data.update(retrieve_properties_from_vocab(vocabulary, languages))
     res = compute_embedding(data, languages)
     del data
     return res
@@ -127,61 +129,52 @@ def retrieve_properties_from_vocab(uri_vocab, languages):
     
     return properties
 
-def compute_embedding(data, language):
+def compute_embedding(data, languages):
     if len(data.keys())>0 :
         keys = list(data.keys())
-        data_labels_embedding = embed([data[key]["label"][language] if 'en' in data[key]["label"] else "" for key in keys])
-        data_with_no_comments = set([-1 if 'en' in data[key]["comment"] else i for i, key in enumerate(keys)])
-        data_comments_embedding = embed([data[key]["comment"][language] if 'en' in data[key]["comment"] else "" for key in keys])
+        data_labels_embedding = embed_languages(embed, [data[key]["label"] for key in keys], languages, language_aggregation)
+        data_with_no_comments = set([-1 if in_languages(data[key]["comment"], languages) else i for i, key in enumerate(keys)])
+        data_comments_embedding = embed_languages(embed, [data[key]["comment"] for key in keys], languages, language_aggregation)
+        # The label texts are kept for the lexical blocking
+        data_labels = joined_labels([data[key]["label"] for key in keys], languages)
         del data
-        return (keys, data_labels_embedding, data_with_no_comments, data_comments_embedding)
+        return (keys, data_labels_embedding, data_with_no_comments, data_comments_embedding, data_labels)
     else:
-        return ([],[],[],[])
+        return ([],[],[],[],[])
 
-def compute_similarity(data_1, language="en"):
+def compute_similarity(data_1, top_k=None, backend="exact", backend_parameters=dict()):
+    ### Sparse (rows, columns, averages) blocks of the pairs of components from different vocabularies above global_threshold
     if len(data_1[0])>0:
         keys_1 = data_1[0]
         data_1_labels_embedding =  data_1[1]
         classes_1_with_no_comments =  data_1[2]
         data_1_comments_embedding = data_1[3]
 
-        cosine_similarity_labels = cosine_similarity(data_1_labels_embedding, data_1_labels_embedding)
-        cosine_similarity_comments = cosine_similarity(data_1_comments_embedding, data_1_comments_embedding)
-        del data_1_labels_embedding
-        del data_1_comments_embedding
-        # flatten_cosine_similarity_labels = cosine_similarity_labels.flatten()
-        # flatten_cosine_similarity_comments = cosine_similarity_comments.flatten() 
-        flatten_cosine_similarity_average = np.array([np.average([cosine_similarity_labels[i][j], cosine_similarity_comments[i][j]]) if i not in classes_1_with_no_comments and j not in classes_1_with_no_comments else cosine_similarity_labels[i][j]  for i in range(len(keys_1)) for j in range(len(keys_1))]).flatten()
-        # comment_used = [i not in classes_1_with_no_comments and j not in classes_1_with_no_comments  for i in range(len(keys_1)) for j in range(len(keys_1))]
-        
-        df = pd.DataFrame(data={
-                                    "Components" : [(i[1],j[1]) for i in keys_1 for j in keys_1],
-                                    "Vocabularies" : [(i[0],j[0]) for i in keys_1 for j in keys_1],
-                                    # "Label":flatten_cosine_similarity_labels, 
-                                    # "Comment":flatten_cosine_similarity_comments, 
-                                    "Average":flatten_cosine_similarity_average,
-                                    # "Comment Used":comment_used
-                                }, 
-                        index=[str((i,j)) for i in keys_1 for j in keys_1])
-    else:
-        df = pd.DataFrame(data=[], columns=["Components", "Label", "Comment", "Average", "Comment Used"])
-
-    return df
+        classes_1_has_comment = has_comment_mask(classes_1_with_no_comments, len(keys_1))
+        vocabularies_1 = np.unique([key[0] for key in keys_1], return_inverse=True)[1]
+        if backend == "exact":
+            yield from threshold_pairs(data_1_labels_embedding, data_1_comments_embedding, classes_1_has_comment,
+                                       data_1_labels_embedding, data_1_comments_embedding, classes_1_has_comment,
+                                       global_threshold, top_k, vocabularies_1, vocabularies_1, aggregation=language_aggregation)
+        elif backend == "lexical":
+            yield blocking_pairs(np.asarray(data_1_labels_embedding), np.asarray(data_1_comments_embedding), classes_1_has_comment,
+                                 data_1[4], global_threshold, top_k, vocabularies_1, language_aggregation, **backend_parameters)
+        else:
+            yield ann_pairs(np.asarray(data_1_labels_embedding), np.asarray(data_1_comments_embedding), classes_1_has_comment,
+                            global_threshold, top_k, vocabularies_1, backend, language_aggregation, **backend_parameters)
+
+embedding_store = None
+language_aggregation = "mean"
 
 def init_model():
-    module_url = "https://tfhub.dev/google/universal-sentence-encoder/4"
-    model = hub.load(module_url)
-    return model
+    configure_threads(config.get("Intra_Op_Threads"), config.get("Inter_Op_Threads"))
+    return open_model(*model_settings(config))
 
 def embed(input):
+  if embedding_store is not None:
+    return embedding_store.embed(input, model)
   return model(input)
 
-def from_value_to_interval(value):
-    for i in np.arange(global_threshold, 1.5, intervals):
-        if value < i:
-            return f"{np.around(i-intervals, precision)}_{np.around(i, precision)}" 
-    return None
-
 def merge_everything(dict_data_per_vocab):
     vocab_per_k = {key:vocab for vocab in dict_data_per_vocab for key in dict_data_per_vocab[vocab]}
 
@@ -192,38 +185,39 @@ if __name__ == "__main__":
     config = json.load(open("config.json", "r"))
 
     url_server = config["URL_endpoint"]
-    languages = 'en'
-    sparql = SPARQLWrapper(url_server)
+    languages = config["Lang_Allowed"]
+    # Languages of a pair combined by the mean or the best of their per-language scores, or pooled embeddings, see LanguageEmbedding.py
+    language_aggregation = config.get("Language_Aggregation") or "mean"
+    sparql = CachedSPARQLWrapper(url_server, cache=SparqlCache.from_config(config, url_server))
     sparql.setReturnFormat('json')
     sparql.method = 'GET'
     global_threshold = 0.5
     intervals = 0.01
     precision = 2
+    top_k = config.get("Top_K")
+    backend = config.get("Similarity_Backend", "exact")
+    backend_parameters = config.get("Similarity_Backend_Parameters", dict())
 
-    model = init_model()
+    model = BatchedModel.from_config(config, LazyModel(init_model))
+    embedding_store = EmbeddingStore.from_config(config, model_id(*model_settings(config)))
     print('Load Data')    
     print('Compute Similarity')
-    with open("./Similarity.nq", "w", encoding="UTF-8") as f_out:
+    with QuadWriter("./Similarity.nq", "<http://kg_nexus.com/similarityScore>", global_threshold, intervals, precision, config.get("Similarity_Compression")) as writer:
     
         vocabularies = list(retrieve_vocabularies())
         classes = retrieve_classes_from_n_vocab(vocabularies, languages)
         f = open("./follow", "w")
         print("Sim Class")
-        df_c = (compute_similarity(classes, "en"))
-        print("Write Class")
-        for (v1, v2), (c1, c2), average in df_c[["Vocabularies", "Components", "Average"]].values:
-            if (v1 != v2) and (average > global_threshold):
-                f_out.write(f"<{c1}> <http://kg_nexus.com/similarityScore> <{c2}> <http://value/{from_value_to_interval(average)}>.\n")
-        del df_c
+        terms = render_terms([key[1] for key in classes[0]])
+        for rows, columns, averages in compute_similarity(classes, top_k, backend, backend_parameters):
+            writer.write_pairs(terms, rows, columns, averages)
         del classes
 
         properties = retrieve_properties_from_n_vocab(vocabularies, languages)
         print("Sim prop")
-        df_p = (compute_similarity(properties, "en"))
-        print("Write prop")
-        for (v1, v2), (c1, c2), average in df_p[["Vocabularies", "Components", "Average"]].values:
-            if (v1 != v2) and (average > global_threshold):
-                f_out.write(f"<{c1}> <http://kg_nexus.com/similarityScore> <{c2}> <http://value/{from_value_to_interval(average)}>.\n")
+        terms = render_terms([key[1] for key in properties[0]])
+        for rows, columns, averages in compute_similarity(properties, top_k, backend, backend_parameters):
+            writer.write_pairs(terms, rows, columns, averages)
     
         f.close()
 
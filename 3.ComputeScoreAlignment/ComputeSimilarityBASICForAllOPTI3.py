@@ -1,16 +1,17 @@
 from SPARQLWrapper import SPARQLWrapper, BASIC
 import json
-from absl import logging
-import tensorflow as tf
-import tensorflow_hub as hub
-import matplotlib.pyplot as plt
 import numpy as np
 import os
 import pandas as pd
-import re
-import seaborn as sns
-from sklearn.metrics.pairwise import cosine_similarity
 from tqdm import tqdm
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Common"))
+from SparqlCache import CachedSPARQLWrapper, SparqlCache
+from Embedding import BatchedModel, LazyModel, configure_threads, model_id, model_settings, open_model
+from EmbeddingStore import EmbeddingStore
+from LanguageEmbedding import embed_languages, in_languages
+from SimilarityKernel import compute_scores
+from SimilarityOutput import QuadWriter
 
 def retrieve_vocabularies():
     query = """
@@ -32,7 +33,7 @@ def retrieve_classes_from_n_vocab(vocabularies, languages):
     indexes = dict()
     last_index = 0
     for vocabulary in vocabularies:
-        res_retrieve = retrieve_classes_from_vocab(vocabulary, [languages])
+        res_retrieve = retrieve_classes_from_vocab(vocabulary, languages)
         indexes[vocabulary] = (last_index, last_index+len(res_retrieve))
         last_index += len(res_retrieve)
         data.update(res_retrieve)
@@ -87,7 +88,7 @@ def retrieve_properties_from_n_vocab(vocabularies, languages):
     indexes = dict()
     last_index = 0
     for vocabulary in vocabularies:
-        res_retrieve = retrieve_properties_from_vocab(vocabulary, [languages])
+        res_retrieve = retrieve_properties_from_vocab(vocabulary, languages)
         indexes[vocabulary] = (last_index, last_index+len(res_retrieve))
         last_index += len(res_retrieve)
         data.update(res_retrieve)
@@ -137,36 +138,37 @@ def retrieve_properties_from_vocab(uri_vocab, languages):
     
     return properties
 
-def compute_embedding(data, language):
+def compute_embedding(data, languages):
     if len(data.keys())>0 :
         keys = list(data.keys())
-        data_labels_embedding = embed([data[key]["label"][language] if 'en' in data[key]["label"] else "" for key in keys])
-        data_with_no_comments = np.array([-1 if 'en' in data[key]["comment"] else i for i, key in enumerate(keys)])
-        data_comments_embedding = embed([data[key]["comment"][language] if 'en' in data[key]["comment"] else "" for key in keys])
+        data_labels_embedding = embed_languages(embed, [data[key]["label"] for key in keys], languages, language_aggregation)
+        data_has_comment = np.array([in_languages(data[key]["comment"], languages) for key in keys])
+        data_comments_embedding = embed_languages(embed, [data[key]["comment"] for key in keys], languages, language_aggregation)
         del data
-        return (keys, data_labels_embedding, data_with_no_comments, data_comments_embedding)
+        return (keys, data_labels_embedding, data_has_comment, data_comments_embedding)
     else:
         return ([],[],[],[])
 
-def compute_similarity(data, index_data, language="en"):
+def compute_similarity(data, index_data):
     keys_1 = data[0][index_data[0]:index_data[1]]
     data_1_labels_embedding =  data[1][index_data[0]:index_data[1]]
-    classes_1_with_no_comments =  data[2][index_data[0]:index_data[1]]
+    classes_1_has_comment =  data[2][index_data[0]:index_data[1]]
     data_1_comments_embedding = data[3][index_data[0]:index_data[1]]
 
     keys_2 = data[0][index_data[1]:]
     data_2_labels_embedding = data[1][index_data[1]:]
-    classes_2_with_no_comments = data[2][index_data[1]:]
+    classes_2_has_comment = data[2][index_data[1]:]
     data_2_comments_embedding = data[3][index_data[1]:]
     if len(keys_1)> 0 and len(keys_2)>0:
 
-        cosine_similarity_labels = cosine_similarity(data_1_labels_embedding, data_2_labels_embedding)
-        cosine_similarity_comments = cosine_similarity(data_1_comments_embedding, data_2_comments_embedding)
+        cosine_similarity_labels, cosine_similarity_comments, cosine_similarity_average, comment_used = compute_scores(
+            data_1_labels_embedding, data_1_comments_embedding, classes_1_has_comment,
+            data_2_labels_embedding, data_2_comments_embedding, classes_2_has_comment, aggregation=language_aggregation)
         
         flatten_cosine_similarity_labels = cosine_similarity_labels.flatten()
         flatten_cosine_similarity_comments = cosine_similarity_comments.flatten() 
-        flatten_cosine_similarity_average = np.array([np.average([cosine_similarity_labels[i][j], cosine_similarity_comments[i][j]]) if i not in classes_1_with_no_comments and j not in classes_2_with_no_comments else cosine_similarity_labels[i][j]  for i in range(len(keys_1)) for j in range(len(keys_2))]).flatten()
-        comment_used = [i not in classes_1_with_no_comments and j not in classes_2_with_no_comments  for i in range(len(keys_1)) for j in range(len(keys_2))]
+        flatten_cosine_similarity_average = cosine_similarity_average.flatten()
+        comment_used = comment_used.flatten()
         
         df = pd.DataFrame(data={
                                     "Components" : [(i,j) for i in keys_1 for j in keys_2],
@@ -181,35 +183,36 @@ def compute_similarity(data, index_data, language="en"):
 
     return df
 
+embedding_store = None
+language_aggregation = "mean"
+
 def init_model():
-    module_url = "https://tfhub.dev/google/universal-sentence-encoder/4"
-    model = hub.load(module_url)
-    return model
+    configure_threads(config.get("Intra_Op_Threads"), config.get("Inter_Op_Threads"))
+    return open_model(*model_settings(config))
 
 def embed(input):
+  if embedding_store is not None:
+    return embedding_store.embed(input, model)
   return model(input)
 
-def from_value_to_interval(value):
-    for i in np.arange(global_threshold, 1.5, intervals):
-        if value < i:
-            return f"{np.around(i-intervals, precision)}_{np.around(i, precision)}" 
-    return None
-
 
 if __name__ == "__main__":
     print('Start')
     config = json.load(open("config.json", "r"))
 
     url_server = config["URL_endpoint"]
-    languages = 'en'
-    sparql = SPARQLWrapper(url_server)
+    languages = config["Lang_Allowed"]
+    # Languages of a pair combined by the mean or the best of their per-language scores, or pooled embeddings, see LanguageEmbedding.py
+    language_aggregation = config.get("Language_Aggregation") or "mean"
+    sparql = CachedSPARQLWrapper(url_server, cache=SparqlCache.from_config(config, url_server))
     sparql.setReturnFormat('json')
     sparql.method = 'GET'
     global_threshold = 0.5
     intervals = 0.01
     precision = 2
 
-    model = init_model()
+    model = BatchedModel.from_config(config, LazyModel(init_model))
+    embedding_store = EmbeddingStore.from_config(config, model_id(*model_settings(config)))
     print('Load Data')    
     
     vocabularies = list(retrieve_vocabularies())
@@ -217,26 +220,20 @@ if __name__ == "__main__":
     indexes_properties, properties = retrieve_properties_from_n_vocab(vocabularies, languages)
    
     print('Compute Similarity')
-    with open("./Similarity.nq", "w", encoding="UTF-8") as f_out:
+    with QuadWriter("./Similarity.nq", "<http://KG_nexux.com/equivalenceScore>", global_threshold, intervals, precision, config.get("Similarity_Compression")) as writer:
         f = open("./follow", "w")
         print("Sim Class")
         for vocabulary in tqdm(vocabularies):
             df_c = (compute_similarity(classes,
-                                       indexes_class[vocabulary],
-                                        "en"))
-            for (c1, c2), average in df_c[["Components", "Average"]].values:
-                if (average > global_threshold):
-                    f_out.write(f"<{c1}> <http://KG_nexux.com/equivalenceScore> <{c2}> <http://value/{from_value_to_interval(average)}>.\n")
+                                       indexes_class[vocabulary]))
+            writer.write_frame(df_c)
         del df_c
         
         print("Sim prop")
         for vocabulary in tqdm(vocabularies):
             df_p = (compute_similarity(properties,
-                                       indexes_class[vocabulary],
-                                        "en"))
-            for (c1, c2), average in df_p[["Components", "Average"]].values:
-                if (average > global_threshold):
-                    f_out.write(f"<{c1}> <http://KG_nexux.com/equivalenceScore> <{c2}> <http://value/{from_value_to_interval(average)}>.\n")
+                                       indexes_properties[vocabulary]))
+            writer.write_frame(df_p)
         
         f.close()
 
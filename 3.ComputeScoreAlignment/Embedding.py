@@ -0,0 +1,216 @@
+import atexit
+import hashlib
+import numpy as np
+import os
+import time
+from tqdm import tqdm
+
+# Sentences given to the model in one call
+BATCH_SIZE = 256
+
+def configure_threads(intra_op_threads:int=None, inter_op_threads:int=None):
+    ### Must run before the first TensorFlow operation (model loading included), None keeps the TensorFlow default
+    if not intra_op_threads and not inter_op_threads:
+        return
+    import tensorflow as tf
+
+    if intra_op_threads:
+        tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+    if inter_op_threads:
+        tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+
+# Model of each backend when config.json has no "Model_Name", the onnx backend reads the model from "Model_Path"
+DEFAULT_MODELS = {
+    "use":"https://tfhub.dev/google/universal-sentence-encoder/4",
+    "sentence-transformers":"sentence-transformers/all-MiniLM-L6-v2",
+    "onnx":None,
+    "hashing":"hashing-512",
+}
+# Model of each backend when config.json has no "Model_Name" and "Lang_Allowed" has several languages, the labels of
+# every language are embedded in the same space
+MULTILINGUAL_MODELS = {
+    "use":"https://tfhub.dev/google/universal-sentence-encoder-multilingual/3",
+    "sentence-transformers":"sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
+}
+QUANTIZATIONS = [None, "int8", "float16"]
+
+def load_use(name:str, model_path:str=None, quantization:str=None):
+    ### TF Hub model, read from the SavedModel directory model_path when given (no download, works offline)
+    if quantization:
+        raise ValueError("The use backend has no quantized variant")
+    start = time.perf_counter()
+    import tensorflow_hub as hub
+    if "multilingual" in (model_path or name):
+        # Registers the SentencePiece operations of the multilingual models
+        import tensorflow_text
+    imported = time.perf_counter()
+    model = hub.load(model_path or name)
+    print(f"Model : TensorFlow imported in {imported-start:.1f}s, {model_path or name} loaded in {time.perf_counter()-imported:.1f}s")
+    return model
+
+def load_sentence_transformers(name:str, model_path:str=None, quantization:str=None):
+    ### sentence-transformers model on the CPU, int8 quantizes the linear layers dynamically
+    start = time.perf_counter()
+    import torch
+    from sentence_transformers import SentenceTransformer
+    imported = time.perf_counter()
+    model = SentenceTransformer(model_path or name, device="cpu")
+    if quantization == "int8":
+        torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    elif quantization == "float16":
+        model.half()
+    print(f"Model : torch imported in {imported-start:.1f}s, {model_path or name} loaded in {time.perf_counter()-imported:.1f}s")
+    return lambda sentences: model.encode(sentences, batch_size=max(len(sentences), 1), convert_to_numpy=True)
+
+def quantize_onnx(onnx_path:str, quantization:str) -> str:
+    ### Quantized copy of the model, written once next to it
+    quantized_path = f"{onnx_path[:-len('.onnx')]}.{quantization}.onnx"
+    if not os.path.exists(quantized_path):
+        if quantization == "int8":
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            quantize_dynamic(onnx_path, quantized_path, weight_type=QuantType.QInt8)
+        else:
+            import onnx
+            from onnxconverter_common import float16
+            onnx.save(float16.convert_float_to_float16(onnx.load(onnx_path), keep_io_types=True), quantized_path)
+    return quantized_path
+
+class OnnxModel:
+    ### Transformer encoder exported to ONNX (model_path holds model.onnx and tokenizer.json) run by ONNX Runtime on
+    ### the CPU, the sentence embedding is the mean of the token embeddings
+    def __init__(self, model_path:str, quantization:str=None, max_length:int=256):
+        start = time.perf_counter()
+        import onnxruntime
+        from tokenizers import Tokenizer
+        imported = time.perf_counter()
+        onnx_path = os.path.join(model_path, "model.onnx")
+        if quantization:
+            onnx_path = quantize_onnx(onnx_path, quantization)
+        self.session = onnxruntime.InferenceSession(onnx_path, providers=["CPUExecutionProvider"])
+        self.inputs = {model_input.name for model_input in self.session.get_inputs()}
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_path, "tokenizer.json"))
+        self.tokenizer.enable_padding()
+        self.tokenizer.enable_truncation(max_length=max_length)
+        print(f"Model : onnxruntime imported in {imported-start:.1f}s, {onnx_path} loaded in {time.perf_counter()-imported:.1f}s")
+
+    def __call__(self, sentences:list) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(sentences)
+        mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+        feed = {"input_ids":np.array([encoding.ids for encoding in encodings], dtype=np.int64), "attention_mask":mask}
+        if "token_type_ids" in self.inputs:
+            feed["token_type_ids"] = np.array([encoding.type_ids for encoding in encodings], dtype=np.int64)
+        tokens = self.session.run(None, feed)[0].astype(np.float32)
+        return (tokens * mask[:, :, None]).sum(axis=1) / np.maximum(mask.sum(axis=1, keepdims=True), 1)
+
+class HashingModel:
+    ### Deterministic stand-in for the encoders (tests, dry runs, no download) : signed feature hashing of the
+    ### lowercased words and character trigrams
+    def __init__(self, dimension:int=512):
+        self.dimension = dimension
+
+    def __call__(self, sentences:list) -> np.ndarray:
+        embeddings = np.zeros((len(sentences), self.dimension), dtype=np.float32)
+        for i, sentence in enumerate(sentences):
+            words = sentence.lower().split()
+            padded = f" {' '.join(words)} "
+            for feature in words + [padded[j:j+3] for j in range(len(padded)-2)]:
+                value = int.from_bytes(hashlib.blake2b(feature.encode("UTF-8"), digest_size=8).digest(), "little")
+                embeddings[i, value % self.dimension] += 1 if value >> 63 else -1
+        return embeddings
+
+def open_model(backend:str, name:str=None, model_path:str=None, quantization:str=None):
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"Unknown quantization {quantization}")
+    if backend == "use":
+        return load_use(name or DEFAULT_MODELS[backend], model_path, quantization)
+    if backend == "sentence-transformers":
+        return load_sentence_transformers(name or DEFAULT_MODELS[backend], model_path, quantization)
+    if backend == "onnx":
+        if model_path is None:
+            raise ValueError("The onnx backend needs a Model_Path")
+        return OnnxModel(model_path, quantization)
+    if backend == "hashing":
+        if quantization:
+            raise ValueError("The hashing backend has no quantized variant")
+        return HashingModel()
+    raise ValueError(f"Unknown embedding backend {backend}")
+
+def model_id(backend:str, name:str=None, model_path:str=None, quantization:str=None) -> str:
+    ### Identifies the embeddings in the store, two models never share a vector
+    if name is None:
+        name = os.path.abspath(model_path) if backend == "onnx" else DEFAULT_MODELS[backend]
+    return ":".join([backend, name] + ([quantization] if quantization else []))
+
+def model_settings(config:dict) -> tuple:
+    backend, name = config.get("Embedding_Backend") or "use", config.get("Model_Name")
+    if name is None and config.get("Model_Path") is None and len(config.get("Lang_Allowed") or []) > 1:
+        name = MULTILINGUAL_MODELS.get(backend)
+    return (backend, name, config.get("Model_Path"), config.get("Embedding_Quantization"))
+
+class LazyModel:
+    ### Loads the model on its first call, a run whose embeddings all come from the embedding store never imports
+    ### TensorFlow (or torch, onnxruntime)
+    def __init__(self, load):
+        self.load = load
+        self.model = None
+
+    def __call__(self, sentences:list):
+        if self.model is None:
+            self.model = self.load()
+        return self.model(sentences)
+
+class BatchedModel:
+    ### Calls the model on batches of at most batch_size sentences instead of the whole list at once. Each distinct
+    ### sentence is embedded once and sorted by length so a batch holds sentences of similar length (less padding),
+    ### the embeddings are scattered back in the input order. Empty sentences are not embedded and get a zero vector,
+    ### whose cosine with any vector is 0 (of dimension 0 while the model has embedded nothing).
+    def __init__(self, model, batch_size:int=BATCH_SIZE):
+        self.model = model
+        self.batch_size = batch_size
+        self.dimension = None
+        self.sentences = 0
+        self.empty = 0
+        self.embedded = 0
+        self.duration = 0.0
+
+    def embed_batches(self, sentences:list) -> np.ndarray:
+        order = sorted(range(len(sentences)), key=lambda i: len(sentences[i]))
+        embeddings = None
+        start = time.perf_counter()
+        with tqdm(total=len(sentences), unit="sentence", disable=len(sentences) <= self.batch_size) as progress:
+            for batch_start in range(0, len(order), self.batch_size):
+                batch = order[batch_start:batch_start+self.batch_size]
+                vectors = np.asarray(self.model([sentences[i] for i in batch]), dtype=np.float32)
+                if embeddings is None:
+                    self.dimension = vectors.shape[1]
+                    embeddings = np.empty((len(sentences), self.dimension), dtype=np.float32)
+                embeddings[batch] = vectors
+                progress.update(len(batch))
+        self.duration += time.perf_counter() - start
+        self.embedded += len(sentences)
+        return embeddings
+
+    def __call__(self, sentences:list) -> np.ndarray:
+        unique = dict()
+        indexes = np.array([unique.setdefault(sentence, len(unique)) if sentence.strip() else -1 for sentence in sentences], dtype=np.int64)
+        vectors = self.embed_batches(list(unique)) if unique else None
+        # Nothing but empty sentences before the first call to the model : its dimension is not known without loading
+        # it, the vectors have no dimension
+        embeddings = np.zeros((len(sentences), self.dimension or 0), dtype=np.float32)
+        if vectors is not None:
+            embeddings[indexes >= 0] = vectors[indexes[indexes >= 0]]
+        self.sentences += len(sentences)
+        self.empty += int(np.sum(indexes < 0))
+        return embeddings
+
+    def stats(self) -> str:
+        throughput = self.embedded / self.duration if self.duration else 0
+        deduplicated = 100 * (1 - self.embedded / self.sentences) if self.sentences else 0
+        return (f"Embedding : {self.sentences} sentences, {self.embedded} embedded ({deduplicated:.1f}% deduplicated, {self.empty} empty) "
+                f"in {self.duration:.1f}s ({throughput:.0f} sentences/s, batches of {self.batch_size})")
+
+    @classmethod
+    def from_config(cls, config:dict, model):
+        batched_model = cls(model, config.get("Embedding_Batch_Size") or BATCH_SIZE)
+        atexit.register(lambda: print(batched_model.stats()))
+        return batched_model
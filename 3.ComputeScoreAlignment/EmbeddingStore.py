@@ -0,0 +1,104 @@
+import atexit
+import hashlib
+import json
+import numpy as np
+import os
+import re
+
+def normalize_text(text:str) -> str:
+    return " ".join(text.split())
+
+class EmbeddingStore:
+    ### On-disk cache of sentence embeddings for one model : an append-only float32 matrix (<path>.f32, memory mapped)
+    ### and its index (<path>.index, one sha256 of model id + normalized text per row), so a rerun only embeds the
+    ### texts it has never seen
+    def __init__(self, path:str, model_id:str):
+        self.path = path
+        self.model_id = model_id
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self.dimension = None
+        if os.path.exists(path+".json"):
+            with open(path+".json", "r", encoding="UTF-8") as f_meta:
+                self.dimension = json.load(f_meta)["dimension"]
+
+        keys = []
+        if os.path.exists(path+".index"):
+            with open(path+".index", "r", encoding="UTF-8") as f_index:
+                keys = [line[:-1] for line in f_index if line.endswith("\n")]
+        if self.dimension is not None and os.path.exists(path+".f32"):
+            keys = keys[:os.path.getsize(path+".f32") // (4*self.dimension)]
+        else:
+            keys = []
+        # Vectors without their index line, or index lines without their vector, are left by an interrupted run
+        self.f_vectors = open(path+".f32", "ab")
+        self.f_vectors.truncate(len(keys) * 4 * (self.dimension or 0))
+        self.f_index = open(path+".index", "a", encoding="UTF-8")
+        self.f_index.truncate(sum(len(key)+1 for key in keys))
+
+        self.rows = {key:row for row, key in enumerate(keys)}
+        self.matrix = None
+        self.remap()
+
+    def remap(self):
+        if self.rows:
+            self.matrix = np.memmap(self.path+".f32", dtype=np.float32, mode="r", shape=(len(self.rows), self.dimension))
+
+    def key(self, text:str) -> str:
+        return hashlib.sha256(f"{self.model_id}\n{text}".encode("UTF-8")).hexdigest()
+
+    def add(self, keys:list, vectors:np.ndarray):
+        if self.dimension is None:
+            self.dimension = vectors.shape[1]
+            with open(self.path+".json", "w", encoding="UTF-8") as f_meta:
+                json.dump({"model":self.model_id, "dimension":self.dimension}, f_meta)
+        if vectors.shape != (len(keys), self.dimension):
+            raise ValueError(f"Embeddings of shape {vectors.shape} for {len(keys)} texts of dimension {self.dimension}")
+        # The vectors are on disk before their index lines, an index line never points past the matrix
+        self.f_vectors.write(vectors.tobytes())
+        self.f_vectors.flush()
+        self.f_index.write("".join(key+"\n" for key in keys))
+        self.f_index.flush()
+        for key in keys:
+            self.rows[key] = len(self.rows)
+        self.remap()
+
+    def embed(self, texts:list, model) -> np.ndarray:
+        ### Embeddings of texts, model is only called on the normalized texts missing from the store
+        texts = [normalize_text(text) for text in texts]
+        keys = [self.key(text) for text in texts]
+        missing = {key:text for key, text in zip(keys, texts) if key not in self.rows}
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            vectors = np.asarray(model(list(missing.values())), dtype=np.float32)
+            if vectors.shape[1] == 0:
+                # Only empty texts, embedded by the model without loading it : zero vectors of the store dimension,
+                # nothing stored while the dimension is not known (the store is then empty, every text is missing)
+                if self.dimension is None:
+                    return np.zeros((len(texts), 0), dtype=np.float32)
+                vectors = np.zeros((len(missing), self.dimension), dtype=np.float32)
+            self.add(list(missing), vectors)
+        if not keys:
+            return np.empty((0, self.dimension or 0), dtype=np.float32)
+        return np.asarray(self.matrix[[self.rows[key] for key in keys]])
+
+    def stats(self) -> str:
+        total = self.hits + self.misses
+        hit_rate = 100 * self.hits / total if total else 0
+        return f"Embedding store : {self.hits} hits, {self.misses} embedded ({hit_rate:.1f}% hit rate), {len(self.rows)} texts on disk"
+
+    def close(self):
+        self.f_vectors.close()
+        self.f_index.close()
+
+    @classmethod
+    def from_config(cls, config:dict, model_id:str):
+        ### None when config.json has no "Embedding_Store" folder, which holds one store per model
+        if not config.get("Embedding_Store"):
+            return None
+        store = cls(os.path.join(config["Embedding_Store"], re.sub(r"[^\w.-]+", "_", model_id)), model_id)
+        atexit.register(lambda: print(store.stats()))
+        return store
@@ -0,0 +1,93 @@
+import hashlib
+import json
+import numpy as np
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Common"))
+from SimilarityFormat import FORMAT_VERSION, load_meta, load_similarity
+
+from ShardedScoring import component_table, run_sharded_scoring
+
+### Incremental rescoring of ComputeSimilarityBASICForAllOPTI.py. <output>.manifest.json records the settings of the
+### run and a hash of the classes and properties (labels and comments) of every vocabulary. The next run keeps the
+### pairs of unchanged vocabularies of the binary output and only scores the pairs with a new or changed vocabulary.
+### With an "Embedding_Store", the unchanged vocabularies are not embedded again.
+
+# Pairs of the previous run renumbered at once
+KEPT_CHUNK = 1_000_000
+
+def content_hash(classes:dict, properties:dict) -> str:
+    return hashlib.sha256(json.dumps([classes, properties], sort_keys=True, ensure_ascii=False).encode("UTF-8")).hexdigest()
+
+def load_manifest(path:str):
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="UTF-8") as f_manifest:
+        return json.load(f_manifest)
+
+def save_manifest(path:str, manifest:dict):
+    # Written once the pairs are, an interrupted run is started again from the previous manifest
+    with open(path+".tmp", "w", encoding="UTF-8") as f_manifest:
+        json.dump(manifest, f_manifest)
+    os.replace(path+".tmp", path)
+
+def changed_vocabularies(manifest:dict, hashes:dict):
+    ### (new or changed, removed) vocabularies since the manifest
+    previous = manifest["vocabularies"]
+    changed = {vocabulary for vocabulary in hashes if vocabulary not in previous or previous[vocabulary]["hash"] != hashes[vocabulary]}
+    removed = set(previous) - set(hashes)
+    return changed, removed
+
+def renumber_components(prefix:str, embeddings_per_name:dict, unchanged:set):
+    ### (pairs of the previous run, new id of each previous component id, -1 when its vocabulary is not unchanged)
+    pairs, iris, vocabularies, meta = load_similarity(prefix)
+    table, offsets = component_table(embeddings_per_name)
+    names, kinds = list(offsets), np.searchsorted(list(offsets.values()), np.arange(len(table)), side="right") - 1
+    ids = {(names[kind], iri, vocabulary):i for i, ((iri, vocabulary), kind) in enumerate(zip(table, kinds.tolist()))}
+    previous_kinds = np.searchsorted(meta["offsets"], np.arange(len(iris)), side="right") - 1
+
+    new_ids = np.full(len(iris), -1, dtype=np.int64)
+    for i, (iri, vocabulary, kind) in enumerate(zip(iris, vocabularies, previous_kinds.tolist())):
+        if vocabulary in unchanged:
+            new_ids[i] = ids.get((meta["kinds"][kind], iri, vocabulary), -1)
+    return pairs, new_ids
+
+def kept_pairs(pairs:np.ndarray, new_ids:np.ndarray):
+    for start in range(0, len(pairs), KEPT_CHUNK):
+        records = np.array(pairs[start:start+KEPT_CHUNK])
+        component_1, component_2 = new_ids[records["component_1"]], new_ids[records["component_2"]]
+        kept = (component_1 >= 0) & (component_2 >= 0)
+        records = records[kept]
+        records["component_1"], records["component_2"] = component_1[kept], component_2[kept]
+        yield records
+
+def run_incremental_scoring(output_path:str, embeddings_per_name:dict, hashes:dict, settings:dict, predicate:str,
+                            global_threshold:float=0.5, intervals:float=0.01, precision:int=2, workers:int=None,
+                            progress_file=None, nquads:bool=True, compression:str=None, aggregation:str="mean"):
+    ### hashes : {vocabulary: content_hash(...)}, settings : model and parameters the pairs depend on, a full run
+    ### when they differ from the manifest
+    prefix = os.path.splitext(output_path)[0]
+    manifest_path = output_path+".manifest.json"
+    manifest = load_manifest(manifest_path)
+    settings = dict(settings, predicate=predicate, global_threshold=global_threshold, intervals=intervals, precision=precision)
+
+    if manifest is None or manifest["settings"] != settings or not os.path.exists(prefix+".pairs") \
+            or load_meta(prefix).get("format") != FORMAT_VERSION:
+        print("Incremental scoring : no previous run with these settings, scoring every vocabulary")
+        run_sharded_scoring(output_path, embeddings_per_name, predicate, global_threshold, intervals, precision,
+                            workers=workers, progress_file=progress_file, nquads=nquads, compression=compression,
+                            aggregation=aggregation)
+    else:
+        changed, removed = changed_vocabularies(manifest, hashes)
+        print(f"Incremental scoring : {len(changed)} new or changed vocabularies, {len(removed)} removed")
+        if not changed and not removed:
+            return
+        pairs, new_ids = renumber_components(prefix, embeddings_per_name, set(hashes) - changed)
+        run_sharded_scoring(output_path, embeddings_per_name, predicate, global_threshold, intervals, precision,
+                            workers=workers, progress_file=progress_file, changed=changed,
+                            kept=kept_pairs(pairs, new_ids), nquads=nquads, compression=compression, aggregation=aggregation)
+
+    save_manifest(manifest_path, {
+        "settings":settings,
+        "vocabularies":{vocabulary:{"hash":hashes[vocabulary]} for vocabulary in hashes}
+    })
@@ -0,0 +1,36 @@
+import numpy as np
+
+from SimilarityKernel import pool_languages
+
+### Labels and comments of the components in every language of config.json "Lang_Allowed". The texts of all the
+### languages are embedded in one call to the model (one batched pass, the cost grows with the number of texts), and
+### "Language_Aggregation" sets how the languages of a pair are combined :
+### - mean, max : a component keeps one vector per language, a pair is scored language by language (one product per
+###   language, SimilarityKernel.cosines) and its score is the mean or the best of the cosines over the languages both
+###   components have, 0 when they have none in common. The pairwise scoring grows linearly with the languages
+### - pooled : a component is the normalized mean of the embeddings of its languages, one vector as with a single
+###   language, so the pairwise scoring does not depend on the number of languages, and the multilingual encoder
+###   (Embedding.MULTILINGUAL_MODELS) compares components without a common language
+
+AGGREGATIONS = ["mean", "max", "pooled"]
+
+def in_languages(texts:dict, languages:list) -> bool:
+    ### A label or comment ({language: text}) has a text in one of the languages
+    return any(language in texts for language in languages)
+
+def embed_languages(embed, texts:list, languages:list, aggregation:str="mean") -> np.ndarray:
+    ### Embeddings of a list of labels or comments ({language: text}), a missing language is a null vector. With a
+    ### single language or pooled, one row per text, with mean or max a (texts, languages, dimension) array
+    if aggregation not in AGGREGATIONS:
+        raise ValueError(f"Unknown language aggregation {aggregation}, expected one of {AGGREGATIONS}")
+    present = np.array([[language in text for language in languages] for text in texts], dtype=bool).reshape(len(texts), len(languages))
+    embeddings = np.asarray(embed([text.get(language, "") for text in texts for language in languages]), dtype=np.float32)
+    embeddings = embeddings.reshape(len(texts), len(languages), embeddings.shape[-1])
+    embeddings[~present] = 0
+    if len(languages) == 1:
+        return embeddings[:, 0]
+    return pool_languages(embeddings) if aggregation == "pooled" else embeddings
+
+def joined_labels(labels:list, languages:list) -> list:
+    ### Label texts of every language in one string, for the lexical blocking
+    return [" ".join(label[language] for language in languages if language in label) for label in labels]
@@ -0,0 +1,107 @@
+import hashlib
+import numpy as np
+import re
+
+from SimilarityKernel import normalize, rescore_pairs
+
+### Lexical blocking for the all-vocabulary runs : MinHash LSH over the word tokens and character n-grams of the labels
+### proposes the candidate pairs, optionally checked with a Levenshtein ratio, and only the candidates are scored with
+### the embeddings. Pairs of lexically unrelated labels (synonyms, other wordings) are lost, BenchmarkSimilarity.py
+### reports how many against the exhaustive run.
+
+# Modulus of the MinHash permutations, a*x+b stays below 2**62 for 31 bits values
+MERSENNE_PRIME = (1 << 31) - 1
+
+def label_words(label:str) -> list:
+    ### Lowercase words, camelCase and snake_case split
+    return re.findall(r"[^\W_]+", re.sub(r"([a-z])([A-Z])", r"\1 \2", label).lower())
+
+def shingles(label:str, n:int=3) -> set:
+    ### Words and character n-grams of each word padded by spaces
+    words = label_words(label)
+    result = {f"#{word}" for word in words}
+    for word in words:
+        padded = f" {word} "
+        result.update(padded[i:i+n] for i in range(max(1, len(padded)-n+1)))
+    return result
+
+def band_layout(permutations:int, jaccard:float, recall:float):
+    ### (bands, rows) of at most permutations hashes : the most rows per band (the fewest candidates) for which a pair
+    ### of Jaccard similarity jaccard is still proposed with probability 1-(1-jaccard**rows)**bands >= recall
+    for rows in range(permutations, 0, -1):
+        bands = permutations // rows
+        if 1 - (1 - jaccard**rows)**bands >= recall:
+            return bands, rows
+    return permutations, 1
+
+def minhash_signatures(shingle_sets:list, permutations:int, seed:int=0) -> np.ndarray:
+    ### One row of permutations minimums per set, the share of equal columns of two rows estimates their Jaccard similarity
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, MERSENNE_PRIME, permutations, dtype=np.uint64)
+    b = rng.integers(0, MERSENNE_PRIME, permutations, dtype=np.uint64)
+    hashes = dict()
+    signatures = np.full((len(shingle_sets), permutations), MERSENNE_PRIME, dtype=np.uint64)
+    for i, shingle_set in enumerate(shingle_sets):
+        if shingle_set:
+            for shingle in shingle_set:
+                if shingle not in hashes:
+                    hashes[shingle] = int.from_bytes(hashlib.blake2b(shingle.encode("UTF-8"), digest_size=4).digest(), "little") % MERSENNE_PRIME
+            values = np.array([hashes[shingle] for shingle in shingle_set], dtype=np.uint64)
+            signatures[i] = ((a[:, None] * values[None, :] + b[:, None]) % MERSENNE_PRIME).min(axis=1)
+    return signatures
+
+def bucket_pairs(keys:np.ndarray, members:np.ndarray):
+    ### (rows, columns) of every ordered pair of members sharing a key, each member with itself included
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+    sizes = np.diff(np.r_[starts, len(keys)])
+    element_starts, element_sizes = np.repeat(starts, sizes), np.repeat(sizes, sizes)
+    shared = np.flatnonzero(element_sizes > 1)
+    counts = element_sizes[shared]
+    left = np.repeat(shared, counts)
+    right = np.repeat(element_starts[shared], counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return members[order[left]], members[order[right]]
+
+def sorted_unique(values:np.ndarray) -> np.ndarray:
+    # np.unique of numpy 2 goes through a hash table, far slower than a sort on the large arrays of pairs
+    values = np.sort(values)
+    return values[np.r_[True, values[1:] != values[:-1]]] if len(values) > 0 else values
+
+def lexical_candidates(texts:list, jaccard:float=0.3, recall:float=0.95, permutations:int=128, min_ratio:float=None,
+                       ngram:int=3, seed:int=0):
+    ### Unique (rows, columns) pairs, sorted, of the labels found in a same LSH bucket, in both orders. A label without
+    ### any word is never a candidate. With min_ratio, only the pairs whose Levenshtein ratio reaches it are kept
+    shingle_sets = [shingles(text, ngram) for text in texts]
+    members = np.array([i for i, shingle_set in enumerate(shingle_sets) if shingle_set], dtype=np.int64)
+    signatures = minhash_signatures([shingle_sets[i] for i in members], permutations, seed)
+    bands, rows_per_band = band_layout(permutations, jaccard, recall)
+
+    size = len(texts)
+    # A band is reduced to one key, a collision of two different bands only adds a candidate
+    multipliers = np.random.default_rng(seed+1).integers(1, 1 << 63, rows_per_band, dtype=np.uint64) | np.uint64(1)
+    pairs = [np.empty(0, dtype=np.int64)]
+    for band in range(bands):
+        keys = (signatures[:, band*rows_per_band:(band+1)*rows_per_band] * multipliers).sum(axis=1, dtype=np.uint64)
+        rows, columns = bucket_pairs(keys, members)
+        pairs.append(sorted_unique(rows[rows != columns]*size + columns[rows != columns]))
+    pairs = sorted_unique(np.concatenate(pairs))
+    rows, columns = pairs // size, pairs % size
+
+    if min_ratio is not None and len(rows) > 0:
+        import Levenshtein
+        words = [" ".join(label_words(text)) for text in texts]
+        kept = np.array([Levenshtein.ratio(words[i], words[j]) >= min_ratio for i, j in zip(rows.tolist(), columns.tolist())], dtype=bool)
+        rows, columns = rows[kept], columns[kept]
+    return rows, columns
+
+def blocking_pairs(labels, comments, has_comment, texts:list, threshold:float, top_k:int=None, groups=None,
+                   aggregation:str="mean", **parameters):
+    ### Same output as SimilarityKernel.threshold_pairs of a set of components against itself, in one block,
+    ### restricted to the lexical candidates of the label texts
+    labels, comments = normalize(labels), normalize(comments)
+    rows, columns = lexical_candidates(texts, **parameters)
+    if groups is not None:
+        different = groups[rows] != groups[columns]
+        rows, columns = rows[different], columns[different]
+    return rescore_pairs(labels, comments, has_comment, rows, columns, threshold, top_k, aggregation)
@@ -0,0 +1,152 @@
+import numpy as np
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from tqdm import tqdm
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Common"))
+from SimilarityFormat import PAIR_DTYPE, check_buckets, save_components, save_meta
+
+from SimilarityKernel import has_comment_mask, threshold_pairs
+from SimilarityOutput import export_nquads, from_values_to_buckets
+
+### Scores every pair of vocabularies in a process pool. The embeddings are written once in memory mapped .npy files
+### shared by the workers (page cache), the vocabulary pairs are packed in shards of about SHARD_COST scores, largest
+### first, and each shard is written by its worker in its own file of PAIR_DTYPE records. The shards are concatenated
+### in the binary output (Common/SimilarityFormat.py), from which the .nq is exported.
+
+# Scores (pairs of components) of a shard, a vocabulary pair above it is split in blocks of rows
+SHARD_COST = 50_000_000
+
+# Embeddings shared with the workers, {name: (first component id, kind, labels, comments, has_comment)}
+components = dict()
+
+def component_table(embeddings_per_name:dict):
+    ### (iri, vocabulary) of each component id, and the first id of each kind of component
+    table, offsets = [], dict()
+    for name, embeddings_per_vocabulary in embeddings_per_name.items():
+        offsets[name] = len(table)
+        for vocabulary, (keys, _, _, _) in embeddings_per_vocabulary.items():
+            table += [(key, vocabulary) for key in keys]
+    return table, offsets
+
+def save_embeddings(folder:str, name:str, embeddings_per_vocabulary:dict) -> dict:
+    ### Embeddings (keys, labels, no comments, comments) of compute_embedding for every vocabulary, in one matrix per
+    ### kind of component (components x languages x dimension with Language_Aggregation max), returns the (start, end)
+    ### rows of each vocabulary
+    size, ranges = 0, dict()
+    for vocabulary, (keys, _, _, _) in embeddings_per_vocabulary.items():
+        if len(keys) > 0:
+            ranges[vocabulary] = (size, size+len(keys))
+            size += len(keys)
+    embeddings = [embeddings_per_vocabulary[vocabulary] for vocabulary in ranges]
+    shape = np.asarray(embeddings[0][1]).shape[1:] if embeddings else (0,)
+
+    labels = np.lib.format.open_memmap(os.path.join(folder, f"{name}.labels.npy"), mode="w+", dtype=np.float32, shape=(size, *shape))
+    comments = np.lib.format.open_memmap(os.path.join(folder, f"{name}.comments.npy"), mode="w+", dtype=np.float32, shape=(size, *shape))
+    has_comment = np.zeros(size, dtype=bool)
+    for (start, end), (keys, labels_embedding, no_comments, comments_embedding) in zip(ranges.values(), embeddings):
+        labels[start:end] = np.asarray(labels_embedding)
+        comments[start:end] = np.asarray(comments_embedding)
+        has_comment[start:end] = has_comment_mask(no_comments, len(keys))
+    labels.flush()
+    comments.flush()
+    np.save(os.path.join(folder, f"{name}.has_comment.npy"), has_comment)
+    return ranges
+
+def plan_shards(ranges_per_name:dict, shard_cost:int=SHARD_COST, changed:set=None) -> list:
+    ### Lists of (name, start_1, end_1, start_2, end_2) tasks, one list per shard, the most expensive shards first so
+    ### the largest vocabulary pairs do not end the run alone. With changed, only the pairs with a changed vocabulary
+    tasks = []
+    for name, ranges in ranges_per_name.items():
+        vocabularies = list(ranges)
+        for i, vocabulary_1 in enumerate(vocabularies):
+            for vocabulary_2 in vocabularies[i+1:]:
+                if changed is not None and vocabulary_1 not in changed and vocabulary_2 not in changed:
+                    continue
+                (start_1, end_1), (start_2, end_2) = ranges[vocabulary_1], ranges[vocabulary_2]
+                rows = max(1, shard_cost // (end_2-start_2))
+                for row in range(start_1, end_1, rows):
+                    tasks.append((name, row, min(row+rows, end_1), start_2, end_2))
+    tasks.sort(key=lambda task: (task[2]-task[1]) * (task[4]-task[3]), reverse=True)
+
+    shards, cost = [], shard_cost
+    for task in tasks:
+        if cost >= shard_cost:
+            shards.append([])
+            cost = 0
+        shards[-1].append(task)
+        cost += (task[2]-task[1]) * (task[4]-task[3])
+    return shards
+
+def init_worker(folder:str, offsets:dict):
+    global components
+    components = dict()
+    for kind, (name, offset) in enumerate(offsets.items()):
+        components[name] = (offset, kind,
+                            np.load(os.path.join(folder, f"{name}.labels.npy"), mmap_mode="r"),
+                            np.load(os.path.join(folder, f"{name}.comments.npy"), mmap_mode="r"),
+                            np.load(os.path.join(folder, f"{name}.has_comment.npy")))
+
+def score_shard(shard_path:str, tasks:list, global_threshold:float, intervals:float, aggregation:str="mean") -> int:
+    pairs = 0
+    with open(shard_path, "wb") as f_out:
+        for name, start_1, end_1, start_2, end_2 in tasks:
+            offset, kind, labels, comments, has_comment = components[name]
+            for rows, columns, averages in threshold_pairs(labels[start_1:end_1], comments[start_1:end_1], has_comment[start_1:end_1],
+                                                           labels[start_2:end_2], comments[start_2:end_2], has_comment[start_2:end_2],
+                                                           global_threshold, aggregation=aggregation):
+                records = np.empty(len(rows), dtype=PAIR_DTYPE)
+                records["component_1"] = offset + start_1 + rows
+                records["component_2"] = offset + start_2 + columns
+                records["score"] = averages
+                records["bucket"] = from_values_to_buckets(averages, global_threshold, intervals)
+                records["kind"] = kind
+                f_out.write(records.tobytes())
+                pairs += len(rows)
+    return pairs
+
+def run_sharded_scoring(output_path:str, embeddings_per_name:dict, predicate:str, global_threshold:float=0.5,
+                        intervals:float=0.01, precision:int=2, workers:int=None, shard_cost:int=SHARD_COST, progress_file=None,
+                        changed:set=None, kept=(), nquads:bool=True, compression:str=None, aggregation:str="mean"):
+    ### embeddings_per_name : {"classes": {vocabulary: compute_embedding(...)}, "properties": {...}}, aggregation : how
+    ### the languages of embeddings of several languages are combined (SimilarityKernel.aggregate_languages)
+    ### The binary output is written next to output_path (Similarity.nq : Similarity.pairs, ...), the .nq is exported
+    ### from it unless nquads is False (compressed with compression). changed : score only the pairs with one of these vocabularies, kept : arrays
+    ### of PAIR_DTYPE records of a previous run, already numbered as component_table(embeddings_per_name)
+    check_buckets(global_threshold, intervals)
+    start = time.perf_counter()
+    prefix = os.path.splitext(output_path)[0]
+    folder = f"{prefix}.shards"
+    shutil.rmtree(folder, ignore_errors=True)
+    os.makedirs(folder)
+    table, offsets = component_table(embeddings_per_name)
+    ranges_per_name = {name:save_embeddings(folder, name, embeddings) for name, embeddings in embeddings_per_name.items()}
+    shards = plan_shards(ranges_per_name, shard_cost, changed)
+    shard_paths = [os.path.join(folder, f"shard_{index:06d}.pairs") for index in range(len(shards))]
+
+    pairs = 0
+    with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(folder, offsets)) as executor:
+        futures = [executor.submit(score_shard, shard_path, tasks, global_threshold, intervals, aggregation)
+                   for shard_path, tasks in zip(shard_paths, shards)]
+        for future in tqdm(as_completed(futures), total=len(futures), file=progress_file):
+            pairs += future.result()
+
+    kept_pairs = 0
+    with open(prefix+".pairs.tmp", "wb") as f_out:
+        for records in kept:
+            f_out.write(records.tobytes())
+            kept_pairs += len(records)
+        for shard_path in shard_paths:
+            with open(shard_path, "rb") as f_shard:
+                shutil.copyfileobj(f_shard, f_out)
+    os.replace(prefix+".pairs.tmp", prefix+".pairs")
+    save_components(prefix, table)
+    save_meta(prefix, {"kinds":list(offsets), "offsets":list(offsets.values()), "predicate":predicate,
+                       "global_threshold":global_threshold, "intervals":intervals, "precision":precision})
+    shutil.rmtree(folder)
+    print(f"Sharded scoring : {pairs} pairs above {global_threshold} in {len(shards)} shards, {kept_pairs} kept, in {time.perf_counter()-start:.1f}s")
+
+    if nquads:
+        export_nquads(output_path, prefix, compression)
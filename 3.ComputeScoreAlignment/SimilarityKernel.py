@@ -0,0 +1,163 @@
+from itertools import groupby
+import numpy as np
+
+# Largest block of the n x m score matrices computed at once (tile_size x tile_size pairs)
+TILE_SIZE = 2048
+# Number of candidate pairs rescored at once
+RESCORE_CHUNK = 1_000_000
+
+def normalize(embedding) -> np.ndarray:
+    ### Rows scaled to a unit norm (null rows stay null, as in sklearn cosine_similarity), a dot product is then a cosine.
+    ### For (components, languages, dimension) embeddings, each language of each component
+    matrix = np.asarray(embedding, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
+
+def pool_languages(embedding) -> np.ndarray:
+    ### One row per component of (components, languages, dimension) embeddings, the normalized mean of its languages
+    ### (the null vectors of the missing languages left out), 2D embeddings are returned as they are
+    matrix = np.asarray(embedding, dtype=np.float32)
+    return normalize(normalize(matrix).sum(axis=1)) if matrix.ndim == 3 else matrix
+
+def aggregate_languages(products:np.ndarray, present:np.ndarray, aggregation:str="mean") -> np.ndarray:
+    ### Mean or maximum over the languages (first axis) of the cosines of the languages present in both components,
+    ### 0 (a null vector) when they have none in common
+    if aggregation == "mean":
+        return np.where(present, products, 0).sum(axis=0) / np.maximum(present.sum(axis=0), 1)
+    if aggregation == "max":
+        best = np.where(present, products, -np.inf).max(axis=0)
+        best[np.isneginf(best)] = 0
+        return best
+    raise ValueError(f"Unknown language aggregation {aggregation}")
+
+def cosines(matrix_1:np.ndarray, matrix_2:np.ndarray, aggregation:str="mean"):
+    ### n x m cosines of normalized embeddings and whether both components share a language (None for single vectors).
+    ### For (components, languages, dimension) embeddings, the cosines of each language (one product per language)
+    ### aggregated over the languages of both components
+    if matrix_1.ndim == 2:
+        return matrix_1 @ matrix_2.T, None
+    products = np.stack([matrix_1[:, language] @ matrix_2[:, language].T for language in range(matrix_1.shape[1])])
+    present = np.any(matrix_1 != 0, axis=-1).T[:, :, None] & np.any(matrix_2 != 0, axis=-1).T[:, None, :]
+    return aggregate_languages(products, present, aggregation), present.any(axis=0)
+
+def row_cosines(matrix_1:np.ndarray, matrix_2:np.ndarray, aggregation:str="mean"):
+    ### Cosine of each row of matrix_1 with the same row of matrix_2 and whether both share a language, as in cosines
+    if matrix_1.ndim == 2:
+        return np.einsum("ij,ij->i", matrix_1, matrix_2), None
+    products = np.einsum("ild,ild->li", matrix_1, matrix_2)
+    present = (np.any(matrix_1 != 0, axis=-1) & np.any(matrix_2 != 0, axis=-1)).T
+    return aggregate_languages(products, present, aggregation), present.any(axis=0)
+
+def comment_mask(has_comment_1:np.ndarray, has_comment_2:np.ndarray, shared:np.ndarray) -> np.ndarray:
+    ### Pairs whose comments are averaged with the labels : both components have a comment, in a common language when
+    ### the languages are scored apart (a comment cosine of 0 without common language would halve the label score)
+    return has_comment_1 & has_comment_2 if shared is None else has_comment_1 & has_comment_2 & shared
+
+def has_comment_mask(no_comments, size:int) -> np.ndarray:
+    ### Boolean mask from the indexes without comment of the scripts ({-1} and the indexes without comment)
+    mask = np.ones(size, dtype=bool)
+    indexes = [i for i in no_comments if 0 <= i < size]
+    mask[indexes] = False
+    return mask
+
+def similarity_tiles(labels_1:np.ndarray, comments_1:np.ndarray, has_comment_1:np.ndarray,
+                     labels_2:np.ndarray, comments_2:np.ndarray, has_comment_2:np.ndarray, tile_size:int=TILE_SIZE,
+                     aggregation:str="mean"):
+    ### Yields (row, column, label, comment, average, comment_used) for each tile of the n x m pairs, row and column being
+    ### the offsets of the tile. The embeddings must be normalized. The average is the mean of the label and comment
+    ### cosines when both components have a comment (in a common language), the label cosine otherwise. Embeddings of several languages are
+    ### scored language by language and aggregated (aggregation : mean or max).
+    if labels_1.ndim == 3:
+        # The products of every language of a tile hold about as many values as a tile of single vectors
+        tile_size = max(1, int(tile_size / np.sqrt(labels_1.shape[1])))
+    for row in range(0, len(labels_1), tile_size):
+        for column in range(0, len(labels_2), tile_size):
+            label, _ = cosines(labels_1[row:row+tile_size], labels_2[column:column+tile_size], aggregation)
+            comment, shared = cosines(comments_1[row:row+tile_size], comments_2[column:column+tile_size], aggregation)
+            comment_used = comment_mask(has_comment_1[row:row+tile_size, None], has_comment_2[None, column:column+tile_size], shared)
+            average = np.where(comment_used, (label.astype(np.float64) + comment) / 2, label)
+            yield row, column, label, comment, average, comment_used
+
+def compute_scores(labels_1, comments_1, has_comment_1, labels_2, comments_2, has_comment_2, tile_size:int=TILE_SIZE,
+                   aggregation:str="mean"):
+    ### Whole label, comment, average and comment used matrices, for the callers that keep every pair
+    labels_1, comments_1 = normalize(labels_1), normalize(comments_1)
+    labels_2, comments_2 = normalize(labels_2), normalize(comments_2)
+    shape = (len(labels_1), len(labels_2))
+    label = np.empty(shape, dtype=np.float32)
+    comment = np.empty(shape, dtype=np.float32)
+    average = np.empty(shape, dtype=np.float64)
+    comment_used = np.empty(shape, dtype=bool)
+    for row, column, *tile in similarity_tiles(labels_1, comments_1, has_comment_1, labels_2, comments_2, has_comment_2, tile_size, aggregation):
+        rows, columns = slice(row, row+tile[0].shape[0]), slice(column, column+tile[0].shape[1])
+        label[rows, columns], comment[rows, columns], average[rows, columns], comment_used[rows, columns] = tile
+    return label, comment, average, comment_used
+
+def keep_top_k(rows:np.ndarray, columns:np.ndarray, averages:np.ndarray, top_k:int):
+    ### Best top_k pairs of each row, sorted by row then decreasing average
+    order = np.lexsort((-averages, rows))
+    rows, columns, averages = rows[order], columns[order], averages[order]
+    rank = np.arange(len(rows)) - np.searchsorted(rows, rows)
+    return rows[rank < top_k], columns[rank < top_k], averages[rank < top_k]
+
+def threshold_pairs(labels_1, comments_1, has_comment_1, labels_2, comments_2, has_comment_2, threshold:float,
+                    top_k:int=None, groups_1=None, groups_2=None, tile_size:int=TILE_SIZE, aggregation:str="mean"):
+    ### Yields, for each block of tile_size rows, the sparse (rows, columns, averages) arrays of the pairs whose average
+    ### is above threshold (only the top_k best of each row when top_k is given), sorted by row and column. Pairs whose
+    ### groups (vocabularies) are equal are skipped. Only a tile and the pairs kept are in memory, never the n x m matrices.
+    labels_1, comments_1 = normalize(labels_1), normalize(comments_1)
+    labels_2, comments_2 = normalize(labels_2), normalize(comments_2)
+    tiles = similarity_tiles(labels_1, comments_1, has_comment_1, labels_2, comments_2, has_comment_2, tile_size, aggregation)
+    for row, row_tiles in groupby(tiles, key=lambda tile: tile[0]):
+        rows, columns, averages = [], [], []
+        for _, column, label, comment, average, comment_used in row_tiles:
+            kept = average > threshold
+            if groups_1 is not None:
+                kept &= groups_1[row:row+average.shape[0], None] != groups_2[None, column:column+average.shape[1]]
+            tile_rows, tile_columns = np.nonzero(kept)
+            rows.append(tile_rows+row)
+            columns.append(tile_columns+column)
+            averages.append(average[tile_rows, tile_columns])
+            if top_k is not None:
+                rows, columns, averages = [[part] for part in keep_top_k(np.concatenate(rows), np.concatenate(columns), np.concatenate(averages), top_k)]
+        rows, columns, averages = np.concatenate(rows), np.concatenate(columns), np.concatenate(averages)
+        order = np.lexsort((columns, rows))
+        yield rows[order], columns[order], averages[order]
+
+def rescore_pairs(labels, comments, has_comment, rows, columns, threshold:float, top_k:int=None, aggregation:str="mean"):
+    ### Exact averages of the candidate (rows, columns) pairs of normalized embeddings, the pairs above threshold in
+    ### the sparse form of threshold_pairs (the top_k best of each row when top_k is given)
+    averages = np.empty(len(rows), dtype=np.float64)
+    chunk = RESCORE_CHUNK // (labels.shape[1] if labels.ndim == 3 else 1)
+    for start in range(0, len(rows), chunk):
+        chunk_rows, chunk_columns = rows[start:start+chunk], columns[start:start+chunk]
+        label, _ = row_cosines(labels[chunk_rows], labels[chunk_columns], aggregation)
+        comment, shared = row_cosines(comments[chunk_rows], comments[chunk_columns], aggregation)
+        comment_used = comment_mask(has_comment[chunk_rows], has_comment[chunk_columns], shared)
+        averages[start:start+chunk] = np.where(comment_used, (label.astype(np.float64) + comment) / 2, label)
+
+    kept = averages > threshold
+    rows, columns, averages = rows[kept], columns[kept], averages[kept]
+    if top_k is not None:
+        rows, columns, averages = keep_top_k(rows, columns, averages, top_k)
+        order = np.lexsort((columns, rows))
+        rows, columns, averages = rows[order], columns[order], averages[order]
+    return rows, columns, averages
+
+def max_pooling(similarity:np.ndarray, sets_1:list, sets_2:list, missing:float=-10) -> np.ndarray:
+    ### For every (i, j), the best similarity[a, b] over the rows a in sets_1[i] and the columns b in sets_2[j]
+    ### (domains or ranges of two properties), missing when one of the sets is empty
+    pooled = np.full((len(sets_1), len(sets_2)), missing, dtype=np.float64)
+    filled_1 = [i for i, rows in enumerate(sets_1) if len(rows) > 0]
+    filled_2 = [j for j, columns in enumerate(sets_2) if len(columns) > 0]
+    if not filled_1 or not filled_2:
+        return pooled
+    rows = np.concatenate([np.asarray(sets_1[i], dtype=np.int64) for i in filled_1])
+    columns = np.concatenate([np.asarray(sets_2[j], dtype=np.int64) for j in filled_2])
+    starts_1 = np.cumsum([0] + [len(sets_1[i]) for i in filled_1[:-1]])
+    starts_2 = np.cumsum([0] + [len(sets_2[j]) for j in filled_2[:-1]])
+    # Best over the rows of each set, then over the columns of each set
+    best_rows = np.maximum.reduceat(similarity[rows], starts_1, axis=0)
+    pooled[np.ix_(filled_1, filled_2)] = np.maximum.reduceat(best_rows[:, columns], starts_2, axis=1)
+    return pooled
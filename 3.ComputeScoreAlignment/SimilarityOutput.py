@@ -0,0 +1,138 @@
+import gzip
+import numpy as np
+import os
+import queue
+import sys
+import threading
+import time
+from functools import lru_cache
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Common"))
+from SimilarityFormat import bucket_grid, load_similarity
+
+### Similarity quads written by the scoring scripts : <component_1> predicate <component_2> <http://value/low_high>.
+### The bucket of a score is the index of its upper bound in bucket_grid, low_high is interval_labels[bucket].
+
+# Pairs exported to N-Quads at once
+EXPORT_CHUNK = 1_000_000
+# Characters formatted before a write, and encoded chunks waiting for the writing thread
+WRITE_BUFFER = 16_000_000
+WRITE_QUEUE = 4
+# Suffix of the quads file for each compression
+COMPRESSIONS = {None:"", "gzip":".gz", "zstd":".zst"}
+
+def from_values_to_buckets(values, global_threshold:float=0.5, intervals:float=0.01) -> np.ndarray:
+    ### Index of the first upper bound strictly above each value (len(grid) above the last one), searched on the grid
+    ### itself rather than computed by a floor division, so a value on a bound lands in the same bucket as with a loop
+    ### over the grid
+    return np.searchsorted(bucket_grid(global_threshold, intervals), values, side="right")
+
+@lru_cache
+def interval_labels(global_threshold:float=0.5, intervals:float=0.01, precision:int=2) -> tuple:
+    return tuple(f"{np.around(i-intervals, precision)}_{np.around(i, precision)}" for i in bucket_grid(global_threshold, intervals))
+
+def render_terms(iris:list) -> list:
+    return [f"<{iri}>" for iri in iris]
+
+def open_output(path:str, compression:str=None, threads:int=None):
+    if compression is None:
+        return open(path, "wb")
+    if compression == "gzip":
+        return gzip.open(path, "wb", compresslevel=6)
+    if compression == "zstd":
+        import zstandard
+        # threads=-1 : one compression thread per CPU
+        return zstandard.ZstdCompressor(level=3, threads=-1 if threads is None else threads).stream_writer(open(path, "wb"))
+    raise ValueError(f"Unknown compression {compression}, expected one of {list(COMPRESSIONS)}")
+
+class QuadWriter:
+    ### Bulk writer of similarity quads. A block of pairs is formatted at once from rendered <iri> terms and the
+    ### graph term of each bucket, the lines are joined in buffers of about WRITE_BUFFER characters, and a thread
+    ### writes (and compresses, zlib and zstd release the GIL) the previous buffers meanwhile.
+    ### With a compression, COMPRESSIONS[compression] is added to path.
+    def __init__(self, path:str, predicate:str, global_threshold:float=0.5, intervals:float=0.01, precision:int=2,
+                 compression:str=None, threads:int=None):
+        self.path = path + COMPRESSIONS.get(compression, "")
+        self.predicate = predicate
+        self.global_threshold = global_threshold
+        self.intervals = intervals
+        # Values above the grid were written in the graph <http://value/None>
+        self.graphs = tuple(f"<http://value/{label}>" for label in interval_labels(global_threshold, intervals, precision) + (None,))
+        self.f_out = open_output(self.path, compression, threads)
+        self.buffer, self.buffered = [], 0
+        self.lines, self.bytes = 0, 0
+        self.start = time.perf_counter()
+
+        self.error = None
+        self.queue = queue.Queue(maxsize=WRITE_QUEUE)
+        self.thread = threading.Thread(target=self.drain, daemon=True)
+        self.thread.start()
+
+    def drain(self):
+        while (data := self.queue.get()) is not None:
+            # After an error the buffers are dropped, the error is raised by the next flush
+            if self.error is None:
+                try:
+                    self.f_out.write(data)
+                except Exception as e:
+                    self.error = e
+
+    def write_buckets(self, terms_1:list, terms_2:list, buckets):
+        ### terms_1[n] predicate terms_2[n] graph of buckets[n]
+        graphs, predicate = self.graphs, self.predicate
+        lines = "".join([f"{term_1} {predicate} {term_2} {graphs[bucket]}.\n" for term_1, term_2, bucket in zip(terms_1, terms_2, np.asarray(buckets).tolist())])
+        self.buffer.append(lines)
+        self.buffered += len(lines)
+        self.lines += len(terms_1)
+        if self.buffered >= WRITE_BUFFER:
+            self.flush()
+
+    def write(self, terms_1:list, terms_2:list, averages):
+        self.write_buckets(terms_1, terms_2, from_values_to_buckets(averages, self.global_threshold, self.intervals))
+
+    def write_pairs(self, terms:list, rows, columns, averages, terms_2:list=None):
+        ### Sparse (rows, columns, averages) block, rows index terms and columns terms_2 (terms when None)
+        terms_2 = terms if terms_2 is None else terms_2
+        self.write([terms[i] for i in np.asarray(rows).tolist()], [terms_2[j] for j in np.asarray(columns).tolist()], averages)
+
+    def write_frame(self, df):
+        ### Rows of a compute_similarity DataFrame above global_threshold
+        df = df[df["Average"] > self.global_threshold]
+        components = df["Components"].tolist()
+        self.write([f"<{c1}>" for c1, _ in components], [f"<{c2}>" for _, c2 in components], np.asarray(df["Average"], dtype=np.float64))
+
+    def flush(self):
+        if self.error is not None:
+            raise self.error
+        if self.buffer:
+            data = "".join(self.buffer).encode("UTF-8")
+            self.bytes += len(data)
+            self.queue.put(data)
+            self.buffer, self.buffered = [], 0
+
+    def stats(self) -> str:
+        duration = time.perf_counter() - self.start
+        return f"Quad writer : {self.lines} quads ({self.bytes/1e6:.0f} MB) in {self.path} in {duration:.1f}s ({self.lines/max(duration, 1e-9):.0f} quads/s)"
+
+    def close(self):
+        self.flush()
+        self.queue.put(None)
+        self.thread.join()
+        self.f_out.close()
+        if self.error is not None:
+            raise self.error
+        print(self.stats())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def export_nquads(output_path:str, prefix:str, compression:str=None):
+    ### Similarity.nq from the binary output <prefix>.pairs/.components/.json
+    pairs, iris, _, meta = load_similarity(prefix)
+    terms = render_terms(iris)
+    with QuadWriter(output_path, meta["predicate"], meta["global_threshold"], meta["intervals"], meta["precision"], compression) as writer:
+        for start in range(0, len(pairs), EXPORT_CHUNK):
+            records = pairs[start:start+EXPORT_CHUNK]
+            writer.write_buckets([terms[i] for i in records["component_1"].tolist()], [terms[j] for j in records["component_2"].tolist()], records["bucket"])
@@ -3,6 +3,10 @@ import json
 
 import numpy as np
 import pandas as pd
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Common"))
+from SparqlCache import CachedSPARQLWrapper, SparqlCache
 
 def retrieve_vocabularies():
     query = """
@@ -133,7 +137,7 @@ if __name__ == "__main__":
     config = json.load(open("config.json", "r"))
 
     url_server = config["URL_endpoint"]
-    sparql = SPARQLWrapper(url_server)
+    sparql = CachedSPARQLWrapper(url_server, cache=SparqlCache.from_config(config, url_server))
     sparql.setReturnFormat('json')
     sparql.method = 'GET'
 
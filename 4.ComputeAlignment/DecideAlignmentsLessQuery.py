@@ -3,6 +3,11 @@ import json
 
 import numpy as np
 import pandas as pd
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Common"))
+from SimilarityFormat import bucket_bounds, load_similarity
+from SparqlCache import CachedSPARQLWrapper, SparqlCache
 
 def retrieve_vocabularies():
     query = """
@@ -115,6 +120,27 @@ def retrieve_properties_from_vocab():
         
     return similarities
 
+def retrieve_similarities_from_binary(prefix, kind):
+    ### Same similarities as the queries, from the binary output of 3.ComputeScoreAlignment (kind : "classes" or "properties")
+    pairs, iris, vocabularies, meta = load_similarity(prefix)
+    pairs = pairs[pairs["kind"] == meta["kinds"].index(kind)]
+    lows, highs = bucket_bounds(meta, pairs["bucket"])
+
+    similarities = dict()
+    for low, high, component_1, component_2 in zip(lows.tolist(), highs.tolist(), pairs["component_1"].tolist(), pairs["component_2"].tolist()):
+        # The queries keep the pairs with str(?vocab_1) > str(?vocab_2), never two components of the same vocabulary
+        if vocabularies[component_1] == vocabularies[component_2]:
+            continue
+        if vocabularies[component_1] < vocabularies[component_2]:
+            component_1, component_2 = component_2, component_1
+        vocab_1, vocab_2 = vocabularies[component_1], vocabularies[component_2]
+        if (vocab_1, vocab_2) not in similarities:
+            similarities[(vocab_1, vocab_2)] = set()
+
+        similarities[(vocab_1, vocab_2)].add((low, high, iris[component_1], iris[component_2]))
+
+    return similarities
+
 def take_decision(similarities):
 
     def add_alignments(line, already_aligned, alignments):
@@ -145,7 +171,7 @@ if __name__ == "__main__":
     config = json.load(open("config.json", "r"))
 
     url_server = config["URL_endpoint"]
-    sparql = SPARQLWrapper(url_server)
+    sparql = CachedSPARQLWrapper(url_server, cache=SparqlCache.from_config(config, url_server))
     sparql.setReturnFormat('json')
     sparql.method = 'GET'
 
@@ -154,7 +180,9 @@ if __name__ == "__main__":
 
         alignments_decided = set()
 
-        sim_classes = retrieve_classes_from_vocab()
+        # "Similarity_Binary" : prefix of the binary output of 3.ComputeScoreAlignment (e.g. ../3.ComputeScoreAlignment/Similarity)
+        binary = config.get("Similarity_Binary")
+        sim_classes = retrieve_similarities_from_binary(binary, "classes") if binary else retrieve_classes_from_vocab()
         vocabs = list(sim_classes.keys())
         
         for couple in vocabs:
@@ -164,7 +192,7 @@ if __name__ == "__main__":
                 for c1, c2 in alignments:
                     f_out.write(f"<{c1}> <http://KG_Nexus.com/equivalenceClassComputed> <{c2}>.\n")
 
-        sim_properties = retrieve_properties_from_vocab()
+        sim_properties = retrieve_similarities_from_binary(binary, "properties") if binary else retrieve_properties_from_vocab()
         vocabs = list(sim_properties.keys())
         
         for couple in vocabs:
@@ -1,5 +1,9 @@
 import json
 from SPARQLWrapper import SPARQLWrapper
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Common"))
+from SparqlCache import CachedSPARQLWrapper, SparqlCache
 
 def loadKeys(file):
     keys = []
@@ -17,7 +21,7 @@ if __name__ == "__main__":
     config = json.load(open("config.json", "r"))
 
     url_server = config["URL_endpoint"]
-    sparql = SPARQLWrapper(url_server)
+    sparql = CachedSPARQLWrapper(url_server, cache=SparqlCache.from_config(config, url_server))
     sparql.setReturnFormat('json')
     sparql.method = 'GET'
     
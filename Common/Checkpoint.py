@@ -0,0 +1,65 @@
+import json
+import os
+
+class CheckpointJournal:
+    ### Append-only journal of the units (vocabularies, query sections, batches) completed by a run, one JSON object
+    ### per line {"unit": ..., "offset": ...} where offset is the size of the output once the unit was written.
+    ### A rerun truncates the output to the last offset and skips the units already in the journal.
+    def __init__(self, path:str):
+        self.path = path
+        self.entries = dict()
+        self.offset = 0
+
+        valid_size = 0
+        if os.path.exists(path):
+            with open(path, "rb") as f_journal:
+                for line in f_journal:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Last line cut by the crash : its unit is not completed
+                        break
+                    self.entries[entry["unit"]] = entry
+                    self.offset = entry["offset"]
+                    valid_size += len(line)
+            with open(path, "r+b") as f_journal:
+                f_journal.truncate(valid_size)
+
+        self.f_journal = open(path, "a", encoding="UTF-8")
+
+    def reset(self):
+        self.entries = dict()
+        self.offset = 0
+        self.f_journal.truncate(0)
+
+    def open_output(self, output_path:str, binary:bool=False):
+        ### Whatever was written after the last completed unit is dropped and the output is reopened for appending
+        if self.entries and not os.path.exists(output_path):
+            self.reset()
+        if self.entries:
+            with open(output_path, "r+b") as f_out:
+                f_out.truncate(self.offset)
+            mode = "a"
+        else:
+            mode = "w"
+        return open(output_path, mode+"b") if binary else open(output_path, mode, encoding="UTF-8")
+
+    def is_done(self, unit:str) -> bool:
+        return unit in self.entries
+
+    def commit(self, unit:str, f_out=None, **info):
+        ### The output is synced before the journal, so a journal entry never points past the data on disk
+        if f_out is not None:
+            f_out.flush()
+            os.fsync(f_out.fileno())
+            self.offset = os.fstat(f_out.fileno()).st_size
+        entry = {"unit":unit, "offset":self.offset, **info}
+        self.entries[unit] = entry
+        self.f_journal.write(json.dumps(entry)+"\n")
+        self.f_journal.flush()
+        os.fsync(self.f_journal.fileno())
+
+    def complete(self):
+        ### The run is over : a new run starts from scratch
+        self.f_journal.close()
+        os.remove(self.path)
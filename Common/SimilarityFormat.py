@@ -0,0 +1,59 @@
+import json
+import numpy as np
+import os
+
+### Binary similarity output of 3.ComputeScoreAlignment, read by 4.ComputeAlignment without going through GraphDB :
+###   <prefix>.pairs       the pairs of components above the threshold, PAIR_DTYPE records
+###   <prefix>.components  the component of each id, one "iri\tvocabulary" line per id
+###   <prefix>.json        the kinds of components and the score buckets of the quads
+### Similarity.nq is exported from these files.
+
+PAIR_DTYPE = np.dtype([("component_1", "<i4"), ("component_2", "<i4"), ("score", "<f4"), ("bucket", "<u2"), ("kind", "u1")])
+# Written in <prefix>.json, files of another version (other PAIR_DTYPE) are not read
+FORMAT_VERSION = 2
+
+def bucket_grid(global_threshold:float, intervals:float) -> np.ndarray:
+    ### Upper bounds of the buckets, the bucket of a score is the first upper bound above it
+    return np.arange(global_threshold, 1.5, intervals)
+
+def bucket_bounds(meta:dict, buckets:np.ndarray):
+    ### (low, high) of the <http://value/low_high> graph of each bucket
+    grid = bucket_grid(meta["global_threshold"], meta["intervals"])
+    return np.around(grid[buckets]-meta["intervals"], meta["precision"]), np.around(grid[buckets], meta["precision"])
+
+def save_components(prefix:str, components:list):
+    ### components : (iri, vocabulary) of each id
+    with open(prefix+".components", "w", encoding="UTF-8") as f_components:
+        f_components.write("".join(f"{iri}\t{vocabulary}\n" for iri, vocabulary in components))
+
+def check_buckets(global_threshold:float, intervals:float):
+    ### The bucket of a score goes up to len(grid) (above the last bound), it must fit in the bucket field
+    buckets = len(bucket_grid(global_threshold, intervals)) + 1
+    if buckets > np.iinfo(PAIR_DTYPE["bucket"]).max + 1:
+        raise ValueError(f"{buckets} buckets from {global_threshold} by {intervals} do not fit in the {PAIR_DTYPE['bucket']} bucket field")
+
+def save_meta(prefix:str, meta:dict):
+    with open(prefix+".json", "w", encoding="UTF-8") as f_meta:
+        json.dump(dict(meta, format=FORMAT_VERSION), f_meta)
+
+def load_meta(prefix:str) -> dict:
+    with open(prefix+".json", "r", encoding="UTF-8") as f_meta:
+        return json.load(f_meta)
+
+def load_pairs(prefix:str) -> np.ndarray:
+    if os.path.getsize(prefix+".pairs") == 0:
+        return np.empty(0, dtype=PAIR_DTYPE)
+    return np.memmap(prefix+".pairs", dtype=PAIR_DTYPE, mode="r")
+
+def load_similarity(prefix:str):
+    ### (pairs memory mapped, iris, vocabularies, meta)
+    meta = load_meta(prefix)
+    if meta.get("format") != FORMAT_VERSION:
+        raise ValueError(f"{prefix}.pairs has format {meta.get('format')}, expected {FORMAT_VERSION}, score the vocabularies again")
+    iris, vocabularies = [], []
+    with open(prefix+".components", "r", encoding="UTF-8") as f_components:
+        for line in f_components:
+            iri, vocabulary = line[:-1].split("\t")
+            iris.append(iri)
+            vocabularies.append(vocabulary)
+    return load_pairs(prefix), iris, vocabularies, meta
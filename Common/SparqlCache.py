@@ -0,0 +1,132 @@
+import atexit
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from urllib.request import urlopen
+from SPARQLWrapper import SPARQLWrapper
+
+def fetch_repository_version(url_server:str) -> str:
+    ### GraphDB exposes the number of statements of a repository on <repository>/size,
+    ### any load or removal of data changes it and invalidates the cached responses. None when it cannot be read
+    try:
+        with urlopen(f"{url_server}/size", timeout=30) as response:
+            return response.read().decode("UTF-8").strip() or None
+    except Exception as e:
+        print(f"SPARQL cache : cannot read the size of {url_server} ({e})")
+        return None
+
+class SparqlCache:
+    ### On-disk store of SPARQL JSON responses, keyed by sha256(endpoint, repository version, format, query)
+    def __init__(self, path:str, ttl:float=None, max_size:int=None, repository_version:str=""):
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        self.repository_version = repository_version
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                endpoint TEXT,
+                created REAL,
+                accessed REAL,
+                size INTEGER,
+                response BLOB
+            )""")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed)")
+        self.connection.commit()
+        self.total_size = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    @classmethod
+    def from_config(cls, config:dict, url_server:str):
+        ### "Cache_Path" enables the cache, "Cache_Version" is either an explicit version or "auto". Without a version
+        ### "auto" could serve responses of another state of the repository, the cache is disabled instead
+        if not config.get("Cache_Path"):
+            return None
+        repository_version = config.get("Cache_Version", "auto")
+        if repository_version == "auto":
+            repository_version = fetch_repository_version(url_server)
+            if repository_version is None:
+                print("SPARQL cache : disabled, no repository version for Cache_Version \"auto\"")
+                return None
+        cache = cls(config["Cache_Path"], config.get("Cache_TTL"), config.get("Cache_Max_Size"), repository_version)
+        atexit.register(lambda: print(cache.stats()))
+        return cache
+
+    def key(self, endpoint:str, query:str, return_format:str) -> str:
+        return hashlib.sha256(json.dumps([endpoint, self.repository_version, return_format, query]).encode("UTF-8")).hexdigest()
+
+    def get(self, key:str):
+        now = time.time()
+        with self.lock:
+            row = self.connection.execute("SELECT created, response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl and now - row[0] > self.ttl:
+                self.delete(key)
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.connection.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self.connection.commit()
+            self.hits += 1
+        return json.loads(zlib.decompress(row[1]))
+
+    def put(self, key:str, endpoint:str, response:dict):
+        payload = zlib.compress(json.dumps(response).encode("UTF-8"))
+        now = time.time()
+        with self.lock:
+            self.delete(key)
+            self.connection.execute("INSERT INTO responses VALUES (?, ?, ?, ?, ?, ?)", (key, endpoint, now, now, len(payload), payload))
+            self.total_size += len(payload)
+            self.evict()
+            self.connection.commit()
+
+    def delete(self, key:str):
+        row = self.connection.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            self.connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self.total_size -= row[0]
+
+    def evict(self):
+        ### Least recently used responses are removed until the store fits in max_size
+        if self.ttl:
+            expired = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses WHERE created < ?", (time.time() - self.ttl,)).fetchone()[0]
+            self.connection.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,))
+            self.total_size -= expired
+        while self.max_size and self.total_size > self.max_size:
+            rows = self.connection.execute("SELECT key, size FROM responses ORDER BY accessed LIMIT 100").fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                self.connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.total_size -= size
+                if self.total_size <= self.max_size:
+                    break
+
+    def stats(self) -> str:
+        total = self.hits + self.misses
+        ratio = self.hits / total if total else 0
+        return f"SPARQL cache : {self.hits} hits, {self.misses} misses ({ratio:.1%} hit rate), {self.total_size / 1_000_000:.1f} MB on disk"
+
+class CachedSPARQLWrapper(SPARQLWrapper):
+    ### Drop-in replacement of SPARQLWrapper, queryAndConvert is answered from the cache when possible
+    def __init__(self, endpoint:str, cache:SparqlCache=None, **kwargs):
+        super().__init__(endpoint, **kwargs)
+        self.cache = cache
+
+    def queryAndConvert(self):
+        if self.cache is None or self.returnFormat != "json" or getattr(self, "queryType", "SELECT") not in ("SELECT", "ASK"):
+            return super().queryAndConvert()
+
+        key = self.cache.key(self.endpoint, self.queryString, self.returnFormat)
+        response = self.cache.get(key)
+        if response is None:
+            response = super().queryAndConvert()
+            self.cache.put(key, self.endpoint, response)
+        return response